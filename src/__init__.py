@@ -1,9 +1,13 @@
+import atexit
 from flask import Flask
 from flask_socketio import SocketIO
 from flask_sqlalchemy import SQLAlchemy
 from src.config import Config
 from flask_sessionstore import Session
 from flask_login import LoginManager
+from src.board.move_cache import legal_move_cache
+from src.models.game_cache import game_cache
+from src.models.write_behind import write_behind
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -11,6 +15,9 @@ db = SQLAlchemy(app)
 socketio = SocketIO(app, manage_session=False)
 login = LoginManager(app)
 login.login_view = 'login'
+legal_move_cache.max_size = app.config['LEGAL_MOVE_CACHE_SIZE']
+game_cache.max_size = app.config['GAME_CACHE_SIZE']
+game_cache.idle_seconds = app.config['GAME_CACHE_IDLE_SECONDS']
 # How do i add session model to migrate script?
 session = Session(app)
 session.app.session_interface.db.create_all()
@@ -21,3 +28,10 @@ socketio.init_app(app)
 
 from src import routes
 from src.models import *
+
+if app.config['WRITE_BEHIND']:
+    # Replays moves left in the journal before any request is served
+    write_behind.open(app.config['WRITE_BEHIND_JOURNAL'], chess_game.ChessGame.save_journal_states,
+                      fsync=app.config['WRITE_BEHIND_FSYNC'])
+    write_behind.start(app.config['WRITE_BEHIND_INTERVAL'])
+    atexit.register(write_behind.close)
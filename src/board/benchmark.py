@@ -0,0 +1,61 @@
+"""
+Throughput benchmarks for the board package. Results are printed as one JSON object per line so they can be tracked
+over time.
+
+    python -m src.board.benchmark --iterations 2000 --output benchmark.jsonl
+
+Importing the board package starts the app, which can log to stdout, so use --output when the results are parsed.
+"""
+import argparse
+import json
+import sys
+import time
+from src.board.fen import Fen
+from src.board.perft import PERFT_SUITE
+
+
+def fen_parse_benchmark(fens, iterations, **fen_options):
+    """
+    Time parsing FEN strings.
+
+    :param fens: list
+        FEN strings to parse.
+    :param iterations: int
+        Number of times to parse the whole list.
+    :param fen_options:
+        Keyword arguments passed to Fen. Ex validate=False
+    :return: dict
+        Options used, number of FEN strings parsed, seconds taken and fens_per_second.
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for fen in fens:
+            Fen(fen, **fen_options)
+    seconds = time.perf_counter() - start
+
+    count = iterations * len(fens)
+    return {
+        'benchmark': 'fen_parse',
+        'options': fen_options,
+        'fens': count,
+        'seconds': round(seconds, 6),
+        'fens_per_second': int(count / seconds) if seconds else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run board benchmarks and print one JSON result per line.')
+    parser.add_argument('--iterations', type=int, default=1000, help='Number of passes over the FEN strings.')
+    parser.add_argument('--output', type=argparse.FileType('w'), default=sys.stdout,
+                        help='File to write the JSON results to instead of stdout.')
+    args = parser.parse_args()
+
+    fens = [position['fen'] for position in PERFT_SUITE]
+    for fen_options in [{}, {'validate': False}]:
+        print(json.dumps(fen_parse_benchmark(fens, args.iterations, **fen_options)), file=args.output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
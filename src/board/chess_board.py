@@ -1,4 +1,7 @@
-import copy
+from src.board import mailbox
+from src.board import zobrist
+from src.board import material
+from src.board import packed
 from src.board.fen import Fen
 from src.piece.rook import Rook
 from src.piece.knight import Knight
@@ -8,27 +11,133 @@ from src.piece.color import Color
 from src.piece.type import Type
 from src.piece.move_direction import MoveDirection
 from src.utils.chess_helper import ChessHelper
+from src.utils.instrumentation import instrumented
 from src.board.exception import PieceTypeError
 from src.board.exception import EmptyPositionError
 from src.board.exception import InvalidPositionError
 from src.board.exception import InvalidIndexError
 
 
-class ChessBoard:
+class KingSafety:
+    """
+    Contain info on the threats against a king.
+    """
+
+    def __init__(self):
+        self._checkers = []
+        self._block_positions = {}
+        self._pins = {}
+
+    @property
+    def checkers(self):
+        # Positions of the pieces giving check
+        return self._checkers
+
+    @checkers.setter
+    def checkers(self, checkers):
+        self._checkers = checkers
+
+    @property
+    def block_positions(self):
+        # - [checker position]: Positions between the checker and the king a piece can move to to block the check
+        return self._block_positions
+
+    @block_positions.setter
+    def block_positions(self, block_positions):
+        self._block_positions = block_positions
+
+    @property
+    def pins(self):
+        # - [pinned position]: Positions the pinned piece can move to without exposing the king
+        return self._pins
+
+    @pins.setter
+    def pins(self, pins):
+        self._pins = pins
+
+    @property
+    def is_check(self):
+        return len(self._checkers) > 0
+
+    @property
+    def is_double_check(self):
+        return len(self._checkers) > 1
+
+    def __eq__(self, other):
+        """Overrides the default implementation"""
+        if isinstance(self, other.__class__):
+            return self.__dict__ == other.__dict__
+        return False
+
 
+class MoveUndo:
     """
-    Offsets to shift over from current position to move forward, backward, etc.
+    Everything ChessBoard.unmake_move needs to take back a move made by ChessBoard.make_move.
+
+    start, end: Mailbox indexes the piece moved from and to.
+    piece: Piece that moved. Still a pawn if the move was a promotion.
+    captured: Piece that was captured, or None.
+    captured_index: Mailbox index the captured piece was on. Differs from end for en passant.
+    rook_start, rook_end: Mailbox indexes the rook moved from and to when castling, otherwise None.
+    castling_rights: Castling rights bits before the move.
+    king_position: Position of the moving player's king before the move.
+    en_passant_info: En passant info of the board before the move.
+    current_player: Player to move before the move.
+    halfmove_clock: Halfmove clock before the move.
+    zobrist_key: Zobrist hash of the board before the move.
     """
-    PIECE_SHIFTING = {
-        MoveDirection.FORWARD: 8,
-        MoveDirection.BACKWARD: -8,
-        MoveDirection.LEFT: -1,
-        MoveDirection.RIGHT: 1,
-        MoveDirection.F_LEFT_DIAG: 7,
-        MoveDirection.F_RIGHT_DIAG: 9,
-        MoveDirection.B_LEFT_DIAG: -9,
-        MoveDirection.B_RIGHT_DIAG: -7,
-        MoveDirection.L_SHAPE: [-17, -15, -10, -6, 6, 10, 15, 17]
+    __slots__ = ['start', 'end', 'piece', 'captured', 'captured_index', 'rook_start', 'rook_end', 'castling_rights',
+                 'king_position', 'en_passant_info', 'current_player', 'halfmove_clock', 'zobrist_key']
+
+    def __init__(self, start, end, piece):
+        self.start = start
+        self.end = end
+        self.piece = piece
+        self.captured = None
+        self.captured_index = end
+        self.rook_start = None
+        self.rook_end = None
+        self.castling_rights = 0
+        self.king_position = None
+        self.en_passant_info = None
+        self.current_player = None
+        self.halfmove_clock = None
+        self.zobrist_key = None
+
+
+class ChessBoard:
+
+    # Types a pawn can promote to when it reaches the last row.
+    PROMOTION_TYPES = (Type.ROOK, Type.KNIGHT, Type.BISHOP, Type.QUEEN)
+    PROMOTION_PIECES = {Type.ROOK: Rook, Type.KNIGHT: Knight, Type.BISHOP: Bishop, Type.QUEEN: Queen}
+
+    # FEN castle field letters in the order they are written.
+    CASTLE_LETTERS = (
+        (Color.WHITE, MoveDirection.RIGHT, 'K'),
+        (Color.WHITE, MoveDirection.LEFT, 'Q'),
+        (Color.BLACK, MoveDirection.LEFT, 'k'),
+        (Color.BLACK, MoveDirection.RIGHT, 'q')
+    )
+
+    # Castling rights bit for each king and direction. The same bits as Fen.castling_rights.
+    CASTLE_BITS = {
+        Color.WHITE: {MoveDirection.RIGHT: Fen.CASTLE_BITS['K'], MoveDirection.LEFT: Fen.CASTLE_BITS['Q']},
+        Color.BLACK: {MoveDirection.LEFT: Fen.CASTLE_BITS['k'], MoveDirection.RIGHT: Fen.CASTLE_BITS['q']}
+    }
+    CASTLE_COLOR_BITS = {color: sum(bits.values()) for color, bits in CASTLE_BITS.items()}
+
+    # Castling right lost when a piece moves from or to a rook's starting square. Moving the rook away or capturing it
+    # takes away the right to castle with it.
+    CASTLE_CORNER_BITS = {
+        mailbox.INDEXES['a1']: Fen.CASTLE_BITS['Q'], mailbox.INDEXES['h1']: Fen.CASTLE_BITS['K'],
+        mailbox.INDEXES['a8']: Fen.CASTLE_BITS['q'], mailbox.INDEXES['h8']: Fen.CASTLE_BITS['k']
+    }
+
+    # Starting squares of the kings and the rooks a king castles with.
+    CASTLE_KING_INDEXES = {Color.WHITE: mailbox.INDEXES['e1'], Color.BLACK: mailbox.INDEXES['e8']}
+    CASTLE_ROOK_INDEXES = {
+        Color.WHITE: {MoveDirection.LEFT: mailbox.INDEXES['a1'], MoveDirection.RIGHT: mailbox.INDEXES['h1']},
+        Color.BLACK: {MoveDirection.LEFT: mailbox.INDEXES['h8'], MoveDirection.RIGHT: mailbox.INDEXES['a8']}
     }
 
     def __init__(self, fen=None):
@@ -39,26 +148,43 @@ class ChessBoard:
             Object containing initial board configuration
         :return:
         """
-        board_length = self.get_dimension()
-
         # Hold en passant target square. Needed to be able to do en passant check.
         self._en_passant_info = {'target_position': None, 'pawn_position': None}
 
-        # List of all squares with algebraic notation.
-        self._board_positions = [file+str(rank+1) for rank in range(0, board_length) for file in "abcdefgh"]
+        # Player to move. Set to the opposite color of whichever piece moved last.
+        self._current_player = fen.current_player if fen else Color.WHITE
 
-        # Dictionary of all pieces on board keyed by the algebraic notation.
-        self._pieces = {file + str(rank + 1): None for rank in range(0, board_length) for file in "abcdefgh"}
+        # Plies since the last capture or pawn move, for the fifty move rule, and number of the current full move.
+        self._halfmove_clock = fen.halfmove_clock if fen else 0
+        self._fullmove_number = fen.fullmove_number if fen else 1
+
+        # 10x12 mailbox of piece codes. Ray walks and attack tests only ever look at this list. See src.board.mailbox
+        # for the layout.
+        self._board = list(mailbox.EMPTY_BOARD)
+
+        # Piece objects for the occupied squares, indexed the same way as the mailbox.
+        self._pieces = [None] * mailbox.SIZE
         self._king_positions = {Color.WHITE: None, Color.BLACK: None}
 
-        # Dictionary mapping of algebraic notation to index values. The board is a flat list and position a1 is index 0.
-        # This mapping allows for quick offset computations. Shifting over to the right by the board width will move us
-        # up one square.
-        self._indexes = {Color.WHITE: {}, Color.BLACK: {}}
-        for position, index in zip(self._board_positions, range(0, board_length**2)):
-            self._indexes[Color.WHITE][position] = index
-        for position, index in zip(reversed(self._board_positions), range(0, board_length**2)):
-            self._indexes[Color.BLACK][position] = index
+        # Castling rights as CASTLE_BITS. A bit is cleared once its king or rook moves. Whether a pawn can still move
+        # forward two squares does not need to be kept, since only pawns that have not moved are on their starting row.
+        self._castling_rights = fen.castling_rights if fen else 0
+
+        # Zobrist hash of the position. Pieces are hashed in as they are placed and removed. _state_key is the part of
+        # the hash that covers castling and en passant, so it can be swapped out whenever that info might change.
+        self._zobrist_key = 0
+        self._state_key = 0
+        if self._current_player == Color.BLACK:
+            self._zobrist_key ^= zobrist.BLACK_TO_MOVE
+
+        # Piece counts packed into one int. See src.board.material.
+        self._material_signature = 0
+
+        # FEN placement string for each row, a1 row first. None when the row changed since it was last rendered.
+        self._row_strings = [None] * 8
+
+        # True while the square arrays might be shared with a copy-on-write clone. See clone.
+        self._shared = False
 
         if fen and fen.board:
             # Set en passant position if there is one
@@ -69,24 +195,17 @@ class ChessBoard:
                 self._en_passant_info['pawn_position'] = push_pawn
 
             for position, piece in fen.board.items():
-                self._pieces[position] = copy.deepcopy(piece)
+                self._place_piece(mailbox.INDEXES[position], piece)
 
                 # Set king positions
                 if piece.type == Type.KING:
                     self._king_positions[piece.color] = position
 
-            # Update king move directions
-            for direction in [MoveDirection.LEFT, MoveDirection.RIGHT]:
-                if self._king_positions[Color.WHITE]:
-                    king = self[self._king_positions[Color.WHITE]]
-                    if direction not in fen.white_castle:
-                        king.move_directions[direction] = 1
-
-            for direction in [MoveDirection.LEFT, MoveDirection.RIGHT]:
-                if self[self._king_positions[Color.BLACK]]:
-                    king = self[self._king_positions[Color.BLACK]]
-                    if direction not in fen.black_castle:
-                        king.move_directions[direction] = 1
+            # A king that is not on its starting square has moved and cannot castle
+            for color, king_index in self.CASTLE_KING_INDEXES.items():
+                if self._board[king_index] != mailbox.KING | mailbox.COLOR_CODES[color]:
+                    self._castling_rights &= ~self.CASTLE_COLOR_BITS[color]
+        self._update_state_key()
 
     def is_position_occupied(self, position):
         """
@@ -99,8 +218,9 @@ class ChessBoard:
         """
         ChessHelper.validate_position(position)
 
-        return self._pieces[position] is not None
+        return self._board[mailbox.INDEXES[position]] != mailbox.EMPTY
 
+    @instrumented('ChessBoard.is_check')
     def is_check(self, king_color, position=None, ghost_pieces=None):
         """
         Test for check against king of the specified color.
@@ -121,43 +241,124 @@ class ChessBoard:
         if not self._king_positions[king_color]:
             return False
 
-        # Check file and rank
-        diagonal_pieces = (Type.QUEEN, Type.BISHOP)
-        file_and_rank_pieces = (Type.ROOK, Type.QUEEN)
-        pawn_capture_directions = (MoveDirection.F_RIGHT_DIAG, MoveDirection.F_LEFT_DIAG)
-        opponent_piece_list = {
-            MoveDirection.FORWARD: file_and_rank_pieces,
-            MoveDirection.F_RIGHT_DIAG: diagonal_pieces,
-            MoveDirection.RIGHT: file_and_rank_pieces,
-            MoveDirection.B_RIGHT_DIAG: diagonal_pieces,
-            MoveDirection.BACKWARD: file_and_rank_pieces,
-            MoveDirection.B_LEFT_DIAG: diagonal_pieces,
-            MoveDirection.LEFT: file_and_rank_pieces,
-            MoveDirection.F_LEFT_DIAG: diagonal_pieces
-        }
+        board = self._board
+        if ghost_pieces:
+            board = list(board)
+            for ghost_position, ghost in ghost_pieces.items():
+                ghost_code = mailbox.EMPTY
+                if ghost:
+                    ghost_code = mailbox.TYPE_CODES[ghost['type']] | mailbox.COLOR_CODES[ghost['color']]
+                board[mailbox.INDEXES[ghost_position]] = ghost_code
+
+        return self._is_attacked(board, mailbox.INDEXES[king_position], king_color)
+
+    @property
+    def current_player(self):
+        # Color of the player to move
+        return self._current_player
+
+    @property
+    def halfmove_clock(self):
+        # Plies since the last capture or pawn move
+        return self._halfmove_clock
+
+    @property
+    def fullmove_number(self):
+        # Starts at 1 and goes up after every black move
+        return self._fullmove_number
+
+    @property
+    def material_signature(self):
+        # Count of every kind of piece on the board, with bishops counted by square color
+        return self._material_signature
+
+    @property
+    def zobrist_key(self):
+        # 64 bit hash of piece placement, side to move, castling rights and en passant file
+        return self._zobrist_key
+
+    @instrumented('ChessBoard.get_fen')
+    def get_fen(self):
+        """
+        Generate a FEN string for the board. Rows are only re-rendered after a piece on them has changed, so calling
+        this after every move is cheap.
 
-        for direction, pieces in opponent_piece_list.items():
-            ghost_pieces = {} if not ghost_pieces else ghost_pieces
-            nearest_piece = self._get_nearest_piece_in_direction(king_position, direction, king_color, ghost_pieces)
-            if nearest_piece and nearest_piece['color'] != king_color:
-                offset = nearest_piece['offset']
-                piece_type = nearest_piece['type']
-                if direction in pawn_capture_directions and offset == 1 and piece_type == Type.PAWN:
-                    return True
-                elif offset == 1 and piece_type == Type.KING:
-                    return True
-                elif piece_type in pieces:
-                    return True
+        :return: string
+            FEN string with all six fields.
+        """
+        row_strings = self._row_strings
+        for row, row_string in enumerate(row_strings):
+            if row_string is None:
+                row_strings[row] = self._render_row(row)
+
+        castle = ''.join(letter for color, direction, letter in self.CASTLE_LETTERS
+                         if direction in self.get_castle_directions(color))
+
+        return '{} {} {} {} {} {}'.format(
+            '/'.join(reversed(row_strings)),
+            'w' if self._current_player == Color.WHITE else 'b',
+            castle if castle else '-',
+            self._en_passant_info['target_position'] or '-',
+            self._halfmove_clock,
+            self._fullmove_number
+        )
+
+    def get_packed_position(self):
+        """
+        Pack the position into a fixed size binary record. Unpack it with PackedPosition, giving the move counters
+        separately. See src.board.packed.
 
-        # Color doesnt matter here
-        l_shape_positions = self._get_possible_positions(king_position, MoveDirection.L_SHAPE, king_color)
-        for position in l_shape_positions:
-            if self.is_position_occupied(position):
-                piece = self[position]
-                if piece.type == Type.KNIGHT and piece.color != king_color:
-                    return True
+        :return: bytes
+        """
+        board = self._board
+        pawn_position = self._en_passant_info['pawn_position'] if self._en_passant_info['target_position'] else None
+        return packed.pack_position([board[index] for index in mailbox.BOARD_INDEXES], self._current_player,
+                                    self._castling_rights, packed.SQUARES[pawn_position] if pawn_position else None)
 
-        return False
+    def get_castle_directions(self, color):
+        """
+        Retrieve the directions a king still has the right to castle in. Unlike can_castle, this ignores whether
+        castling is possible right now. Ex The king is in check or a piece is in the way.
+
+        :param color: Color
+            Color of the king.
+        :return: list
+            MoveDirection.LEFT and/or MoveDirection.RIGHT.
+        """
+        if self._board[self.CASTLE_KING_INDEXES[color]] != mailbox.KING | mailbox.COLOR_CODES[color]:
+            return []
+
+        rook = mailbox.ROOK | mailbox.COLOR_CODES[color]
+        castle_bits = self.CASTLE_BITS[color]
+        return [direction for direction, rook_index in self.CASTLE_ROOK_INDEXES[color].items()
+                if self._castling_rights & castle_bits[direction] and self._board[rook_index] == rook]
+
+    def get_move_directions(self, position):
+        """
+        Retrieve the directions the piece on a position can move in, taking into account what it has done so far. Ex A
+        pawn that already moved can only move forward one square.
+
+        :param position: string
+            Algebraic notation position.
+        :return: dict
+            [MoveDirection]: Most squares the piece can move in the direction. -1 for no limit. Empty if there is no
+            piece on the position.
+        """
+        ChessHelper.validate_position(position)
+
+        index = mailbox.INDEXES[position]
+        piece = self._pieces[index]
+        if not piece:
+            return {}
+
+        move_directions = dict(piece.move_directions)
+        if piece.type == Type.PAWN and not self._is_pawn_home_row(index, piece.color):
+            move_directions[MoveDirection.FORWARD] = 1
+        elif piece.type == Type.KING:
+            for direction, castle_bit in self.CASTLE_BITS[piece.color].items():
+                move_directions[direction] = 2 if self._castling_rights & castle_bit else 1
+
+        return move_directions
 
     def get_enpassant_position(self):
         """
@@ -175,20 +376,11 @@ class ChessBoard:
         :return: bool
             True if king is in checkmate, False otherwise.
         """
-        # TODO confirm no piece can block the piece putting king in check. If there is a piece,
-        # need to be sure piece is not pinned
-        king_position = self._king_positions[king_color]
-        # is_check needs to return piece, piece position, and attack squares for piece putting king in check
-        # Can piece putting king in check be captured
-        # Can a non pinned piece block
-        # Iterate over list of pieces.
-        # Check if a piece possible moves includes capturing the piece putting king in check. Ghost piece trying to move
-        # and piece putting king in check
-        # Check if a piece possible moves includes attack squares Ghost piece trying to move
-        # Maybe just create method to return dict of all non pinned pieces
-        check = self.is_check(king_color)
-        possible_moves = self.get_legal_moves(king_position)
-        return check and not possible_moves
+        king_safety = self._get_king_safety(king_color)
+        if not king_safety[0]:
+            return False
+
+        return not self._has_check_evasion(king_color, king_safety)
 
     def is_stalemate(self, color):
         """
@@ -199,19 +391,55 @@ class ChessBoard:
         :return: bool
             True if the game is a stalemate, False otherwise.
         """
-        # TODO add check for insufficient material to checkmate opponent
-        legal_moves_available = False
-        for position, piece in self._pieces.items():
-            if piece and piece.color == color:
-                legal_moves = self.get_legal_moves(position)
-                if legal_moves:
-                    legal_moves_available = True
+        return not self.is_check(color) and not self.has_any_legal_move(color)
 
-        king_in_check = self.is_check(color)
+    def is_insufficient_material(self):
+        """
+        Test if neither player has enough pieces left to checkmate. Ex King and knight against king, or kings and
+        bishops that are all on the same square color.
 
-        return not king_in_check and not legal_moves_available
+        :return: bool
+            True if the game is a draw by insufficient material, False otherwise.
+        """
+        return self._material_signature in material.INSUFFICIENT_MATERIAL
 
-    def move_piece(self, start_position, end_position):
+    def clone(self, copy_on_write=False):
+        """
+        Create a copy of the board. Only the square arrays and a few small fields are copied, which is much faster than
+        deepcopy or going through a FEN string. Pieces are shared, so they are never copied.
+
+        :param copy_on_write: bool
+            If True the copy shares the square arrays with this board until either board makes a change, at which point
+            that board takes its own copy. Clones that are only read from then cost next to nothing. Reading a
+            board never changes the squares it shares, so clones of one board can be read from different threads at
+            once.
+        :return: ChessBoard
+        """
+        board = self.__class__.__new__(self.__class__)
+        board._en_passant_info = dict(self._en_passant_info)
+        board._current_player = self._current_player
+        board._halfmove_clock = self._halfmove_clock
+        board._fullmove_number = self._fullmove_number
+        board._king_positions = dict(self._king_positions)
+        board._castling_rights = self._castling_rights
+        board._zobrist_key = self._zobrist_key
+        board._state_key = self._state_key
+        board._material_signature = self._material_signature
+
+        if copy_on_write:
+            board._board = self._board
+            board._pieces = self._pieces
+            board._row_strings = self._row_strings
+            board._shared = self._shared = True
+        else:
+            board._board = list(self._board)
+            board._pieces = list(self._pieces)
+            board._row_strings = list(self._row_strings)
+            board._shared = False
+        return board
+
+    @instrumented('ChessBoard.move_piece')
+    def move_piece(self, start_position, end_position, promotion=None):
         """
         Move piece from starting position to end position. Does not check if end position is valid. Ex. king in check
         or if overtaking square with piece of same color. Also does not check if moving piece has passed through other
@@ -221,6 +449,8 @@ class ChessBoard:
             Algebraic notation position.
         :param end_position: string
             Algebraic notation position.
+        :param promotion: Type
+            Type a pawn moving to the last row becomes, a key of PROMOTION_PIECES. None for any other move.
         :return: dict
             [position]: Piece. Use None if position is now empty
         """
@@ -231,79 +461,129 @@ class ChessBoard:
         if not start_position_piece:
             raise EmptyPositionError(start_position)
 
-        updated_positions = {}
-        move_info = self._direction_and_position_offset(start_position, end_position, start_position_piece.color)
-        direction = move_info['direction']
-        column_offset, row_offset = move_info['offset']
-
-        # Copy of en_passant info
-        en_passant_info = copy.copy(self._en_passant_info)
-
-        # Have to clone the piece before moving it. Otherwise, it makes it really hard to compare
-        # expected move result to actual move result since the piece here could have a modified
-        # move_directions . Plus, we don't really care about any values other than piece type and color
-        updated_positions[start_position] = None
-        updated_positions[end_position] = copy.deepcopy(start_position_piece)
-
-        if start_position_piece.type == Type.PAWN and row_offset == 2:
-            tartget_position = self._get_position_shifted_by_offset(start_position, MoveDirection.FORWARD, 1,
-                                                                    start_position_piece.color)
-            en_passant_info['pawn_position'] = end_position
-            en_passant_info['target_position'] = tartget_position
-        else:
-            en_passant_info['pawn_position'] = None
-            en_passant_info['target_position'] = None
-
-        # Check pawn special movements
-        if start_position_piece.type == Type.PAWN:
-            # Update move_directions after pawn moves forward twice
-            if start_position_piece.move_directions[MoveDirection.FORWARD] > 1:
-                start_position_piece.move_directions[MoveDirection.FORWARD] = 1
-            # Check for en passant
-            if self.can_en_passant(start_position, direction):
-                self._remove_piece(self._en_passant_info['pawn_position'])
-                updated_positions[self._en_passant_info['pawn_position']] = None
-        # Check for castling
-        elif start_position_piece.type == Type.KING:
-            if abs(column_offset) == 2 and self.can_castle(start_position_piece.color, direction):
-                rook_positions = {
-                    Color.WHITE: {MoveDirection.LEFT: 'a1', MoveDirection.RIGHT: 'h1'},
-                    Color.BLACK: {MoveDirection.LEFT: 'h8', MoveDirection.RIGHT: 'a8'}
-                }
-                new_rook_position = self._get_position_shifted_by_offset(start_position, direction, 1,
-                                                                     start_position_piece.color)
-                self[new_rook_position] = self[rook_positions[start_position_piece.color][direction]]
-                self._remove_piece(rook_positions[start_position_piece.color][direction])
-                updated_positions[new_rook_position] = copy.deepcopy(self[new_rook_position])
-                updated_positions[rook_positions[start_position_piece.color][direction]] = None
-
-                # Update King left and right move_directions
-                start_position_piece.move_directions[MoveDirection.LEFT] = 1
-                start_position_piece.move_directions[MoveDirection.RIGHT] = 1
-
-            start_position_piece.move_directions[MoveDirection.LEFT] = 1
-            start_position_piece.move_directions[MoveDirection.RIGHT] = 1
-        elif start_position_piece.type == Type.ROOK:
-            king_position = self._king_positions[start_position_piece.color]
-            column, row = self.position_to_row_and_column(start_position, start_position_piece.color)
-            rook_direction = None
-            if column == 0:
-                rook_direction = MoveDirection.LEFT
-            elif column == self.get_dimension() - 1:
-                rook_direction = MoveDirection.RIGHT
-            # Check needed because might be dealing with a board without a king
-            if king_position and rook_direction:
-                king = self[king_position]
-                if king.move_directions[rook_direction] > 1:
-                    king.move_directions[rook_direction] = 1
+        updated_positions = {
+            start_position: None,
+            end_position: self.PROMOTION_PIECES[promotion](start_position_piece.color) if promotion else
+            start_position_piece
+        }
 
-        self._en_passant_info = en_passant_info
-        self._remove_piece(start_position)
-        self._remove_piece(end_position)
-        self[end_position] = start_position_piece
+        undo = self.make_move((start_position, end_position, promotion))
+        if undo.captured_index != undo.end:
+            updated_positions[mailbox.INDEX_POSITIONS[undo.captured_index]] = None
+        if undo.rook_start is not None:
+            updated_positions[mailbox.INDEX_POSITIONS[undo.rook_end]] = self._pieces[undo.rook_end]
+            updated_positions[mailbox.INDEX_POSITIONS[undo.rook_start]] = None
 
         return updated_positions
 
+    def make_move(self, move):
+        """
+        Make a move on the board and return what is needed to take it back. Like move_piece, the move is not checked
+        for legality.
+
+        :param move: tuple
+            (start position, end position, promotion) as yielded by generate_legal_moves. promotion is the Type the
+            pawn becomes, or None.
+        :return: MoveUndo
+            Pass to unmake_move to restore the board to how it was before the move.
+        :raises: EmptyPositionError
+            If there is no piece on the start position.
+        """
+        start_position, end_position, promotion = move
+        start = mailbox.INDEXES[start_position]
+        end = mailbox.INDEXES[end_position]
+        piece = self._pieces[start]
+        if not piece:
+            raise EmptyPositionError(start_position)
+
+        color = piece.color
+        piece_type = self._board[start] & mailbox.TYPE_MASK
+        if self._shared:
+            self._unshare()
+        undo = MoveUndo(start, end, piece)
+        undo.zobrist_key = self._zobrist_key
+        undo.en_passant_info = self._en_passant_info
+        undo.current_player = self._current_player
+        undo.halfmove_clock = self._halfmove_clock
+        undo.king_position = self._king_positions[color]
+        undo.castling_rights = self._castling_rights
+
+        en_passant_info = {'target_position': None, 'pawn_position': None}
+        if piece_type == mailbox.PAWN:
+            if abs(end - start) == 2 * mailbox.WIDTH:
+                en_passant_info['target_position'] = mailbox.INDEX_POSITIONS[(start + end) // 2]
+                en_passant_info['pawn_position'] = end_position
+            elif (end - start) % mailbox.WIDTH and end_position == self._en_passant_info['target_position']:
+                undo.captured_index = mailbox.INDEXES[self._en_passant_info['pawn_position']]
+        elif piece_type == mailbox.KING:
+            if abs(end - start) == 2:
+                direction = MoveDirection.RIGHT if (end > start) == (color == Color.WHITE) else MoveDirection.LEFT
+                if self.can_castle(color, direction):
+                    undo.rook_start = self.CASTLE_ROOK_INDEXES[color][direction]
+                    undo.rook_end = start + mailbox.OFFSETS[color][direction]
+            self._castling_rights &= ~self.CASTLE_COLOR_BITS[color]
+        if self._castling_rights:
+            self._castling_rights &= ~(self.CASTLE_CORNER_BITS.get(start, 0) | self.CASTLE_CORNER_BITS.get(end, 0))
+
+        undo.captured = self._pieces[undo.captured_index]
+        if undo.captured:
+            self._clear_square(undo.captured_index)
+        self._clear_square(start)
+        self._place_piece(end, self.PROMOTION_PIECES[promotion](color) if promotion else piece)
+        if piece_type == mailbox.KING:
+            self._king_positions[color] = end_position
+
+        if undo.rook_start is not None:
+            rook = self._pieces[undo.rook_start]
+            self._clear_square(undo.rook_start)
+            self._place_piece(undo.rook_end, rook)
+
+        self._en_passant_info = en_passant_info
+        self._halfmove_clock = 0 if piece_type == mailbox.PAWN or undo.captured else self._halfmove_clock + 1
+        if color == Color.BLACK:
+            self._fullmove_number += 1
+        next_player = Color.BLACK if color == Color.WHITE else Color.WHITE
+        if self._current_player != next_player:
+            self._current_player = next_player
+            self._zobrist_key ^= zobrist.BLACK_TO_MOVE
+        self._update_state_key()
+
+        return undo
+
+    def unmake_move(self, undo):
+        """
+        Take back a move made by make_move. Moves have to be taken back in the reverse order they were made.
+
+        :param undo: MoveUndo
+            Value returned by make_move.
+        :return:
+        """
+        if self._shared:
+            self._unshare()
+        piece = undo.piece
+        color = piece.color
+
+        if undo.rook_start is not None:
+            rook = self._pieces[undo.rook_end]
+            self._clear_square(undo.rook_end)
+            self._place_piece(undo.rook_start, rook)
+
+        self._clear_square(undo.end)
+        self._place_piece(undo.start, piece)
+        if undo.captured:
+            self._place_piece(undo.captured_index, undo.captured)
+
+        self._king_positions[color] = undo.king_position
+        self._castling_rights = undo.castling_rights
+
+        self._en_passant_info = undo.en_passant_info
+        self._current_player = undo.current_player
+        self._halfmove_clock = undo.halfmove_clock
+        if color == Color.BLACK:
+            self._fullmove_number -= 1
+        self._zobrist_key = undo.zobrist_key
+        self._state_key = self._get_state_key()
+
     def can_castle(self, king_color, direction):
         """
         Check if a king can castle or not.
@@ -322,7 +602,6 @@ class ChessBoard:
         nearest_piece_info = self._get_nearest_piece_in_direction(king_position, direction, king_color)
 
         if nearest_piece_info and nearest_piece_info['type'] == Type.ROOK:
-            king = self[king_position]
             is_check = self.is_check(king_color, king_position)
             if king_color == Color.WHITE:
                 expected_rook_offset = 3 if direction == MoveDirection.RIGHT else 4
@@ -330,12 +609,11 @@ class ChessBoard:
                 expected_rook_offset = 4 if direction == MoveDirection.RIGHT else 3
             is_expected_offset = expected_rook_offset == nearest_piece_info['offset']
 
-            if king.move_directions[direction] == 2 and not is_check and is_expected_offset:
-                king_index = self._position_to_index(king_position, king.color)
-                index_one = king_index + self.PIECE_SHIFTING[direction]
-                index_two = index_one + self.PIECE_SHIFTING[direction]
-                position_one_is_check = self.is_check(king_color, self._index_to_position(index_one, king_color))
-                position_two_is_check = self.is_check(king_color, self._index_to_position(index_two, king_color))
+            if self._castling_rights & self.CASTLE_BITS[king_color][direction] and not is_check and is_expected_offset:
+                position_one = self._get_position_shifted_by_offset(king_position, direction, 1, king_color)
+                position_two = self._get_position_shifted_by_offset(king_position, direction, 2, king_color)
+                position_one_is_check = self.is_check(king_color, position_one)
+                position_two_is_check = self.is_check(king_color, position_two)
                 if not position_one_is_check and not position_two_is_check:
                     return True
 
@@ -360,12 +638,13 @@ class ChessBoard:
             return False
 
         # Check if en_passant target_position is equal to the position passed in
-        new_position = self._get_position_shifted_by_offset(position, direction, 1, pawn.color)
-        if new_position == self._en_passant_info['target_position']:
+        ray = mailbox.POSITION_RAYS[pawn.color][direction][mailbox.INDEXES[position]]
+        if ray and ray[0] == self._en_passant_info['target_position']:
             return True
 
         return False
 
+    @instrumented('ChessBoard.get_legal_moves')
     def get_legal_moves(self, position):
         """
         Retrieve a list of all legal moves for the piece currently occupying the supplied position.
@@ -378,100 +657,100 @@ class ChessBoard:
         if not self.is_position_occupied(position):
             return []
 
-        possible_moves = []
-        piece_on_position = self[position]
-        piece_move_directions = piece_on_position.move_directions
-        piece_king_position = self._king_positions[piece_on_position.color]
-
-        # TODO Refactor. Code is hard to follow
-        for move_direction, num_spaces in piece_move_directions.items():
-            possible_positions = self._get_possible_positions(position, move_direction, piece_on_position.color)
-
-            # Handle special case for Knight
-            if move_direction == MoveDirection.L_SHAPE:
-                for possible_position in possible_positions:
-                    ghost_pieces = {
-                        position: None,
-                        possible_position: {
-                            'color': piece_on_position.color,
-                            'type': piece_on_position.type
-                        }
-                    }
+        index = mailbox.INDEXES[position]
+        king_safety = self._get_king_safety(self._pieces[index].color)
 
-                    if not self.is_check(piece_on_position.color, piece_king_position, ghost_pieces):
-                        piece_on_destination = self.is_position_occupied(possible_position)
-                        if not piece_on_destination:
-                            possible_moves.append(possible_position)
-                        elif self[possible_position].color != piece_on_position.color:
-                            possible_moves.append(possible_position)
+        return [mailbox.INDEX_POSITIONS[target] for target in self._get_legal_targets(index, king_safety)]
 
-            # Every other piece
-            else:
-                piece_num_spaces = piece_on_position.move_directions[move_direction]
-                num_spaces = len(possible_positions) if piece_num_spaces == -1 else num_spaces
-                num_spaces = min(len(possible_positions), num_spaces)
-
-                for position_num, possible_position in enumerate(possible_positions[0:num_spaces]):
-                    destination_occupied = self.is_position_occupied(possible_position)
-                    # Ignore the current position when performing a test for check. Also place piece on possible
-                    # position as a ghost piece. Needed to know if when moved to possible position, the king is still
-                    # not in check
-                    ghost_pieces = {
-                        position: None,
-                        possible_position: {
-                            'color': piece_on_position.color,
-                            'type': piece_on_position.type
-                        }
-                    }
+    def generate_legal_moves(self, color):
+        """
+        Generate every legal move for a player. The safety of the king is worked out once and shared by every piece.
+        Moves are generated lazily, so stopping early skips the work for the remaining pieces.
+
+        :param color: Color
+            Color of the player to generate moves for.
+        :return: generator
+            Yields (start position, end position, promotion) tuples. promotion is None unless a pawn is moving to the
+            last row, in which case there is one move for every type in PROMOTION_TYPES.
+        """
+        board = self._board
+        color_code = mailbox.COLOR_CODES[color]
+        king_safety = self._get_king_safety(color)
+        last_rank = '8' if color == Color.WHITE else '1'
+
+        for index in mailbox.BOARD_INDEXES:
+            code = board[index]
+            if code == mailbox.EMPTY or code & mailbox.BLACK != color_code:
+                continue
+
+            start_position = mailbox.INDEX_POSITIONS[index]
+            is_pawn = code & mailbox.TYPE_MASK == mailbox.PAWN
+            for target in self._get_legal_targets(index, king_safety):
+                end_position = mailbox.INDEX_POSITIONS[target]
+                if is_pawn and end_position[1] == last_rank:
+                    for piece_type in self.PROMOTION_TYPES:
+                        yield start_position, end_position, piece_type
+                else:
+                    yield start_position, end_position, None
+
+    def has_any_legal_move(self, color):
+        """
+        Test if a player has at least one legal move. Stops at the first legal move found. The king is tried first,
+        then the pieces that are not pinned. Pinned pieces are tried last since they are the least likely to move.
 
-                    if piece_on_position.type == Type.KING:
-                        if not self.is_check(piece_on_position.color, possible_position, ghost_pieces):
-                            try:
-                                can_castle = self.can_castle(piece_on_position.color, move_direction)
-                            except ValueError:
-                                can_castle = False
-                            finally:
-                                king_index = self._position_to_index(position, piece_on_position.color)
-                                possible_index = self._position_to_index(possible_position, piece_on_position.color)
-                                distance = abs(king_index - possible_index)
-
-                            # Only add position two squares away if castling is possible
-                            if can_castle and distance == 2:
-                                possible_moves.append(possible_position)
-                            elif not destination_occupied and distance != 2:
-                                possible_moves.append(possible_position)
-                            elif destination_occupied and self[possible_position].color != piece_on_position.color and\
-                                    distance != 2:
-                                possible_moves.append(possible_position)
-                                break
-                        else:  # Piece is same color as one we are working with
-                            break
-                    elif piece_on_position.type == Type.PAWN and not self.is_check(piece_on_position.color, piece_king_position, ghost_pieces):
-                        if (not destination_occupied and move_direction != MoveDirection.F_LEFT_DIAG
-                                and move_direction != MoveDirection.F_RIGHT_DIAG):
-                            possible_moves.append(possible_position)
-                        elif (self[possible_position] and self[possible_position].color != piece_on_position.color and
-                              (move_direction == MoveDirection.F_LEFT_DIAG or
-                               move_direction == MoveDirection.F_RIGHT_DIAG) and
-                              position_num == 0):
-                            possible_moves.append(possible_position)
-                            break
-                        elif (move_direction == MoveDirection.F_LEFT_DIAG or
-                              move_direction == MoveDirection.F_RIGHT_DIAG) and\
-                                self.can_en_passant(position, move_direction):
-                            possible_moves.append(possible_position)
-                        else:  # Piece is same color as one we are working with
-                            break
-                    elif not self.is_check(piece_on_position.color, piece_king_position, ghost_pieces):
-                        if not destination_occupied:
-                            possible_moves.append(possible_position)
-                        elif self[possible_position].color != piece_on_position.color:
-                            possible_moves.append(possible_position)
-                            break
-                        else:  # Piece is same color as one we are working with
-                            break
-
-        return possible_moves
+        :param color: Color
+            Color of the player.
+        :return: bool
+            True if the player can move, False otherwise.
+        """
+        king_safety = self._get_king_safety(color)
+        checkers, _, pins = king_safety
+        if checkers:
+            return self._has_check_evasion(color, king_safety)
+
+        king_position = self._king_positions[color]
+        if king_position and self._get_legal_targets(mailbox.INDEXES[king_position], king_safety):
+            return True
+
+        board = self._board
+        color_code = mailbox.COLOR_CODES[color]
+        for index in mailbox.BOARD_INDEXES:
+            code = board[index]
+            if code == mailbox.EMPTY or code & mailbox.BLACK != color_code:
+                continue
+            if code & mailbox.TYPE_MASK == mailbox.KING or index in pins:
+                continue
+            if self._get_legal_targets(index, king_safety):
+                return True
+
+        for index in pins:
+            if self._get_legal_targets(index, king_safety):
+                return True
+
+        return False
+
+    def compute_king_safety(self, color):
+        """
+        Find the pieces checking the king of the specified color, the squares that block each check and the pieces
+        pinned to the king. Done in one scan outward from the king.
+
+        :param color: Color
+            Color of the king.
+        :return: KingSafety
+        """
+        king_safety = KingSafety()
+        checkers, blocks, pins = self._get_king_safety(color)
+        king_safety.checkers = [mailbox.INDEX_POSITIONS[checker] for checker in checkers]
+        king_safety.block_positions = {
+            mailbox.INDEX_POSITIONS[checker]: [mailbox.INDEX_POSITIONS[block] for block in blocks[checker]]
+            for checker in checkers
+        }
+        king_safety.pins = {
+            mailbox.INDEX_POSITIONS[pinned]: sorted(mailbox.INDEX_POSITIONS[square] for square in ray)
+            for pinned, ray in pins.items()
+        }
+
+        return king_safety
 
     def get_board_pieces(self):
         """
@@ -481,7 +760,7 @@ class ChessBoard:
             Every square on the board is returned. They key to each square is the algebraic notation of that square and
             the value is None if there is not a piece.
         """
-        return copy.deepcopy(self._pieces)
+        return {position: self._pieces[mailbox.INDEXES[position]] for position in mailbox.POSITIONS}
 
     def get_dimension(self):
         """
@@ -517,92 +796,276 @@ class ChessBoard:
 
         return column, row
 
-    def _get_possible_positions(self, start_position, move_direction, piece_color):
+    def _get_pseudo_legal_moves(self, index):
         """
-        Get a list of all possible positions in the direction provided as if the board were empty. Positions returned
-        are in algebraic notation.
+        Retrieve the moves for the piece on a square without considering the safety of its king. Castling moves are
+        only included when the king can castle.
 
-        :param start_position: string
-            Algebraic notation position.
-        :param move_direction: int
-            Direction to move. Ex MoveDirection.forward
-        :param piece_color: Color
-            Color of player who's perspective should be used.
+        :param index: int
+            Mailbox index of an occupied square.
         :return: list
-            List of positions in algebraic notation. Positions in the list are sorted by the offset from the start
-            position. Index 0 is the nearest position in the specified direction.
+            (destination index, captured index) pairs. The captured index is the square emptied by a capture, which is
+            the destination index for every move except en passant.
         """
-        ChessHelper.validate_position(start_position)
-
-        possible_positions = []
-        current_index = next_index = self._position_to_index(start_position, piece_color)
-        current_column, current_row = self.position_to_row_and_column(
-            self._index_to_position(current_index, piece_color),
-            piece_color)
-        if move_direction == MoveDirection.L_SHAPE:
-            for shift in self.PIECE_SHIFTING[MoveDirection.L_SHAPE]:
-                try:
-                    next_index = current_index + shift
-                    self._index_to_position(next_index, piece_color)
-                except InvalidIndexError:
+        board = self._board
+        piece = self._pieces[index]
+        color = piece.color
+        color_code = board[index] & mailbox.BLACK
+        piece_type = board[index] & mailbox.TYPE_MASK
+        rays = mailbox.RAYS[color]
+
+        candidates = []
+        if piece_type == mailbox.PAWN:
+            for target in rays[MoveDirection.FORWARD][index][0:2 if self._is_pawn_home_row(index, color) else 1]:
+                if board[target] != mailbox.EMPTY:
+                    break
+                candidates.append((target, target))
+            for direction in [MoveDirection.F_LEFT_DIAG, MoveDirection.F_RIGHT_DIAG]:
+                ray = rays[direction][index]
+                if not ray:
                     continue
-                else:
-                    next_column, next_row = self.position_to_row_and_column(
-                        self._index_to_position(next_index, piece_color),
-                        piece_color)
-                    column_diff = abs(next_column - current_column)
-                    if current_row != next_row and column_diff <= 2:
-                        possible_positions.append(self._index_to_position(next_index, piece_color))
+                target_code = board[ray[0]]
+                if target_code != mailbox.EMPTY and target_code & mailbox.BLACK != color_code:
+                    candidates.append((ray[0], ray[0]))
+                elif self.can_en_passant(mailbox.INDEX_POSITIONS[index], direction):
+                    candidates.append((ray[0], mailbox.INDEXES[self._en_passant_info['pawn_position']]))
+        elif piece_type == mailbox.KNIGHT:
+            for target in mailbox.KNIGHT_JUMPS[index]:
+                target_code = board[target]
+                if target_code == mailbox.EMPTY or target_code & mailbox.BLACK != color_code:
+                    candidates.append((target, target))
         else:
-            num_spaces = self._get_direction_square_count(start_position, move_direction, piece_color)
-            for count in range(0, num_spaces):
-                next_index += self.PIECE_SHIFTING[move_direction]
-                possible_positions.append(self._index_to_position(next_index, piece_color))
+            for direction in piece.move_directions:
+                ray = rays[direction][index]
+                # Kings only step one square. Moving two squares to castle is handled below.
+                if piece_type == mailbox.KING:
+                    ray = ray[0:1]
+                for target in ray:
+                    target_code = board[target]
+                    if target_code == mailbox.EMPTY:
+                        candidates.append((target, target))
+                    else:
+                        if target_code & mailbox.BLACK != color_code:
+                            candidates.append((target, target))
+                        break
+
+            if piece_type == mailbox.KING:
+                for direction in [MoveDirection.LEFT, MoveDirection.RIGHT]:
+                    if self.can_castle(color, direction):
+                        target = rays[direction][index][1]
+                        candidates.append((target, target))
+
+        return candidates
+
+    def _get_legal_targets(self, index, king_safety):
+        """
+        Filter the pseudo legal moves for the piece on a square down to the legal ones.
 
-        return possible_positions
+        :param index: int
+            Mailbox index of an occupied square.
+        :param king_safety: tuple
+            Result of _get_king_safety for the color of the piece.
+        :return: list
+            Mailbox indexes the piece can move to.
+        """
+        color = self._pieces[index].color
+        piece_type = self._board[index] & mailbox.TYPE_MASK
+        checkers, blocks, pins = king_safety
+
+        # Only the king can move out of a double check.
+        if len(checkers) > 1 and piece_type != mailbox.KING:
+            return []
 
-    def _get_direction_square_count(self, start_position, move_direction, piece_color):
+        candidates = self._get_pseudo_legal_moves(index)
+        king_position = self._king_positions[color]
+        if not king_position:
+            return [target for target, _ in candidates]
+
+        # Kings have to test every destination since moving can step into an attack.
+        if piece_type == mailbox.KING:
+            return [target for target, captured in candidates
+                    if not self._is_attacked_after_move(index, target, captured, target, color)]
+
+        evasions = None
+        if checkers:
+            evasions = set(blocks[checkers[0]])
+            evasions.add(checkers[0])
+        pin_ray = pins.get(index)
+
+        legal_targets = []
+        for target, captured in candidates:
+            if target != captured:
+                # En passant empties a square off the destination, which can expose the king along the rank. Rare
+                # enough to just make the move and look.
+                if not self._is_attacked_after_move(index, target, captured, mailbox.INDEXES[king_position], color):
+                    legal_targets.append(target)
+            elif (evasions is None or target in evasions) and (pin_ray is None or target in pin_ray):
+                legal_targets.append(target)
+
+        return legal_targets
+
+    def _has_check_evasion(self, color, king_safety):
         """
-        Retrieve the number of squares from the starting position to the edge of the board in the direction specified.
+        Test if a player in check has a move that gets out of check. Only the moves that could possibly help are looked
+        at: king moves, captures of the checking piece and moves onto the squares between the checking piece and the
+        king. Pinned pieces can never help, so they are skipped.
 
-        :param start_position: string
-            Algebraic notation position.
-        :param move_direction: int
-            Direction to work in. Ex MoveDirection.forward
-        :param piece_color: Color
-            Color of player who's perspective should be used.
-        :return: int
-            Number of squares till the edge of the board.
+        :param color: Color
+            Color of the player in check.
+        :param king_safety: tuple
+            Result of _get_king_safety for the player. Must contain at least one checker.
+        :return: bool
+            True if the player can get out of check, False otherwise.
         """
-        ChessHelper.validate_position(start_position)
+        checkers, blocks, pins = king_safety
+        king_index = mailbox.INDEXES[self._king_positions[color]]
+
+        if self._get_legal_targets(king_index, king_safety):
+            return True
+
+        # Only the king can move out of a double check.
+        if len(checkers) > 1:
+            return False
+
+        checker = checkers[0]
+        for index in self._get_movers(checker, color, True):
+            if index not in pins:
+                return True
+
+        # Pawn giving check might have just moved two squares and be capturable en passant.
+        if self._en_passant_info['pawn_position'] == mailbox.INDEX_POSITIONS[checker]:
+            target = mailbox.INDEXES[self._en_passant_info['target_position']]
+            pawn = mailbox.PAWN | mailbox.COLOR_CODES[color]
+            for index in (checker - 1, checker + 1):
+                if self._board[index] == pawn and \
+                        not self._is_attacked_after_move(index, target, checker, king_index, color):
+                    return True
+
+        for block in blocks[checker]:
+            for index in self._get_movers(block, color, False):
+                if index not in pins:
+                    return True
+
+        return False
+
+    def _get_movers(self, index, color, capture):
+        """
+        Find the pieces of a color that could move to a square, ignoring the safety of their king. Kings are left out.
+
+        :param index: int
+            Mailbox index of the square.
+        :param color: Color
+            Color of the pieces to look for.
+        :param capture: bool
+            True if the square holds an opponent piece, False if it is empty. Pawns capture and push differently.
+        :return: generator
+            Yields mailbox indexes of the pieces.
+        """
+        board = self._board
+        color_code = mailbox.COLOR_CODES[color]
+        rays = mailbox.RAYS[color]
+
+        for direction in mailbox.ORTHOGONAL_DIRECTIONS + mailbox.DIAGONAL_DIRECTIONS:
+            slider = mailbox.BISHOP if direction in mailbox.DIAGONAL_DIRECTIONS else mailbox.ROOK
+            for target in rays[direction][index]:
+                code = board[target]
+                if code == mailbox.EMPTY:
+                    continue
+                piece_type = code & mailbox.TYPE_MASK
+                if code & mailbox.BLACK == color_code and (piece_type == slider or piece_type == mailbox.QUEEN):
+                    yield target
+                break
+
+        knight = mailbox.KNIGHT | color_code
+        for target in mailbox.KNIGHT_JUMPS[index]:
+            if board[target] == knight:
+                yield target
+
+        # Pawns move forward, so look for them behind the square from the perspective of their color.
+        pawn = mailbox.PAWN | color_code
+        if capture:
+            for direction in [MoveDirection.B_LEFT_DIAG, MoveDirection.B_RIGHT_DIAG]:
+                ray = rays[direction][index]
+                if ray and board[ray[0]] == pawn:
+                    yield ray[0]
+        else:
+            ray = rays[MoveDirection.BACKWARD][index]
+            if ray and board[ray[0]] == pawn:
+                yield ray[0]
+            elif len(ray) > 1 and board[ray[0]] == mailbox.EMPTY and board[ray[1]] == pawn and \
+                    self._is_pawn_home_row(ray[1], color):
+                yield ray[1]
+
+    def _is_pawn_home_row(self, index, color):
+        """
+        Test if a square is on the row a pawn starts on. Pawns cannot move backward, so a pawn there has not moved and
+        can move forward two squares.
 
-        board_length = self.get_dimension()
-        max_movement = board_length - 1
-        num_spaces = max_movement
-        current_x_coord, current_y_coord = self.position_to_row_and_column(start_position, piece_color)
-
-        if move_direction == MoveDirection.FORWARD:
-            max_movement = board_length - current_y_coord - 1
-        elif move_direction == MoveDirection.F_RIGHT_DIAG:
-            from_right = board_length - current_x_coord - 1
-            from_top = board_length - current_y_coord - 1
-            max_movement = min(from_top, from_right)
-        elif move_direction == MoveDirection.RIGHT:
-            max_movement = board_length - current_x_coord - 1
-        elif move_direction == MoveDirection.B_RIGHT_DIAG:
-            from_right = board_length - current_x_coord - 1
-            max_movement = min(current_y_coord, from_right)
-        elif move_direction == MoveDirection.BACKWARD:
-            max_movement = current_y_coord
-        elif move_direction == MoveDirection.B_LEFT_DIAG:
-            max_movement = min(current_y_coord, current_x_coord)
-        elif move_direction == MoveDirection.LEFT:
-            max_movement = current_x_coord
-        elif move_direction == MoveDirection.F_LEFT_DIAG:
-            from_top = board_length - current_y_coord - 1
-            max_movement = min(from_top, current_x_coord)
-
-        return min(num_spaces, max_movement)
+        :param index: int
+            Mailbox index of the square.
+        :param color: Color
+            Color of the pawn.
+        :return: bool
+        """
+        return index // mailbox.WIDTH - 2 == mailbox.PAWN_HOME_ROWS[color]
+
+    def _get_king_safety(self, color):
+        """
+        Scan outward from the king of the specified color once to find checking pieces and pinned pieces.
+
+        :param color: Color
+            Color of the king.
+        :return: tuple
+            (checkers, blocks, pins). checkers is a list of mailbox indexes of pieces giving check. blocks maps each
+            checker to a tuple of indexes between it and the king. pins maps the index of each pinned piece to a
+            frozenset of the indexes it can move to without exposing the king, including the pinning piece.
+        """
+        checkers = []
+        blocks = {}
+        pins = {}
+
+        king_position = self._king_positions[color]
+        if not king_position:
+            return checkers, blocks, pins
+
+        board = self._board
+        king_index = mailbox.INDEXES[king_position]
+        opponent = mailbox.BLACK if color == Color.WHITE else 0
+        rays = mailbox.RAYS[color]
+
+        for direction in mailbox.ORTHOGONAL_DIRECTIONS + mailbox.DIAGONAL_DIRECTIONS:
+            ray = rays[direction][king_index]
+            slider = mailbox.BISHOP if direction in mailbox.DIAGONAL_DIRECTIONS else mailbox.ROOK
+            pinned = None
+            for distance, target in enumerate(ray):
+                code = board[target]
+                if code == mailbox.EMPTY:
+                    continue
+                if code & mailbox.BLACK != opponent:
+                    # First piece of the king's color might be pinned. A second one shields both.
+                    if pinned is None:
+                        pinned = target
+                        continue
+                    break
+
+                piece_type = code & mailbox.TYPE_MASK
+                is_slider = piece_type == slider or piece_type == mailbox.QUEEN
+                if pinned is not None:
+                    if is_slider:
+                        pins[pinned] = frozenset(ray[0:distance + 1])
+                elif is_slider or (distance == 0 and (piece_type == mailbox.KING or (
+                        piece_type == mailbox.PAWN and direction in mailbox.FORWARD_DIAGONAL_DIRECTIONS))):
+                    checkers.append(target)
+                    blocks[target] = ray[0:distance]
+                break
+
+        knight = mailbox.KNIGHT | opponent
+        for target in mailbox.KNIGHT_JUMPS[king_index]:
+            if board[target] == knight:
+                checkers.append(target)
+                blocks[target] = ()
+
+        return checkers, blocks, pins
 
     def _get_position_shifted_by_offset(self, position, direction, offset, piece_color):
         """
@@ -617,64 +1080,132 @@ class ChessBoard:
             Color.white or Colore.black
         :return: string
             Algebraic notation position.
+        :raises: InvalidIndexError
+            If shifting over moves off of the board.
         """
         ChessHelper.validate_position(position)
 
-        index = self._position_to_index(position, piece_color)
-        shifted_index = index + self.PIECE_SHIFTING[direction] * offset
-        return self._index_to_position(shifted_index, piece_color)
+        shifted_index = mailbox.INDEXES[position] + mailbox.OFFSETS[piece_color][direction] * offset
+        if shifted_index < 0 or shifted_index >= mailbox.SIZE or self._board[shifted_index] == mailbox.OFF_BOARD:
+            raise InvalidIndexError(shifted_index)
 
-    def _position_to_index(self, position, piece_color):
+        return mailbox.INDEX_POSITIONS[shifted_index]
+
+    def _remove_piece(self, position):
         """
-        Convert an algebraic notation position to an index.
+        Remove a piece from the board.
 
         :param position: string
             Algebraic notation for a position.
-        :param piece_color: Color
-            Color of player who's perspective should be used.
-        :return: int
-            Index for that position.
+        :return:
+        :raises: InvalidPositionError
+            If position is not valid, exception will be raised.
         """
         ChessHelper.validate_position(position)
 
-        return self._indexes[piece_color][position]
+        if self._shared:
+            self._unshare()
+        self._clear_square(mailbox.INDEXES[position])
+        self._update_state_key()
 
-    def _index_to_position(self, index, piece_color):
+    def _get_state_key(self):
         """
-        Convert an index to an algebraic notation position.
+        Hash the castling rights of each king and the en passant file.
+
+        :return: int
+        """
+        state_key = 0
+        for color, castle_keys in zobrist.CASTLE.items():
+            for direction in self.get_castle_directions(color):
+                state_key ^= castle_keys[direction]
+
+        target_position = self._en_passant_info['target_position']
+        if target_position:
+            state_key ^= zobrist.EN_PASSANT[target_position[0]]
+
+        return state_key
+
+    def _update_state_key(self):
+        """
+        Swap the castling and en passant part of the Zobrist hash for the current one.
 
-        :param index: int
-            Index in _board_positions list.
-        :param piece_color: Color
-            Color of player who's perspective should be used.
         :return:
         """
-        if not self._is_valid_index(index):
-            raise InvalidIndexError(index)
+        state_key = self._get_state_key()
+        self._zobrist_key ^= self._state_key ^ state_key
+        self._state_key = state_key
 
-        if piece_color == Color.WHITE:
-            position = self._board_positions[index]
-        else:
-            position = self._board_positions[len(self._indexes[piece_color]) - index - 1]
+    def _render_row(self, row):
+        """
+        Render the FEN placement string for one row.
 
-        return position
+        :param row: int
+            Row number. 0 for the row with a1 and 7 for the row with a8.
+        :return: string
+        """
+        row_string = ''
+        empty_count = 0
+        board = self._board
+        first_index = mailbox.BOARD_INDEXES[row * 8]
+        for index in range(first_index, first_index + 8):
+            code = board[index]
+            if code == mailbox.EMPTY:
+                empty_count += 1
+                continue
+            if empty_count:
+                row_string += str(empty_count)
+                empty_count = 0
+            row_string += mailbox.CODE_LETTERS[code]
 
-    def _remove_piece(self, position):
+        return row_string + str(empty_count) if empty_count else row_string
+
+    def _place_piece(self, index, piece):
         """
-        Remove a piece from the board.
+        Put a piece on a square, replacing whatever was there.
 
-        :param position: string
-            Algebraic notation for a position.
+        :param index: int
+            Mailbox index of the square.
+        :param piece: Piece
+            Piece object.
         :return:
-        :raises: InvalidPositionError
-            If position is not valid, exception will be raised.
         """
-        ChessHelper.validate_position(position)
+        self._clear_square(index)
+        code = mailbox.piece_code(piece)
+        self._board[index] = code
+        self._pieces[index] = piece
+        self._row_strings[index // mailbox.WIDTH - 2] = None
+        self._zobrist_key ^= zobrist.PIECES[code][index]
+        self._material_signature += material.KEYS[code][index]
+
+    def _unshare(self):
+        """
+        Take a private copy of the square arrays shared with a copy-on-write clone. Called before any change to the
+        squares.
 
-        # Color does not matter since both indexes point to the same board
-        index = self._indexes[Color.WHITE][position]
-        self._pieces[self._board_positions[index]] = None
+        :return:
+        """
+        self._board = list(self._board)
+        self._pieces = list(self._pieces)
+        self._row_strings = list(self._row_strings)
+        self._shared = False
 
+    def _clear_square(self, index):
+        """
+        Remove the piece on a square if there is one.
+
+        :param index: int
+            Mailbox index of the square.
+        :return:
+        """
+        code = self._board[index]
+        if code != mailbox.EMPTY:
+            self._zobrist_key ^= zobrist.PIECES[code][index]
+            self._material_signature -= material.KEYS[code][index]
+            self._board[index] = mailbox.EMPTY
+            self._pieces[index] = None
+            self._row_strings[index // mailbox.WIDTH - 2] = None
+
+    @instrumented('ChessBoard._get_nearest_piece_in_direction')
     def _get_nearest_piece_in_direction(self, start_position, move_direction, piece_color, ghost_pieces=None):
         """
         Get the nearest piece from the starting position heading in the direction specified. Not expecting
@@ -696,109 +1227,121 @@ class ChessBoard:
         """
         ChessHelper.validate_position(start_position)
 
-        offset = 0
-        positions = self._get_possible_positions(start_position, move_direction, piece_color)
-
-        for position in positions:
-            offset += 1
-            piece_on_destination = self.is_position_occupied(position)
-
-            ghost_pieces = {} if not ghost_pieces else ghost_pieces
-            if position in ghost_pieces and not ghost_pieces[position]:
-                continue
-            elif position in ghost_pieces:
-                return {
-                    'position': position,
-                    'color': ghost_pieces[position]['color'],
-                    'offset': offset,
-                    'type': ghost_pieces[position]['type']
-                }
-            elif piece_on_destination:
-                piece = self[position]
+        ghosts = {}
+        if ghost_pieces:
+            ghosts = {mailbox.INDEXES[position]: ghost for position, ghost in ghost_pieces.items()}
+
+        board = self._board
+        ray = mailbox.RAYS[piece_color][move_direction][mailbox.INDEXES[start_position]]
+        for offset, index in enumerate(ray, 1):
+            if index in ghosts:
+                ghost = ghosts[index]
+                if ghost:
+                    return {
+                        'position': mailbox.INDEX_POSITIONS[index],
+                        'color': ghost['color'],
+                        'offset': offset,
+                        'type': ghost['type']
+                    }
+            elif board[index] != mailbox.EMPTY:
+                code = board[index]
                 return {
-                    'position': position,
-                    'color': piece.color,
+                    'position': mailbox.INDEX_POSITIONS[index],
+                    'color': mailbox.CODE_COLORS[code],
                     'offset': offset,
-                    'type': piece.type
+                    'type': mailbox.CODE_TYPES[code]
                 }
 
         return None
 
-    def _is_valid_index(self, index):
+    def _is_attacked(self, board, index, color):
         """
-        Check if an index is in valid range
+        Test if a square is attacked by any piece not of the specified color.
 
+        :param board: list
+            Mailbox of piece codes to test against.
         :param index: int
-            Index value
-        """
-        if index < 0 or index >= self.get_dimension() ** 2:
-            return False
-        return True
-
-    def _on_same_row(self, position_one, position_two):
-        """
-        Determine if both positions are on the same row.
-
-        :param position_one: string
-            Position in algebraic notation.
-        :param position_two: string
-            Position in algebraic notation.
-        :return:
+            Mailbox index of the square.
+        :param color: Color
+            Color of the player who's perspective should be used. Pieces of this color are never attackers.
+        :return: bool
+            True if the square is attacked, False otherwise.
         """
-        # Color does not matter when checking if on same row
-        column_one, row_one = self.position_to_row_and_column(position_one, Color.WHITE)
-        column_two, row_two = self.position_to_row_and_column(position_two, Color.WHITE)
+        opponent = mailbox.BLACK if color == Color.WHITE else 0
+        rays = mailbox.RAYS[color]
+        empty = mailbox.EMPTY
+
+        for direction in mailbox.ORTHOGONAL_DIRECTIONS:
+            ray = rays[direction][index]
+            for target in ray:
+                code = board[target]
+                if code != empty:
+                    if code & mailbox.BLACK == opponent:
+                        piece_type = code & mailbox.TYPE_MASK
+                        if piece_type == mailbox.ROOK or piece_type == mailbox.QUEEN:
+                            return True
+                        if piece_type == mailbox.KING and target == ray[0]:
+                            return True
+                    break
+
+        for direction in mailbox.DIAGONAL_DIRECTIONS:
+            ray = rays[direction][index]
+            for target in ray:
+                code = board[target]
+                if code != empty:
+                    if code & mailbox.BLACK == opponent:
+                        piece_type = code & mailbox.TYPE_MASK
+                        if piece_type == mailbox.BISHOP or piece_type == mailbox.QUEEN:
+                            return True
+                        if target == ray[0]:
+                            if piece_type == mailbox.KING:
+                                return True
+                            # Pawns only attack the squares diagonally in front of them. So look for them diagonally
+                            # in front of the square from the perspective of the color being attacked.
+                            if piece_type == mailbox.PAWN and direction in mailbox.FORWARD_DIAGONAL_DIRECTIONS:
+                                return True
+                    break
+
+        knight = mailbox.KNIGHT | opponent
+        for target in mailbox.KNIGHT_JUMPS[index]:
+            if board[target] == knight:
+                return True
 
-        return row_one == row_two
+        return False
 
-    def _direction_and_position_offset(self, start_position, end_position, color):
+    def _is_attacked_after_move(self, index, target, captured, defended_index, color):
         """
-        Determine the direction and number of positions away end_position is relative to start_position.
+        Make a move on the mailbox, test if a square is attacked and then take the move back. While the squares are
+        shared with a copy-on-write clone the move is made on a scratch copy instead, so readers of the clone never
+        see it.
 
-        :param start_position: string
-            Position in algebraic notation.
-        :param end_position: string
-            Position in algebraic notation.
-        :param color: int
-            Dictionary where MoveDirection is the key and value is a tuple containing the number of rows and columns
-            end_position is away. Treats start_position as 0,0 on x,y coordinate system. Ex a2 would be (1,1) from a1
-        :return: MoveDirection value
+        :param index: int
+            Mailbox index of the piece moving.
+        :param target: int
+            Mailbox index the piece is moving to.
+        :param captured: int
+            Mailbox index emptied by the move. Same as target except for en passant.
+        :param defended_index: int
+            Mailbox index of the square to test. Normally the king of the moving piece.
+        :param color: Color
+            Color of the piece moving.
+        :return: bool
+            True if the square is attacked after the move, False otherwise.
         """
-        ChessHelper.validate_position(start_position)
-        ChessHelper.validate_position(end_position)
+        board = list(self._board) if self._shared else self._board
+        moving_code = board[index]
+        target_code = board[target]
+        captured_code = board[captured]
 
-        start_column, start_row = self.position_to_row_and_column(start_position, color)
-        end_column, end_row = self.position_to_row_and_column(end_position, color)
-        row_diff = end_row - start_row
-        column_diff = end_column - start_column
-
-        # Compute offsets
-        is_forward = row_diff > 0
-        is_back = row_diff < 0
-        is_right = column_diff > 0
-        is_left = column_diff < 0
-
-        # Determine direction
-        if is_forward and is_right:
-            positions_away = {'direction': MoveDirection.F_RIGHT_DIAG, 'offset': (column_diff, row_diff)}
-        elif is_forward and is_left:
-            positions_away = {'direction': MoveDirection.F_LEFT_DIAG, 'offset':  (column_diff, row_diff)}
-        elif is_back and is_right:
-            positions_away = {'direction': MoveDirection.B_RIGHT_DIAG, 'offset':  (column_diff, row_diff)}
-        elif is_back and is_left:
-            positions_away = {'direction': MoveDirection.B_LEFT_DIAG, 'offset':  (column_diff, row_diff)}
-        elif is_forward:
-            positions_away = {'direction': MoveDirection.FORWARD, 'offset':  (column_diff, row_diff)}
-        elif is_back:
-            positions_away = {'direction': MoveDirection.BACKWARD, 'offset':  (column_diff, row_diff)}
-        elif is_right:
-            positions_away = {'direction': MoveDirection.RIGHT, 'offset':  (column_diff, row_diff)}
-        elif is_left:
-            positions_away = {'direction': MoveDirection.LEFT, 'offset': (column_diff, row_diff)}
-        else:
-            positions_away = {'direction': None, 'offset': (0, 0)}
+        board[captured] = mailbox.EMPTY
+        board[index] = mailbox.EMPTY
+        board[target] = moving_code
+        attacked = self._is_attacked(board, defended_index, color)
+        board[target] = target_code
+        board[captured] = captured_code
+        board[index] = moving_code
 
-        return positions_away
+        return attacked
 
     def __str__(self):
         """
@@ -808,18 +1351,16 @@ class ChessBoard:
             Board from white players perspective. All white pieces are a capital letter and black pieces are lowercase.
             Hashes represent a blank square.
         """
-        board_size = self.get_dimension()
-        rank_count = self.get_dimension()
         return_val = ''
-        for rank in range(rank_count * 7, -board_size, -board_size):
-            return_val += str(rank_count) + " "
-            for file in self._board_positions[rank: rank + board_size]:
-                if self._pieces[file] is None:
+        for rank in '87654321':
+            return_val += rank + " "
+            for file in 'abcdefgh':
+                piece = self._pieces[mailbox.INDEXES[file + rank]]
+                if piece is None:
                     return_val += "# "
                 else:
-                    return_val += str(self._pieces[file]) + " "
+                    return_val += str(piece) + " "
             return_val += '\n'
-            rank_count -= 1
 
         return_val += "  "
         for file_letter in "abcdefgh":
@@ -836,7 +1377,14 @@ class ChessBoard:
         :return: Piece
             Return a piece object if a piece exist at the supplied position. Return None if there is no piece.
         """
-        return self._pieces[position]
+        return self._pieces[mailbox.INDEXES[position]]
+
+    def __copy__(self):
+        return self.clone()
+
+    def __deepcopy__(self, memo):
+        # Pieces are shared and everything else is copied by clone
+        return self.clone()
 
     def __setitem__(self, position, piece):
         """
@@ -850,9 +1398,17 @@ class ChessBoard:
         """
         ChessHelper.validate_position(position)
 
-        self._pieces[position] = copy.deepcopy(piece)
+        if self._shared:
+            self._unshare()
+        self._place_piece(mailbox.INDEXES[position], piece)
         if piece.type == Type.KING:
             self._king_positions[piece.color] = position
+            # A king put on its starting square has not moved, so it can castle with any rook on its starting square
+            if mailbox.INDEXES[position] == self.CASTLE_KING_INDEXES[piece.color]:
+                self._castling_rights |= self.CASTLE_COLOR_BITS[piece.color]
+            else:
+                self._castling_rights &= ~self.CASTLE_COLOR_BITS[piece.color]
+        self._update_state_key()
 
 
 if __name__ == '__main__':
@@ -1,5 +1,5 @@
 import copy
-import re
+from src.board import mailbox
 from src.piece.pawn import Pawn
 from src.piece.rook import Rook
 from src.piece.knight import Knight
@@ -8,6 +8,7 @@ from src.piece.queen import Queen
 from src.piece.king import King
 from src.piece.color import Color
 from src.piece.move_direction import MoveDirection
+from src.utils.instrumentation import instrumented
 from operator import attrgetter
 
 
@@ -30,28 +31,67 @@ class Fen:
     Class used to parse FEN strings.
     """
 
+    DEFAULT_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+    # Piece class and color for each letter of the board field
+    PIECES = {
+        'P': (Pawn, Color.WHITE), 'R': (Rook, Color.WHITE), 'N': (Knight, Color.WHITE),
+        'B': (Bishop, Color.WHITE), 'Q': (Queen, Color.WHITE), 'K': (King, Color.WHITE),
+        'p': (Pawn, Color.BLACK), 'r': (Rook, Color.BLACK), 'n': (Knight, Color.BLACK),
+        'b': (Bishop, Color.BLACK), 'q': (Queen, Color.BLACK), 'k': (King, Color.BLACK)
+    }
+
+    EMPTY_SQUARES = {str(count): count for count in range(1, 9)}
+
+    # Castle field letters. Black directions are from black's point of view.
+    CASTLE_DIRECTIONS = {
+        'K': (Color.WHITE, MoveDirection.RIGHT), 'Q': (Color.WHITE, MoveDirection.LEFT),
+        'k': (Color.BLACK, MoveDirection.LEFT), 'q': (Color.BLACK, MoveDirection.RIGHT)
+    }
+
+    # Bit for each castle field letter in castling_rights
+    CASTLE_BITS = {'K': 1, 'Q': 2, 'k': 4, 'q': 8}
+
+    # Every valid castle field. Letters have to appear in KQkq order.
+    CASTLE_FIELDS = frozenset(['-'] + [
+        ''.join(letter for bit, letter in enumerate('KQkq') if combination >> bit & 1)
+        for combination in range(1, 16)
+    ])
+
+    EN_PASSANT_POSITIONS = frozenset(file + rank for file in 'abcdefgh' for rank in '36')
+
+    @instrumented('Fen.parse')
     def __init__(self, fen=None, validate=True):
         """
         Initialize fen object
         :param fen: string
             Valid FEN string
+        :param validate: bool
+            Raise FenIncorrectFormatError if the FEN string is not formatted correctly.
+        :raises: FenIncorrectFormatError
         """
-        default_fen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -'
-        fen = fen if fen else default_fen
+        fen = fen if fen else self.DEFAULT_FEN
+        fen_pieces = fen.split()
 
-        # Basic validation
-        pattern = r'([rnbqkRNBQK1-8]+\/)([rnbqkpRNBQKP1-8]+\/){6}([rnbqkRNBQK1-8]+)\s[bw]\s(-|K?Q?k?q?)\s(-|[a-h][36])'
         if validate:
-            if not re.match(pattern, fen):
-                raise FenIncorrectFormatError('Invalid formatted fen. Valid example: ' + default_fen)
-
-        fen_pieces = re.split(r'\s+', fen)
-
-        self._board = self._parse_board(fen_pieces[0])
+            if len(fen_pieces) not in (4, 6) or fen_pieces[1] not in ('w', 'b') or \
+                    fen_pieces[2] not in self.CASTLE_FIELDS or \
+                    (fen_pieces[3] != '-' and fen_pieces[3] not in self.EN_PASSANT_POSITIONS):
+                self._raise_format_error()
+            # Move counters are optional. If given, both have to be there.
+            if len(fen_pieces) == 6 and (not fen_pieces[4].isdigit() or not fen_pieces[5].isdigit() or
+                                         int(fen_pieces[5]) < 1):
+                self._raise_format_error()
+
+        self._board = self._parse_board(fen_pieces[0], validate)
         self._current_player = Color.WHITE if fen_pieces[1].lower() == 'w' else Color.BLACK
         self._black_castle = self._parse_castle(fen_pieces[2], Color.BLACK)
         self._white_castle = self._parse_castle(fen_pieces[2], Color.WHITE)
+        self._castling_rights = sum(self.CASTLE_BITS.get(letter, 0) for letter in set(fen_pieces[2]))
         self._en_passant_position = None if fen_pieces[3] == '-' else fen_pieces[3]
+        # Four field FEN strings leave out the counters. Treat them as the start of a game.
+        self._halfmove_clock = int(fen_pieces[4]) if len(fen_pieces) > 4 and fen_pieces[4].isdigit() else 0
+        self._fullmove_number = int(fen_pieces[5]) if len(fen_pieces) > 5 and fen_pieces[5].isdigit() else 1
 
     @property
     def board(self):
@@ -69,12 +109,29 @@ class Fen:
     def white_castle(self):
         return copy.copy(self._white_castle)
 
+    @property
+    def castling_rights(self):
+        # CASTLE_BITS of the letters in the castle field
+        return self._castling_rights
+
     @property
     def en_passant_position(self):
         return self._en_passant_position
 
+    @property
+    def halfmove_clock(self):
+        # Plies since the last capture or pawn move
+        return self._halfmove_clock
+
+    @property
+    def fullmove_number(self):
+        # Starts at 1 and goes up after every black move
+        return self._fullmove_number
+
     @classmethod
-    def generate_fen(cls, board, current_player, white_castle, black_castle, en_passant):
+    @instrumented('Fen.generate_fen')
+    def generate_fen(cls, board, current_player, white_castle, black_castle, en_passant, halfmove_clock=0,
+                     fullmove_number=1):
         # TODO add some validation
         rows = '87654321'
         columns = 'abcdefgh'
@@ -113,20 +170,22 @@ class Fen:
 
         fen_current_player = 'w' if current_player == Color.WHITE else 'b'
 
+        # Letters have to be written in KQkq order
         fen_white_castle = ''
-        for direction in white_castle:
-            fen_white_castle += 'K' if direction == MoveDirection.RIGHT else 'Q'
+        fen_white_castle += 'K' if MoveDirection.RIGHT in white_castle else ''
+        fen_white_castle += 'Q' if MoveDirection.LEFT in white_castle else ''
 
         fen_black_castle = ''
-        for direction in black_castle:
-            fen_black_castle += 'q' if direction == MoveDirection.RIGHT else 'k'
+        fen_black_castle += 'k' if MoveDirection.LEFT in black_castle else ''
+        fen_black_castle += 'q' if MoveDirection.RIGHT in black_castle else ''
 
         fen_castle_info = '{}{}'.format(fen_white_castle, fen_black_castle)
         fen_castle_info = fen_castle_info if fen_castle_info else '-'
 
         fen_enpassant = en_passant if en_passant else '-'
 
-        return '{} {} {} {}'.format(fen_board, fen_current_player, fen_castle_info, fen_enpassant)
+        return '{} {} {} {} {} {}'.format(fen_board, fen_current_player, fen_castle_info, fen_enpassant, halfmove_clock,
+                                          fullmove_number)
 
     def _parse_castle(self, castle, color):
         """
@@ -140,48 +199,57 @@ class Fen:
             List containing MoveDirection enum for the direction
             the king can castle in
         """
-        if castle == '-':
-            return []
-
         castle_directions = []
-        pattern = {Color.WHITE: r'[KQ]', Color.BLACK: r'[kq]'}
-        if color == Color.WHITE:
-            direction = {'k': MoveDirection.RIGHT, 'q': MoveDirection.LEFT}
-        else:
-            direction = {'k': MoveDirection.LEFT, 'q': MoveDirection.RIGHT}
         for letter in castle:
-            match = re.search(pattern[color], letter)
-            if match:
-                castle_directions.append(direction[match.string.lower()])
+            letter_color, direction = self.CASTLE_DIRECTIONS.get(letter, (None, None))
+            if letter_color == color:
+                castle_directions.append(direction)
 
         castle_directions.sort(key=attrgetter('value'))
         return castle_directions
 
-    def _parse_board(self, fen_board):
+    def _parse_board(self, fen_board, validate=True):
         """
-        Parse board portion of FEN string
+        Parse board portion of FEN string in a single pass over the characters.
 
         :param fen_board: string
             Board portion
+        :param validate: bool
+            Raise FenIncorrectFormatError if the board is not formatted correctly.
         :return: dict
             Dictionary of position to Piece objects
+        :raises: FenIncorrectFormatError
         """
         board = {}
-        rows = '87654321'
-        columns = 'abcdefgh'
-        piece_types = {'p': Pawn, 'r': Rook, 'n': Knight, 'b': Bishop, 'q': Queen, 'k': King}
-        fen_rows = fen_board.split('/')
-        for current_row, row in enumerate(fen_rows):
-            current_column = 0
-            for letter in row:
-                match = re.match(r'[prnbqk]', letter, re.IGNORECASE)
-                if match:
-                    color = Color.WHITE if match.string.isupper() else Color.BLACK
-                    letter = match.string.lower()
-                    board[columns[current_column] + rows[current_row]] = piece_types[letter](color)
-                    current_column += 1
-                elif re.match(r'[1-8]', letter):
-                    num = int(letter)
-                    current_column += num
+        pieces = self.PIECES
+        empty_squares = self.EMPTY_SQUARES
+        positions = mailbox.POSITIONS
+
+        # Square number of a1 is 0 and h8 is 63. Start at a8.
+        row = 7
+        column = 0
+        for letter in fen_board:
+            if letter == '/':
+                if validate and (column != 8 or row == 0):
+                    self._raise_format_error()
+                row -= 1
+                column = 0
+            elif letter in empty_squares:
+                column += empty_squares[letter]
+            elif letter in pieces:
+                if validate and (column > 7 or (letter in 'pP' and (row == 0 or row == 7))):
+                    self._raise_format_error()
+                if column < 8:
+                    piece_class, color = pieces[letter]
+                    board[positions[row * 8 + column]] = piece_class(color)
+                column += 1
+            elif validate:
+                self._raise_format_error()
+
+        if validate and (column != 8 or row != 0):
+            self._raise_format_error()
 
         return board
+
+    def _raise_format_error(self):
+        raise FenIncorrectFormatError('Invalid formatted fen. Valid example: ' + self.DEFAULT_FEN)
@@ -0,0 +1,160 @@
+"""
+Layout of the 10x12 mailbox array ChessBoard keeps its pieces in.
+
+The 8x8 board sits in the middle of a 10 column by 12 row array. The two rows above and below the board and the column
+on either side of it hold OFF_BOARD, so walking a ray or making a knight jump from any square can never wrap around an
+edge or run off the end of the array. Square a1 is index 21, h1 is index 28 and h8 is index 98.
+
+Every square holds a small int. EMPTY for an empty square, OFF_BOARD for the border and a piece code otherwise. A piece
+code keeps the piece type in the low three bits and the color in the fourth bit.
+"""
+from types import MappingProxyType
+from src.piece.color import Color
+from src.piece.type import Type
+from src.piece.move_direction import MoveDirection
+
+
+SIZE = 120
+WIDTH = 10
+
+EMPTY = 0
+OFF_BOARD = -1
+
+BLACK = 8
+TYPE_MASK = 7
+
+TYPE_CODES = {
+    Type.PAWN: 1,
+    Type.KNIGHT: 2,
+    Type.BISHOP: 3,
+    Type.ROOK: 4,
+    Type.QUEEN: 5,
+    Type.KING: 6
+}
+COLOR_CODES = {Color.WHITE: 0, Color.BLACK: BLACK}
+
+# Piece code lookups. Index with a piece code to get the type or color back.
+CODE_TYPES = [None] * 16
+CODE_COLORS = [None] * 16
+for _piece_type, _type_code in TYPE_CODES.items():
+    for _color, _color_code in COLOR_CODES.items():
+        CODE_TYPES[_type_code | _color_code] = _piece_type
+        CODE_COLORS[_type_code | _color_code] = _color
+del _piece_type, _type_code, _color, _color_code
+CODE_TYPES = tuple(CODE_TYPES)
+CODE_COLORS = tuple(CODE_COLORS)
+
+# FEN letter for each piece code. Uppercase for white, lowercase for black.
+CODE_LETTERS = tuple(
+    None if piece_type is None else ('PNBRQK'[TYPE_CODES[piece_type] - 1] if color == Color.WHITE else
+                                     'pnbrqk'[TYPE_CODES[piece_type] - 1])
+    for piece_type, color in zip(CODE_TYPES, CODE_COLORS)
+)
+
+PAWN = TYPE_CODES[Type.PAWN]
+KNIGHT = TYPE_CODES[Type.KNIGHT]
+BISHOP = TYPE_CODES[Type.BISHOP]
+ROOK = TYPE_CODES[Type.ROOK]
+QUEEN = TYPE_CODES[Type.QUEEN]
+KING = TYPE_CODES[Type.KING]
+
+# Algebraic notation for every square, a1 first and h8 last.
+POSITIONS = tuple(file + str(rank + 1) for rank in range(0, 8) for file in 'abcdefgh')
+
+# Mapping of algebraic notation to mailbox index and back. INDEX_POSITIONS holds None for border indexes.
+INDEXES = {position: 21 + (number % 8) + WIDTH * (number // 8) for number, position in enumerate(POSITIONS)}
+INDEX_POSITIONS = tuple(dict((index, position) for position, index in INDEXES.items()).get(i) for i in range(SIZE))
+
+# Mailbox index of every square on the board, a1 first and h8 last.
+BOARD_INDEXES = tuple(INDEXES[position] for position in POSITIONS)
+
+# Empty board. Copy this to start a new board.
+EMPTY_BOARD = tuple(EMPTY if position else OFF_BOARD for position in INDEX_POSITIONS)
+
+# Row pawns start on. Row 0 holds a1 and row 7 holds a8.
+PAWN_HOME_ROWS = {Color.WHITE: 1, Color.BLACK: 6}
+
+# Offsets to shift over from an index to move forward, backward, etc. Directions are relative to the player, so the
+# offsets for black are the offsets for white mirrored through the center of the board.
+_WHITE_OFFSETS = {
+    MoveDirection.FORWARD: WIDTH,
+    MoveDirection.BACKWARD: -WIDTH,
+    MoveDirection.LEFT: -1,
+    MoveDirection.RIGHT: 1,
+    MoveDirection.F_LEFT_DIAG: WIDTH - 1,
+    MoveDirection.F_RIGHT_DIAG: WIDTH + 1,
+    MoveDirection.B_LEFT_DIAG: -WIDTH - 1,
+    MoveDirection.B_RIGHT_DIAG: -WIDTH + 1
+}
+OFFSETS = {
+    Color.WHITE: _WHITE_OFFSETS,
+    Color.BLACK: {direction: -offset for direction, offset in _WHITE_OFFSETS.items()}
+}
+KNIGHT_OFFSETS = (-21, -19, -12, -8, 8, 12, 19, 21)
+
+ORTHOGONAL_DIRECTIONS = (MoveDirection.FORWARD, MoveDirection.RIGHT, MoveDirection.BACKWARD, MoveDirection.LEFT)
+DIAGONAL_DIRECTIONS = (MoveDirection.F_RIGHT_DIAG, MoveDirection.B_RIGHT_DIAG, MoveDirection.B_LEFT_DIAG,
+                       MoveDirection.F_LEFT_DIAG)
+FORWARD_DIAGONAL_DIRECTIONS = (MoveDirection.F_RIGHT_DIAG, MoveDirection.F_LEFT_DIAG)
+
+
+
+def _ray(index, offset):
+    """
+    Walk from an index in one direction until the edge of the board.
+
+    :param index: int
+        Mailbox index to start from. Not included in the result.
+    :param offset: int
+        Offset to shift over by each step.
+    :return: tuple
+        Mailbox indexes in the order they are reached.
+    """
+    ray = []
+    index += offset
+    while EMPTY_BOARD[index] != OFF_BOARD:
+        ray.append(index)
+        index += offset
+    return tuple(ray)
+
+
+# Squares a knight can jump to from every square. Border indexes map to an empty tuple.
+KNIGHT_JUMPS = tuple(
+    tuple(index + offset for offset in KNIGHT_OFFSETS if EMPTY_BOARD[index + offset] != OFF_BOARD)
+    if INDEX_POSITIONS[index] else () for index in range(0, SIZE)
+)
+
+# Every square reachable from every square in every direction, as if the board were empty. Index with
+# RAYS[color][direction][index] to get a tuple of mailbox indexes sorted nearest first. MoveDirection.L_SHAPE holds the
+# knight jumps. Built once at import and shared by every ChessBoard.
+RAYS = MappingProxyType({
+    color: MappingProxyType(dict(
+        [(direction, tuple(_ray(index, offset) if INDEX_POSITIONS[index] else () for index in range(0, SIZE)))
+         for direction, offset in offsets.items()] +
+        [(MoveDirection.L_SHAPE, KNIGHT_JUMPS)]
+    ))
+    for color, offsets in OFFSETS.items()
+})
+
+# Same as RAYS but holding algebraic notation positions instead of mailbox indexes.
+POSITION_RAYS = MappingProxyType({
+    color: MappingProxyType({
+        direction: tuple(tuple(INDEX_POSITIONS[target] for target in ray) for ray in rays)
+        for direction, rays in color_rays.items()
+    })
+    for color, color_rays in RAYS.items()
+})
+
+
+def piece_code(piece):
+    """
+    Retrieve the code used to store a piece in the mailbox.
+
+    :param piece: Piece
+        Piece object or None.
+    :return: int
+        Piece code, or EMPTY if piece is None.
+    """
+    if piece is None:
+        return EMPTY
+    return TYPE_CODES[piece.type] | COLOR_CODES[piece.color]
@@ -0,0 +1,74 @@
+"""
+Material signature of a ChessBoard position and the signatures that cannot lead to checkmate.
+
+The signature is one int holding a 4 bit count for every kind of piece. A kind is a piece code, except bishops are
+split by the color of the square they stand on. Bishops on dark squares use their own piece code and bishops on light
+squares use the unused codes 7 and 15. Placing or removing a piece adds or subtracts one key, so the board keeps the
+signature up to date without counting pieces, and testing for insufficient material is a set lookup.
+"""
+from src.board import mailbox
+
+# Most pieces of one kind a side can have. Two bishops plus eight promoted pawns.
+MAX_COUNT = 10
+
+# OR into a bishop code to get the slot for a bishop on a light square.
+LIGHT_BISHOP = 4
+
+
+def _slot(code, index):
+    """
+    Retrieve the 4 bit field used to count a piece.
+
+    :param code: int
+        Piece code.
+    :param index: int
+        Mailbox index the piece stands on.
+    :return: int
+    """
+    row, column = divmod(index - 21, mailbox.WIDTH)
+    if code & mailbox.TYPE_MASK == mailbox.BISHOP and (row + column) % 2:
+        return code | LIGHT_BISHOP
+    return code
+
+
+def signature(counts):
+    """
+    Build a signature from piece counts.
+
+    :param counts: dict
+        [slot]: Number of pieces. Slot is the piece code, or the piece code | LIGHT_BISHOP for bishops on light squares.
+    :return: int
+    """
+    return sum(count << (4 * slot) for slot, count in counts.items())
+
+
+# Key added to the signature for a piece on a square. Index with KEYS[piece code][mailbox index].
+KEYS = tuple(
+    tuple(1 << (4 * _slot(code, index)) if mailbox.INDEX_POSITIONS[index] else 0 for index in range(0, mailbox.SIZE))
+    for code in range(0, 16)
+)
+
+
+def _insufficient_material():
+    """
+    Build every signature where neither side can checkmate. King against king, king and one knight or bishop against
+    king, and kings with any number of bishops as long as every bishop stands on the same square color.
+
+    :return: frozenset
+    """
+    kings = {mailbox.KING: 1, mailbox.KING | mailbox.BLACK: 1}
+    signatures = {signature(kings)}
+    for knight in (mailbox.KNIGHT, mailbox.KNIGHT | mailbox.BLACK):
+        signatures.add(signature({**kings, knight: 1}))
+
+    for square_color in (0, LIGHT_BISHOP):
+        white_bishop = mailbox.BISHOP | square_color
+        black_bishop = mailbox.BISHOP | mailbox.BLACK | square_color
+        for white_count in range(0, MAX_COUNT + 1):
+            for black_count in range(0, MAX_COUNT + 1):
+                signatures.add(signature({**kings, white_bishop: white_count, black_bishop: black_count}))
+
+    return frozenset(signatures)
+
+
+INSUFFICIENT_MATERIAL = _insufficient_material()
@@ -0,0 +1,113 @@
+"""
+Process wide cache of legal move lists.
+
+Entries are keyed by (ChessBoard.zobrist_key, position). The key of a board changes whenever a move is made, so
+entries never have to be invalidated. The least recently used entry is dropped once the cache is full.
+"""
+from collections import OrderedDict
+from threading import Lock
+
+DEFAULT_MAX_SIZE = 10000
+
+
+class LegalMoveCache:
+    """
+    Bounded LRU cache with hit, miss and eviction counters.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        """
+        Create an empty cache.
+
+        :param max_size: int
+            Number of entries to keep before evicting the least recently used one.
+        """
+        self._entries = OrderedDict()
+        self._max_size = max_size
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, max_size):
+        with self._lock:
+            self._max_size = max_size
+            self._evict()
+
+    def get(self, key):
+        """
+        Retrieve the legal moves stored for a key.
+
+        :param key: tuple
+            (zobrist key, position). Position is None for the moves of every piece of the player to move.
+        :return: list
+            Copy of the stored legal moves, or None if the key is not cached.
+        """
+        with self._lock:
+            legal_moves = self._entries.get(key)
+            if legal_moves is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        return list(legal_moves)
+
+    def put(self, key, legal_moves):
+        """
+        Store the legal moves for a key.
+
+        :param key: tuple
+            (zobrist key, position)
+        :param legal_moves: list
+            Legal moves to store.
+        :return:
+        """
+        with self._lock:
+            self._entries[key] = tuple(legal_moves)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters.
+
+        :return:
+        """
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def stats(self):
+        """
+        Retrieve the counters for monitoring.
+
+        :return: dict
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self._max_size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions
+            }
+
+    def _evict(self):
+        """
+        Drop least recently used entries until the cache fits. Caller must hold the lock.
+
+        :return:
+        """
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+
+legal_move_cache = LegalMoveCache()
@@ -0,0 +1,223 @@
+"""
+Compact binary encodings of moves and positions, for the move log, archives and the wire.
+
+A move packs into 15 bits, so it fits a signed 16 bit SMALLINT column. Bits 0-5 hold the number of the start square,
+a1 being 0 and h8 63, bits 6-11 the number of the end square and bits 12-14 the mailbox type code of the piece a pawn
+is promoted to, or 0.
+
+A position packs into POSITION_SIZE bytes. The first 32 hold the mailbox piece code of every square, two squares to a
+byte with the lower numbered square in the low nibble. A pawn that can be captured en passant is stored with the
+otherwise unused type code EN_PASSANT_PAWN, which leaves room for the rest of the state in the last byte: bit 0 is set
+when black is to move and bits 1-4 hold the castling rights as Fen.CASTLE_BITS. The move counters are not part of the
+record. Like with a four field FEN string they are passed in separately when a position is unpacked.
+"""
+from src.board import mailbox
+from src.board.fen import Fen
+from src.board.fen import FenError
+from src.piece.color import Color
+from src.piece.type import Type
+
+SQUARE_BITS = 6
+SQUARE_MASK = (1 << SQUARE_BITS) - 1
+PROMOTION_SHIFT = 2 * SQUARE_BITS
+
+POSITION_SIZE = 33
+BOARD_SIZE = 32
+
+# Type code of a pawn that can be captured en passant
+EN_PASSANT_PAWN = mailbox.TYPE_MASK
+
+BLACK_TO_MOVE = 1
+CASTLE_SHIFT = 1
+STATE_MASK = BLACK_TO_MOVE | 15 << CASTLE_SHIFT
+
+# Number of every square, a1 first and h8 last
+SQUARES = {position: number for number, position in enumerate(mailbox.POSITIONS)}
+
+PROMOTION_CODES = {piece_type: mailbox.TYPE_CODES[piece_type]
+                   for piece_type in (Type.ROOK, Type.KNIGHT, Type.BISHOP, Type.QUEEN)}
+
+# Piece for each piece code. Pieces are flyweights, so one of each is enough.
+CODE_PIECES = {code: piece_class(color) for code, (piece_class, color) in
+               ((code, Fen.PIECES[letter]) for code, letter in enumerate(mailbox.CODE_LETTERS) if letter)}
+
+
+class PackedPositionError(FenError):
+    """
+    Invalid packed position exception
+    """
+    pass
+
+
+def encode_move(start_position, end_position, promotion=None):
+    """
+    Pack a move into an int.
+
+    :param start_position: string
+        Algebraic notation position.
+    :param end_position: string
+        Algebraic notation position.
+    :param promotion: Type
+        Type a pawn moving to the last row becomes, or None.
+    :return: int
+        Less than 1 << 15.
+    """
+    code = SQUARES[start_position] | SQUARES[end_position] << SQUARE_BITS
+    if promotion:
+        code |= PROMOTION_CODES[promotion] << PROMOTION_SHIFT
+    return code
+
+
+def decode_move(code):
+    """
+    Unpack a move packed by encode_move.
+
+    :param code: int
+    :return: tuple
+        (start position, end position, promotion Type or None), ready for ChessBoard.make_move.
+    """
+    return (mailbox.POSITIONS[code & SQUARE_MASK], mailbox.POSITIONS[code >> SQUARE_BITS & SQUARE_MASK],
+            mailbox.CODE_TYPES[code >> PROMOTION_SHIFT])
+
+
+def pack_position(squares, current_player, castling_rights, en_passant_pawn=None):
+    """
+    Pack a position into a fixed size record.
+
+    :param squares: int[]
+        Mailbox piece code of every square, a1 first and h8 last.
+    :param current_player: Color
+        Player to move.
+    :param castling_rights: int
+        Fen.CASTLE_BITS of the castling rights left.
+    :param en_passant_pawn: int
+        Number of the square of the pawn that can be captured en passant, or None.
+    :return: bytes
+        POSITION_SIZE bytes.
+    """
+    nibbles = list(squares)
+    if en_passant_pawn is not None:
+        nibbles[en_passant_pawn] |= EN_PASSANT_PAWN
+    packed = bytearray(nibbles[number] | nibbles[number + 1] << 4 for number in range(0, 64, 2))
+    packed.append((BLACK_TO_MOVE if current_player == Color.BLACK else 0) | castling_rights << CASTLE_SHIFT)
+    return bytes(packed)
+
+
+class PackedPosition:
+    """
+    Class used to unpack positions. Has the same properties as Fen, so a ChessBoard can be created from either.
+    """
+
+    def __init__(self, packed, halfmove_clock=0, fullmove_number=1, validate=True):
+        """
+        Unpack a position.
+
+        :param packed: bytes
+            Record returned by pack_position or ChessBoard.get_packed_position.
+        :param halfmove_clock: int
+            Plies since the last capture or pawn move.
+        :param fullmove_number: int
+            Number of the current full move.
+        :param validate: bool
+            Raise PackedPositionError if the record is not a valid position.
+        :raises: PackedPositionError
+        """
+        if len(packed) != POSITION_SIZE or (validate and packed[BOARD_SIZE] & ~STATE_MASK):
+            self._raise_format_error()
+
+        state = packed[BOARD_SIZE]
+        self._current_player = Color.BLACK if state & BLACK_TO_MOVE else Color.WHITE
+        self._castling_rights = state >> CASTLE_SHIFT
+        self._halfmove_clock = halfmove_clock
+        self._fullmove_number = fullmove_number
+        self._en_passant_position = None
+        self._board = self._unpack_board(packed, validate)
+
+    @property
+    def board(self):
+        return dict(self._board)
+
+    @property
+    def current_player(self):
+        return self._current_player
+
+    @property
+    def black_castle(self):
+        return self._get_castle_directions(Color.BLACK)
+
+    @property
+    def white_castle(self):
+        return self._get_castle_directions(Color.WHITE)
+
+    @property
+    def castling_rights(self):
+        return self._castling_rights
+
+    @property
+    def en_passant_position(self):
+        return self._en_passant_position
+
+    @property
+    def halfmove_clock(self):
+        return self._halfmove_clock
+
+    @property
+    def fullmove_number(self):
+        return self._fullmove_number
+
+    def _unpack_board(self, packed, validate=True):
+        """
+        Unpack the squares of a record and find the en passant target square.
+
+        :param packed: bytes
+            Packed position.
+        :param validate: bool
+            Raise PackedPositionError if a square holds an invalid code.
+        :return: dict
+            Dictionary of position to Piece objects
+        :raises: PackedPositionError
+        """
+        board = {}
+        positions = mailbox.POSITIONS
+        pieces = CODE_PIECES
+        for byte_number in range(0, BOARD_SIZE):
+            byte = packed[byte_number]
+            if not byte:
+                continue
+
+            for number, code in ((byte_number * 2, byte & 15), (byte_number * 2 + 1, byte >> 4)):
+                if not code:
+                    continue
+
+                if code & mailbox.TYPE_MASK == EN_PASSANT_PAWN:
+                    color = code & mailbox.BLACK
+                    # A pawn that just moved two squares, with the other player to move. The target is the square it
+                    # skipped.
+                    if validate and (self._en_passant_position or
+                                     number // 8 != (4 if color else 3) or
+                                     (self._current_player == Color.BLACK) == bool(color)):
+                        self._raise_format_error()
+                    self._en_passant_position = positions[number + 8 if color else number - 8]
+                    code = mailbox.PAWN | color
+                elif validate and (code not in pieces or
+                                   (code & mailbox.TYPE_MASK == mailbox.PAWN and number // 8 in (0, 7))):
+                    self._raise_format_error()
+
+                board[positions[number]] = pieces[code]
+
+        return board
+
+    def _get_castle_directions(self, color):
+        """
+        Retrieve the castle directions of one color, like Fen.white_castle and Fen.black_castle.
+
+        :param color: Color
+        :return: list
+        """
+        return [direction for letter, (letter_color, direction) in sorted(Fen.CASTLE_DIRECTIONS.items(),
+                                                                          key=lambda item: item[1][1].value)
+                if letter_color == color and self._castling_rights & Fen.CASTLE_BITS[letter]]
+
+    def _raise_format_error(self):
+        raise PackedPositionError('Invalid packed position. Expected {} bytes from pack_position.'.format(
+            POSITION_SIZE))
@@ -0,0 +1,176 @@
+"""
+Perft counts the leaf nodes of the legal move tree to a fixed depth. The counts for well known positions are published,
+so comparing against them checks move generation, including castling, en passant and promotion, and timing the count
+measures how fast move generation is.
+
+Run the suite with timing output, one JSON object per line:
+
+    python -m src.board.perft --depth 3 --output perft.jsonl
+
+Importing the board package starts the app, which can log to stdout, so use --output when the results are parsed.
+"""
+import argparse
+import json
+import sys
+import time
+from src.board.chess_board import ChessBoard
+from src.board.fen import Fen
+from src.piece.color import Color
+from src.piece.type import Type
+
+# Standard perft positions. nodes holds the published count for depth 1, 2, 3...
+PERFT_SUITE = [
+    {
+        'name': 'start',
+        'fen': 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -',
+        'nodes': [20, 400, 8902, 197281]
+    },
+    {
+        'name': 'kiwipete',
+        'fen': 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -',
+        'nodes': [48, 2039, 97862]
+    },
+    {
+        'name': 'position3',
+        'fen': '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -',
+        'nodes': [14, 191, 2812, 43238]
+    },
+    {
+        'name': 'position4',
+        'fen': 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq -',
+        'nodes': [6, 264, 9467]
+    },
+    {
+        'name': 'position5',
+        'fen': 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ -',
+        'nodes': [44, 1486, 62379]
+    },
+    {
+        'name': 'position6',
+        'fen': 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - -',
+        'nodes': [46, 2079, 89890]
+    }
+]
+
+PROMOTION_LETTERS = {Type.ROOK: 'r', Type.KNIGHT: 'n', Type.BISHOP: 'b', Type.QUEEN: 'q'}
+
+
+def perft(board, color, depth):
+    """
+    Count the leaf nodes of the legal move tree.
+
+    :param board: ChessBoard
+        Board to count from. Moves are made and taken back, so the board is left as it was.
+    :param color: Color
+        Color of the player to move.
+    :param depth: int
+        Number of plies to look ahead.
+    :return: int
+        Number of leaf nodes.
+    """
+    if depth == 0:
+        return 1
+
+    nodes = 0
+    next_color = Color.BLACK if color == Color.WHITE else Color.WHITE
+    for move in board.generate_legal_moves(color):
+        # The moves at the last ply only need counting.
+        if depth == 1:
+            nodes += 1
+            continue
+        undo = board.make_move(move)
+        nodes += perft(board, next_color, depth - 1)
+        board.unmake_move(undo)
+
+    return nodes
+
+
+def divide(board, color, depth):
+    """
+    Count the leaf nodes below each legal move. Comparing against another engine narrows a wrong perft count down to
+    the move that causes it.
+
+    :param board: ChessBoard
+        Board to count from.
+    :param color: Color
+        Color of the player to move.
+    :param depth: int
+        Number of plies to look ahead, including the root move.
+    :return: dict
+        [move]: Number of leaf nodes. Moves are written as start and end position followed by the promotion letter.
+        Ex e7e8q
+    """
+    counts = {}
+    next_color = Color.BLACK if color == Color.WHITE else Color.WHITE
+    for move in board.generate_legal_moves(color):
+        start_position, end_position, promotion = move
+        undo = board.make_move(move)
+        counts[start_position + end_position + PROMOTION_LETTERS.get(promotion, '')] = \
+            perft(board, next_color, depth - 1)
+        board.unmake_move(undo)
+
+    return counts
+
+
+def run_suite(depth, suite=None):
+    """
+    Count every position in a suite and time it.
+
+    :param depth: int
+        Maximum depth. Positions without a published count for the depth are counted to the deepest one available.
+    :param suite: list
+        Positions in the same format as PERFT_SUITE. Defaults to PERFT_SUITE.
+    :return: list
+        One dict per position with name, fen, depth, nodes, expected, passed, seconds and nodes_per_second.
+    """
+    results = []
+    for position in suite if suite is not None else PERFT_SUITE:
+        fen = Fen(position['fen'])
+        position_depth = min(depth, len(position['nodes']))
+        board = ChessBoard(fen)
+
+        start = time.perf_counter()
+        nodes = perft(board, fen.current_player, position_depth)
+        seconds = time.perf_counter() - start
+
+        expected = position['nodes'][position_depth - 1]
+        results.append({
+            'name': position['name'],
+            'fen': position['fen'],
+            'depth': position_depth,
+            'nodes': nodes,
+            'expected': expected,
+            'passed': nodes == expected,
+            'seconds': round(seconds, 6),
+            'nodes_per_second': int(nodes / seconds) if seconds else None
+        })
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the perft suite and print one JSON result per line.')
+    parser.add_argument('--depth', type=int, default=3, help='Maximum depth to count to.')
+    parser.add_argument('--fen', help='Divide this position instead of running the suite.')
+    parser.add_argument('--output', type=argparse.FileType('w'), default=sys.stdout,
+                        help='File to write the JSON results to instead of stdout.')
+    args = parser.parse_args()
+
+    if args.fen:
+        fen = Fen(args.fen)
+        board = ChessBoard(fen)
+        counts = divide(board, fen.current_player, args.depth)
+        for move, nodes in sorted(counts.items()):
+            print(json.dumps({'move': move, 'nodes': nodes}), file=args.output)
+        print(json.dumps({'total': sum(counts.values())}), file=args.output)
+        return 0
+
+    results = run_suite(args.depth)
+    for result in results:
+        print(json.dumps(result), file=args.output)
+
+    return 0 if all(result['passed'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    exit(main())
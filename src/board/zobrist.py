@@ -0,0 +1,39 @@
+"""
+Random keys used to build the Zobrist hash of a ChessBoard position.
+
+The hash of a position is the XOR of one key for every piece on every square, a key for each castling direction still
+available, a key for the file of the en passant target square and a key if black is to move. Moving a piece only
+needs a few XORs to update the hash instead of looking at the whole board.
+
+Keys come from a generator with a fixed seed, so the same position hashes to the same value in every process.
+"""
+import random
+from src.piece.color import Color
+from src.piece.move_direction import MoveDirection
+from src.board import mailbox
+
+_random = random.Random(0x5A0B1257)
+
+
+def _key():
+    return _random.getrandbits(64)
+
+
+# Key for a piece on a square. Index with PIECES[piece code][mailbox index]. Border indexes hold 0.
+PIECES = tuple(
+    tuple(_key() if mailbox.INDEX_POSITIONS[index] else 0 for index in range(0, mailbox.SIZE))
+    for _ in range(0, 16)
+)
+
+# XORed in when black is to move.
+BLACK_TO_MOVE = _key()
+
+CASTLE = {
+    Color.WHITE: {MoveDirection.LEFT: _key(), MoveDirection.RIGHT: _key()},
+    Color.BLACK: {MoveDirection.LEFT: _key(), MoveDirection.RIGHT: _key()}
+}
+
+# Key for the file of the en passant target square.
+EN_PASSANT = {file: _key() for file in 'abcdefgh'}
+
+del _random
@@ -9,3 +9,28 @@ class Config:
     SQLALCHEMY_ECHO = True
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SESSION_TYPE = 'sqlalchemy'
+    LEGAL_MOVE_CACHE_SIZE = int(os.environ.get('LEGAL_MOVE_CACHE_SIZE') or 10000)
+    # Boards of live games kept in memory between moves, and how long a game can go untouched before it is dropped.
+    GAME_CACHE_SIZE = int(os.environ.get('GAME_CACHE_SIZE') or 1000)
+    GAME_CACHE_IDLE_SECONDS = float(os.environ.get('GAME_CACHE_IDLE_SECONDS') or 600)
+    # Every this many plies a saved move also keeps the FEN string of its position, so loading a game never plays back
+    # more moves than this.
+    FEN_CHECKPOINT_INTERVAL = int(os.environ.get('FEN_CHECKPOINT_INTERVAL') or 20)
+    # Acknowledge moves once they are in a local journal and write them to the db in batches. See
+    # src.models.write_behind.
+    WRITE_BEHIND = (os.environ.get('WRITE_BEHIND') or '0') != '0'
+    WRITE_BEHIND_JOURNAL = os.environ.get('WRITE_BEHIND_JOURNAL') or os.path.join(basedir, 'moves.journal')
+    WRITE_BEHIND_INTERVAL = float(os.environ.get('WRITE_BEHIND_INTERVAL') or 1.0)
+    # Sync the journal to disk on every move. Turning it off only protects moves from the process crashing.
+    WRITE_BEHIND_FSYNC = (os.environ.get('WRITE_BEHIND_FSYNC') or '1') != '0'
+    # End games as a draw after fifty moves without a capture or pawn move. Games always end after seventy-five.
+    FIFTY_MOVE_AUTO_DRAW = (os.environ.get('FIFTY_MOVE_AUTO_DRAW') or '1') != '0'
+    # End games as a draw when a position is reached for the third time. Games always end on the fifth time.
+    THREEFOLD_REPETITION_AUTO_DRAW = (os.environ.get('THREEFOLD_REPETITION_AUTO_DRAW') or '1') != '0'
+    # Count and time calls of the functions a move request goes through. See src.utils.instrumentation.
+    INSTRUMENTATION = (os.environ.get('INSTRUMENTATION') or '0') != '0'
+    # Serve the instrumentation counters in Prometheus text format at /metrics.
+    METRICS_ROUTE = (os.environ.get('METRICS_ROUTE') or '0') != '0'
+    # Broadcast only the squares a move changed, with a sequence number, instead of the whole game after every move.
+    # Clients that see a gap in the sequence ask for the whole game again.
+    DELTA_UPDATES = (os.environ.get('DELTA_UPDATES') or '0') != '0'
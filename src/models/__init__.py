@@ -1,5 +1,7 @@
 __all__ = [
     'chess_game',
+    'game_cache',
+    'game_move',
     'game_score',
     'player'
 ]
@@ -1,14 +1,21 @@
+from collections import Counter
+from src.board import packed
 from src.board.chess_board import ChessBoard
+from src.board.move_cache import legal_move_cache
+from src.models.game_cache import game_cache
+from src.models.write_behind import write_behind
+from src.utils.instrumentation import instrumented
 from src.board.fen import Fen
 from src.piece.move_direction import MoveDirection
 from src.piece.color import Color
-from src.piece.queen import Queen
-from src.piece.bishop import Bishop
-from src.piece.knight import Knight
-from src.piece.rook import Rook
 from src.models.game_score import GameScore
-from src import db
+from src.models.game_move import GameMove
+from src import app, db
 from src.piece.type import Type
+from sqlalchemy import func
+from sqlalchemy import orm
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
 from src.utils.chess_helper import ChessHelper
 from src.board.exception import *
 
@@ -41,8 +48,6 @@ class MoveResult:
         king_in_check = self.king_in_check.to_dict() if self.king_in_check else self.king_in_check
         king_in_checkmate = self.king_in_checkmate.to_dict() if self.king_in_checkmate else self.king_in_checkmate
 
-
-
         return {
             'update_positions': updated_positions,
             'king_in_check': king_in_check,
@@ -106,16 +111,38 @@ class ChessGame(db.Model):
     """
     __tablename__ = 'game'
 
+    # Halfmove clock values that end the game in a draw. The fifty move limit only applies when FIFTY_MOVE_AUTO_DRAW is
+    # set in the config. The seventy-five move limit always applies.
+    FIFTY_MOVE_LIMIT = 100
+    SEVENTY_FIVE_MOVE_LIMIT = 150
+
+    # Number of times a position has to be reached to end the game in a draw. The threefold limit only applies when
+    # THREEFOLD_REPETITION_AUTO_DRAW is set in the config. The fivefold limit always applies.
+    THREEFOLD_REPETITION = 3
+    FIVEFOLD_REPETITION = 5
+
     id = db.Column(db.Integer, primary_key=True)
-    fen = db.Column(db.String(100))
+    # Starting position of the game. Moves are kept in game_move, so this is never changed once the game is saved.
+    # Databases from before the move log held the current position here. See src.models.migrate_move_log.
+    start_fen = db.Column('fen', db.String(100))
     white_player_id = db.Column(db.Integer, db.ForeignKey('players.id'))
     black_player_id = db.Column(db.Integer, db.ForeignKey('players.id'))
     is_over = db.Column(db.Boolean, default=False)
+    # Position the game ended in, packed by ChessBoard.get_packed_position, so finished games can be shown or searched
+    # without playing back their moves. None while the game is being played.
+    final_position = db.Column(db.LargeBinary(packed.POSITION_SIZE))
+    # Goes up every time the game or a move of it is saved, so the game cache can tell when a board is out of date.
+    # Saving over a newer version raises StaleDataError.
+    version = db.Column(db.Integer, nullable=False)
 
     white_player = db.relationship("Player", foreign_keys=white_player_id)
     black_player = db.relationship("Player", foreign_keys=black_player_id)
     score = db.relationship("GameScore", uselist=False, back_populates="game")
 
+    # Moves are saved to game_move without changing the game row, so save_to_db and the write-behind journal set the
+    # version themselves instead of leaving it to the session
+    __mapper_args__ = {'version_id_col': version, 'version_id_generator': False}
+
     def __init__(self, fen=None, **kwargs):
         """
         Generate a ChessGame object.
@@ -126,21 +153,52 @@ class ChessGame(db.Model):
         """
         super().__init__(**kwargs)
 
-        self.fen = fen if fen else 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -'
-        fen = Fen(self.fen, validate=False)
-        self._board = ChessBoard(fen)
+        self.start_fen = fen if fen else Fen.DEFAULT_FEN
+        self._board = ChessBoard(Fen(self.start_fen, validate=False))
+        # Number of moves played and moves not saved to game_move yet
+        self._ply = 0
+        self._unsaved_moves = []
+        self._position_counts = Counter()
+        self._record_position()
+
+    @orm.reconstructor
+    def _init_on_load(self):
+        """
+        Set up a game loaded from the db. The position is only built from game_move once it is needed.
+
+        :return:
+        """
+        self._board = None
+        self._ply = 0
+        self._unsaved_moves = []
+        self._position_counts = Counter()
 
     @property
     def board(self):
+        if self._board is None:
+            self._load_moves_from_db()
         return self._board
 
     @board.setter
     def board(self, board):
         self._board = board
 
+    @property
+    def fen(self):
+        # FEN string of the current position
+        return self.board.get_fen()
+
+    @property
+    def ply(self):
+        # Number of moves played
+        if self._board is None:
+            self._load_moves_from_db()
+        return self._ply
+
     def get_legal_moves(self, position):
         """
-        Retrieve possible legal moves for a piece on a position.
+        Retrieve possible legal moves for a piece on a position. Results are cached by position hash, so a position
+        seen before in any game skips move generation.
 
         :param position: string
             Algebraic notation position.
@@ -153,14 +211,48 @@ class ChessGame(db.Model):
             # Reraise exception either way
             raise
         else:
-            return self._board.get_legal_moves(position)
+            key = (self.board.zobrist_key, position)
+            legal_moves = legal_move_cache.get(key)
+            if legal_moves is None:
+                legal_moves = self.board.get_legal_moves(position)
+                legal_move_cache.put(key, legal_moves)
+            return legal_moves
+
+    def get_all_legal_moves(self):
+        """
+        Retrieve every legal move for the current player. Results are cached by position hash like get_legal_moves,
+        under None instead of a position.
 
-    def move_piece(self, start_position, end_position):
+        :return: dict
+            [start position]: List of end positions the piece on the start position can move to.
+        """
+        board = self.board
+        key = (board.zobrist_key, None)
+        cached_moves = legal_move_cache.get(key)
+        if cached_moves is not None:
+            return {start_position: list(end_positions) for start_position, end_positions in cached_moves}
+
+        legal_moves = {}
+        for start_position, end_position, promotion in board.generate_legal_moves(board.current_player):
+            end_positions = legal_moves.setdefault(start_position, [])
+            # Promotions generate one move per piece type. Only need the position once.
+            if not end_positions or end_positions[-1] != end_position:
+                end_positions.append(end_position)
+
+        legal_move_cache.put(key, [(start_position, tuple(end_positions))
+                                   for start_position, end_positions in legal_moves.items()])
+        return legal_moves
+
+    @instrumented('ChessGame.move_piece')
+    def move_piece(self, start_position, end_position, promotion=None):
         """
         Move a piece from start_position to end_position.
 
         :param start_position:
         :param end_position:
+        :param promotion: Type
+            Type a pawn moving to the last row becomes. Without it, moving a pawn to the last row only returns the
+            promote info. Use promote_pawn to promote.
         :return:
         """
         try:
@@ -171,14 +263,13 @@ class ChessGame(db.Model):
             # Reraise exception either way
             raise
         else:
-            current_fen = Fen(self.fen)
-            current_player = current_fen.current_player
+            current_player = self.board.current_player
             next_player = Color.WHITE if current_player == Color.BLACK else Color.BLACK
             move_result = MoveResult()
 
             # If moving a pawn to the end of the board, dont update anything on the board.
             # Instead, just return the pawn promote info.
-            if self.can_promote_pawn(start_position, end_position):
+            if promotion is None and self.can_promote_pawn(start_position, end_position):
                 player = self._get_player_by_color(current_player)
                 promote_info = {
                     'player': player,
@@ -187,32 +278,21 @@ class ChessGame(db.Model):
                 move_result.pawn_promote_info = promote_info
                 return move_result
 
-            move_result.update_positions = self._board.move_piece(start_position, end_position)
-
-            # Determine which directions castling is possible for.
-            castle_info = {Color.BLACK: [], Color.WHITE: []}
-            for color in [Color.WHITE, Color.BLACK]:
-                for direction in [MoveDirection.LEFT, MoveDirection.RIGHT]:
-                    if self._board.can_castle(color, direction):
-                        castle_info[color].append(direction)
-
-            # Generate and save fen string after move
-            next_fen = Fen()
-            next_fen_str = next_fen.generate_fen(
-                self._board.get_board_pieces(),
-                next_player,
-                castle_info[Color.WHITE],
-                castle_info[Color.BLACK],
-                self._board.get_enpassant_position()
-            )
-            self.fen = next_fen_str
+            move_result.update_positions = self.board.move_piece(start_position, end_position, promotion)
+
+            # Log the move and count the position after it
+            self._log_move(start_position, end_position, promotion)
+            self._record_position()
 
             # If checkmate or draw, set game over flag. Also create game_score object and fill
             # the move results object.
-            is_checkmate = self._board.is_checkmate(next_player)
-            is_stalemate = self._board.is_stalemate(next_player)
-            if is_checkmate or is_stalemate:
+            is_checkmate = self.board.is_checkmate(next_player)
+            is_stalemate = self.board.is_stalemate(next_player)
+            is_draw = is_stalemate or self.board.is_insufficient_material() or self.is_move_limit_reached() or \
+                self.is_repetition()
+            if is_checkmate or is_draw:
                 self.is_over = True
+                self.final_position = self.board.get_packed_position()
                 if is_checkmate:
                     if current_player == Color.WHITE:
                         self.score = GameScore(game=self, white_score=1)
@@ -228,7 +308,7 @@ class ChessGame(db.Model):
                     move_result.draw = True
 
             # If it is check, add info to move_result.
-            is_check = self._board.is_check(next_player)
+            is_check = self.board.is_check(next_player)
             if is_check:
                 if current_player == Color.WHITE:
                     player_in_check = self._get_player_by_color(Color.BLACK)
@@ -238,6 +318,35 @@ class ChessGame(db.Model):
 
             return move_result
 
+    def is_move_limit_reached(self):
+        """
+        Test if the game has gone too long without a capture or pawn move. Checkmate on the move that reaches the
+        limit still wins, so test for it first.
+
+        :return: bool
+            True if the halfmove clock reached the fifty move limit and it is enabled, or the seventy-five move limit.
+        """
+        halfmove_clock = self.board.halfmove_clock
+        if halfmove_clock >= self.SEVENTY_FIVE_MOVE_LIMIT:
+            return True
+
+        return halfmove_clock >= self.FIFTY_MOVE_LIMIT and app.config['FIFTY_MOVE_AUTO_DRAW']
+
+    def is_repetition(self):
+        """
+        Test if the current position has been reached too many times.
+
+        :return: bool
+            True if the position was reached three times and the threefold limit is enabled, or five times.
+        """
+        # Loading the board also counts the positions, so it has to come first
+        zobrist_key = self.board.zobrist_key
+        count = self._position_counts[zobrist_key]
+        if count >= self.FIVEFOLD_REPETITION:
+            return True
+
+        return count >= self.THREEFOLD_REPETITION and app.config['THREEFOLD_REPETITION_AUTO_DRAW']
+
     @property
     def current_player(self):
         """
@@ -246,8 +355,7 @@ class ChessGame(db.Model):
         :return Player:
             Player object with color set.
         """
-        fen = Fen(self.fen)
-        current_player_color = fen.current_player
+        current_player_color = self.board.current_player
         current_player = self.white_player if current_player_color == Color.WHITE else self.black_player
         # Dynamically add color field so UI can know player info and color.
         if current_player:
@@ -277,20 +385,11 @@ class ChessGame(db.Model):
         else:
             if piece_type not in self.get_pawn_promote_types():
                 raise PieceTypeError(piece_type, 'Cannot promote pawn to supplied piece type')
-            if self._board[start_position] is None:
+            if self.board[start_position] is None:
                 raise EmptyPositionError(start_position)
             # TODO confirm pawn on second to last row
 
-            piece = self._board[start_position]
-            piece_class = {
-                Type.ROOK: Rook,
-                Type.KNIGHT: Knight,
-                Type.BISHOP: Bishop,
-                Type.QUEEN: Queen
-            }
-            self._board[start_position] = piece_class[piece_type](piece.color)
-
-            return self.move_piece(start_position, end_position)
+            return self.move_piece(start_position, end_position, piece_type)
 
     def get_winner(self):
         """
@@ -308,7 +407,7 @@ class ChessGame(db.Model):
 
         :return: Type[]
         """
-        return [Type.ROOK, Type.KNIGHT, Type.BISHOP, Type.QUEEN]
+        return list(ChessBoard.PROMOTION_TYPES)
 
     def can_promote_pawn(self, start_position, end_position):
         """
@@ -328,38 +427,107 @@ class ChessGame(db.Model):
             # Reraise exception either way
             raise
         else:
-            if self._board[start_position] is None:
+            if self.board[start_position] is None:
                 return False
 
-            piece = self._board[start_position]
+            piece = self.board[start_position]
             if piece.type != Type.PAWN:
                 return False
 
-            _, start_row = self._board.position_to_row_and_column(start_position, piece.color)
-            _, end_row = self._board.position_to_row_and_column(end_position, piece.color)
-            if start_row == self._board.get_dimension() - 2 and end_row == self._board.get_dimension() - 1:
+            _, start_row = self.board.position_to_row_and_column(start_position, piece.color)
+            _, end_row = self.board.position_to_row_and_column(end_position, piece.color)
+            if start_row == self.board.get_dimension() - 2 and end_row == self.board.get_dimension() - 1:
                 return True
 
             return False
 
     def save_to_db(self):
         """
-        Save game to db.
+        Save game and the moves played since it was last saved to db, and keep its board in the game cache for the
+        next load.
 
         :return:
+        :raises: StaleDataError
+            If the game row was saved by someone else since it was loaded.
+        :raises: IntegrityError
+            If someone else saved a move for the same ply first.
         """
         db.session.add(self)
+        version = self._next_version()
+        self.version = version
+        # New games need an id for their moves. Everything is expired on commit, so read it before.
+        db.session.flush()
+        game_id = self.id
+        for move in self._unsaved_moves:
+            move.game_id = game_id
+        db.session.add_all(self._unsaved_moves)
         db.session.commit()
+        self._unsaved_moves = []
+        if self._board is not None:
+            game_cache.put(game_id, version, self._ply, self._board, self._position_counts)
+
+    def save_move(self):
+        """
+        Save game after a move. In write-behind mode the moves are written to the journal instead and reach the db
+        with the next batch, otherwise this is the same as save_to_db.
+
+        :return:
+        :raises: StaleDataError
+            See save_to_db. In write-behind mode, if another move was saved for the same ply.
+        :raises: IntegrityError
+            See save_to_db. Not raised in write-behind mode.
+        """
+        if not write_behind.enabled:
+            self.save_to_db()
+            return
+
+        state = self._get_journal_state()
+        if self._unsaved_moves:
+            ply = self._unsaved_moves[0].ply - 1
+            saved_ply = state['moves'][-len(self._unsaved_moves) - 1]['ply'] \
+                if len(state['moves']) > len(self._unsaved_moves) else self._get_saved_ply(self.id)
+            if saved_ply != ply:
+                raise StaleDataError('Game {} has {} moves saved, expected {}'.format(self.id, saved_ply, ply))
+        write_behind.record(self.id, state)
+        self._unsaved_moves = []
+
+        # Take the changes back out of the session, so nothing in this request writes the game to the db
+        if self.score is not None and self.score in db.session:
+            db.session.expunge(self.score)
+        self._set_journal_state(state, committed=True)
+        game_cache.put(self.id, state['version'], self._ply, self.board, self._position_counts)
 
     def delete_from_db(self):
         """
-        Delete this game from the db.
+        Delete this game and its moves from the db.
 
         :return:
         """
+        game_cache.discard(self.id)
+        write_behind.discard(self.id)
+        GameMove.query.filter_by(game_id=self.id).delete()
         db.session.delete(self)
         db.session.commit()
 
+    def load_moves(self, moves):
+        """
+        Play moves from the move log after the moves already played. The moves are not checked and are not saved
+        again.
+
+        :param moves: GameMove[]
+            Moves in ply order, starting with the ply after the current one.
+        :return:
+        """
+        for move in moves:
+            self._board.make_move(move.move)
+            self._ply = move.ply
+            self._record_position()
+
+    @property
+    def unsaved_moves(self):
+        # Moves played since the game was last saved, oldest first
+        return list(self._unsaved_moves)
+
     def to_dict(self):
         """
         Return dictionary for game.
@@ -371,6 +539,7 @@ class ChessGame(db.Model):
 
         return {
             'game_id': self.id,
+            'seq': self.ply,
             'current_player': current_player.to_dict() if current_player else None,
             'white_player': white_player.to_dict() if white_player else None,
             'black_player': black_player.to_dict() if black_player else None,
@@ -378,14 +547,198 @@ class ChessGame(db.Model):
             'board': {position: piece.to_dict() for position, piece in self.board.get_board_pieces().items() if piece}
         }
 
+    def to_delta_dict(self, move_result):
+        """
+        Return dictionary of what a move changed, for clients that already have the game. seq is the number of moves
+        played, so a client that missed an update sees a gap and can ask for the whole game again.
+
+        :param move_result: MoveResult
+            Result of the move.
+        :return:
+        """
+        return {
+            'game_id': self.id,
+            'seq': self.ply,
+            'current_player': self.board.current_player.value,
+            'game_over': self.is_over,
+            'result': move_result.to_dict()
+        }
 
     @classmethod
+    @instrumented('ChessGame.load_by_id')
     def load_by_id(cls, game_id):
         game = cls.query.get(game_id)
         if game:
-            game.board = ChessBoard(Fen(game.fen))
+            # Moves not yet written to the db in write-behind mode
+            state = write_behind.pending(game.id)
+            if state:
+                game._set_journal_state(state, committed=True)
+
+            # Games being played are usually in the game cache, which skips loading and playing back their moves
+            version = state['version'] if state else game.version
+            cached = game_cache.get(game.id, version)
+            if cached:
+                game._ply, game._board, game._position_counts = cached
+            else:
+                game._load_moves_from_db()
+                game_cache.put(game.id, version, game._ply, game._board, game._position_counts)
         return game
 
+    @classmethod
+    def save_journal_states(cls, states):
+        """
+        Write a batch of games from the write-behind journal to the db in one commit.
+
+        :param states: dict
+            [game id]: State returned by _get_journal_state. Games that were deleted are skipped.
+        :return:
+        """
+        with app.app_context():
+            for game_id, state in states.items():
+                game = cls.query.get(game_id)
+                if not game:
+                    continue
+                # Moves written by an earlier batch are still in the journal when it is replayed
+                ply = cls._get_saved_ply(game_id)
+                for move in state['moves']:
+                    if move['ply'] > ply:
+                        db.session.add(GameMove.from_dict(game_id, move))
+                        ply = move['ply']
+                game._set_journal_state(state)
+                # save_to_db may have saved a newer version while the state was waiting in the journal
+                game.version = max(game.version, state['version'])
+            db.session.commit()
+
+    @classmethod
+    def _get_saved_ply(cls, game_id):
+        """
+        Retrieve the ply of the last move of a game in the db.
+
+        :param game_id: int
+            Id of the game.
+        :return: int
+            0 if no moves were saved.
+        """
+        return db.session.query(func.max(GameMove.ply)).filter(GameMove.game_id == game_id).scalar() or 0
+
+    def _get_journal_state(self):
+        """
+        Retrieve everything that changed since the game was last saved, for the write-behind journal. Moves still
+        waiting in the journal are included, since each entry replaces the one before it.
+
+        :return: dict
+        """
+        pending = write_behind.pending(self.id)
+        score = self.score
+        return {
+            'version': self._next_version(),
+            'moves': (pending['moves'] if pending else []) + [move.to_dict() for move in self._unsaved_moves],
+            'is_over': bool(self.is_over),
+            'final_position': self.final_position.hex() if self.final_position else None,
+            'score': [score.white_score, score.black_score] if score else None
+        }
+
+    def _next_version(self):
+        """
+        Retrieve the version the game gets when it is saved next. Saves still waiting in the write-behind journal are
+        counted, so the version keeps going up while the db is behind.
+
+        :return: int
+        """
+        state = write_behind.pending(self.id) if self.id is not None else None
+        return (state['version'] if state else self.version or 0) + 1
+
+    def _set_journal_state(self, state, committed=False):
+        """
+        Update the game over flag, final position and score from the write-behind journal. Moves are played by
+        _load_moves_from_db.
+
+        :param state: dict
+            Value returned by _get_journal_state.
+        :param committed: bool
+            Set the values as if they were loaded from the db, so the game is not written back by the session.
+        :return:
+        """
+        final_position = bytes.fromhex(state['final_position']) if state['final_position'] else None
+        if committed:
+            set_committed_value(self, 'is_over', state['is_over'])
+            set_committed_value(self, 'final_position', final_position)
+        else:
+            self.is_over = state['is_over']
+            self.final_position = final_position
+
+        if state['score'] and self.score is None:
+            white_score, black_score = state['score']
+            if committed:
+                set_committed_value(self, 'score', GameScore(white_score=white_score, black_score=black_score))
+            else:
+                self.score = GameScore(game=self, white_score=white_score, black_score=black_score)
+
+    def _load_moves_from_db(self):
+        """
+        Build the current position from the last checkpoint and the moves after it, including moves still waiting in
+        the write-behind journal. Positions since the last capture or pawn move before the checkpoint are counted from
+        their position hashes.
+
+        :return:
+        """
+        checkpoint = GameMove.query.filter(GameMove.game_id == self.id, GameMove.fen.isnot(None)) \
+            .order_by(GameMove.ply.desc()).first()
+        if checkpoint:
+            self._board = ChessBoard(Fen(checkpoint.fen))
+            self._ply = checkpoint.ply
+        else:
+            self._board = ChessBoard(Fen(self.start_fen, validate=False))
+            self._ply = 0
+
+        position_keys = []
+        first_ply = self._ply - self._board.halfmove_clock
+        if self._ply > 0 and first_ply < self._ply:
+            if first_ply <= 0:
+                position_keys.append(ChessBoard(Fen(self.start_fen, validate=False)).zobrist_key)
+            position_hashes = db.session.query(GameMove.position_hash) \
+                .filter(GameMove.game_id == self.id, GameMove.ply >= first_ply, GameMove.ply < self._ply)
+            position_keys += GameMove.zobrist_keys(position_hash for position_hash, in position_hashes)
+        self._position_counts = Counter(position_keys)
+        self._record_position()
+
+        moves = GameMove.query.filter(GameMove.game_id == self.id, GameMove.ply > self._ply) \
+            .order_by(GameMove.ply).all()
+        state = write_behind.pending(self.id)
+        if state:
+            ply = moves[-1].ply if moves else self._ply
+            moves += [GameMove.from_dict(self.id, move) for move in state['moves'] if move['ply'] > ply]
+        self.load_moves(moves)
+
+    def _log_move(self, start_position, end_position, promotion):
+        """
+        Add the move just played to the moves waiting to be saved. Every FEN_CHECKPOINT_INTERVAL plies the move keeps
+        the FEN string of the position after it.
+
+        :param start_position: string
+            Algebraic notation position.
+        :param end_position: string
+            Algebraic notation position.
+        :param promotion: Type
+            Type the pawn was promoted to, or None.
+        :return:
+        """
+        self._ply += 1
+        fen = self.board.get_fen() if self._ply % app.config['FEN_CHECKPOINT_INTERVAL'] == 0 else None
+        self._unsaved_moves.append(GameMove(self._ply, start_position, end_position, promotion,
+                                            self.board.zobrist_key, fen))
+
+    def _record_position(self):
+        """
+        Count the current position for repetition. Counts start over after a capture or pawn move, since earlier
+        positions can never come up again.
+
+        :return:
+        """
+        if self._board.halfmove_clock == 0:
+            self._position_counts.clear()
+        self._position_counts[self._board.zobrist_key] += 1
+
     def _get_player_by_color(self, color):
         """
         Retrieve the player associated with the provided color.
@@ -403,7 +756,7 @@ class ChessGame(db.Model):
         return player
 
     def __str__(self):
-        return str(self._board)
+        return str(self.board)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,191 @@
+"""
+Process wide cache of the boards of live games.
+
+Loading a game from the db means parsing its FEN string and building a ChessBoard. Games being played are loaded for
+every move, so their boards are kept here between requests, keyed by game id. Each entry holds the version of the game
+it was built from, which goes up with every move saved. A worker that saves another move of the game makes the entry
+stale, which is detected and dropped the next time the game is loaded. Games nobody has touched for a while are
+dropped, as is the least recently used game once the cache is full.
+"""
+import time
+from collections import Counter
+from collections import OrderedDict
+from threading import Lock
+
+DEFAULT_MAX_SIZE = 1000
+DEFAULT_IDLE_SECONDS = 600
+
+
+class GameCacheEntry:
+    """
+    Board and repetition counts of a game at one version.
+    """
+    __slots__ = ['version', 'ply', 'board', 'position_counts', 'last_used']
+
+    def __init__(self, version, ply, board, position_counts, last_used):
+        self.version = version
+        self.ply = ply
+        self.board = board
+        self.position_counts = position_counts
+        self.last_used = last_used
+
+
+class GameCache:
+    """
+    Bounded LRU cache with idle eviction and hit, miss, stale and eviction counters.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, idle_seconds=DEFAULT_IDLE_SECONDS, clock=time.monotonic):
+        """
+        Create an empty cache.
+
+        :param max_size: int
+            Number of games to keep before evicting the least recently used one.
+        :param idle_seconds: float
+            Games not loaded or saved for this long are evicted.
+        :param clock: function
+            Returns the current time in seconds.
+        """
+        self._entries = OrderedDict()
+        self._max_size = max_size
+        self._idle_seconds = idle_seconds
+        self._clock = clock
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._evictions = 0
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, max_size):
+        with self._lock:
+            self._max_size = max_size
+            self._evict(self._clock())
+
+    @property
+    def idle_seconds(self):
+        return self._idle_seconds
+
+    @idle_seconds.setter
+    def idle_seconds(self, idle_seconds):
+        with self._lock:
+            self._idle_seconds = idle_seconds
+            self._evict(self._clock())
+
+    def get(self, game_id, version):
+        """
+        Retrieve the board stored for a game.
+
+        :param game_id: int
+            Id of the game.
+        :param version: int
+            Version of the game in the db. An entry for any other version is stale and dropped.
+        :return: tuple
+            (ply, ChessBoard, Counter) number of moves played and copies of the stored board and position counts, or
+            None if the game is not cached.
+        """
+        with self._lock:
+            now = self._clock()
+            self._evict(now)
+            entry = self._entries.get(game_id)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry.version != version:
+                del self._entries[game_id]
+                self._stale += 1
+                self._misses += 1
+                return None
+            entry.last_used = now
+            self._entries.move_to_end(game_id)
+            self._hits += 1
+
+        # The game moves pieces on the board it gets, so it gets its own copy
+        return entry.ply, entry.board.clone(), Counter(entry.position_counts)
+
+    def put(self, game_id, version, ply, board, position_counts):
+        """
+        Store the board of a game.
+
+        :param game_id: int
+            Id of the game.
+        :param version: int
+            Version of the game the board belongs to.
+        :param ply: int
+            Number of moves played on the board.
+        :param board: ChessBoard
+            Board of the game. A copy is stored, so the game can keep changing its board.
+        :param position_counts: Counter
+            Number of times each Zobrist key was reached since the last capture or pawn move.
+        :return:
+        """
+        board = board.clone()
+        position_counts = Counter(position_counts)
+        with self._lock:
+            now = self._clock()
+            self._entries[game_id] = GameCacheEntry(version, ply, board, position_counts, now)
+            self._entries.move_to_end(game_id)
+            self._evict(now)
+
+    def discard(self, game_id):
+        """
+        Remove a game from the cache if it is there.
+
+        :param game_id: int
+            Id of the game.
+        :return:
+        """
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters.
+
+        :return:
+        """
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+            self._stale = 0
+            self._evictions = 0
+
+    def stats(self):
+        """
+        Retrieve the counters for monitoring.
+
+        :return: dict
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self._max_size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'stale': self._stale,
+                'evictions': self._evictions
+            }
+
+    def _evict(self, now):
+        """
+        Drop idle entries, then least recently used entries until the cache fits. Entries are kept in order of last
+        use, so idle entries are always at the front. Caller must hold the lock.
+
+        :param now: float
+            Current time in seconds.
+        :return:
+        """
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if len(self._entries) <= self._max_size and now - entry.last_used < self._idle_seconds:
+                break
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+
+game_cache = GameCache()
@@ -0,0 +1,109 @@
+from src import db
+from src.board import packed
+
+
+class GameMove(db.Model):
+    """
+    One move of a game. Rows are only ever added, so the moves of a game are its full history and saving a move never
+    has to update anything.
+
+    The position of a game is rebuilt from the FEN string of the last checkpoint, or the starting position of the game
+    if there is none, by playing the moves after it. Every FEN_CHECKPOINT_INTERVAL plies a move also stores the FEN
+    string of the position after it, so at most that many moves are ever played to load a game.
+    """
+    __tablename__ = 'game_move'
+
+    # Zobrist keys are unsigned 64 bit ints. Stored shifted into the signed range of a BIGINT column.
+    SIGNED_OFFSET = 1 << 63
+
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), primary_key=True)
+    # Number of the move in the game, starting at 1. Two moves saved for the same ply fail on the primary key, so the
+    # second of two competing moves is rejected.
+    ply = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # Start and end square and promotion packed into 15 bits. See src.board.packed.
+    move_code = db.Column(db.SmallInteger, nullable=False)
+    # Zobrist key of the position after the move
+    position_hash = db.Column(db.BigInteger, nullable=False)
+    # FEN string of the position after the move on checkpoint plies, otherwise None
+    fen = db.Column(db.String(100))
+
+    def __init__(self, ply, start_position, end_position, promotion_type, zobrist_key, fen=None, **kwargs):
+        """
+        Create a move.
+
+        :param ply: int
+            Number of the move in the game.
+        :param start_position: string
+            Algebraic notation position.
+        :param end_position: string
+            Algebraic notation position.
+        :param promotion_type: Type
+            Type the pawn was promoted to, or None.
+        :param zobrist_key: int
+            Zobrist key of the position after the move.
+        :param fen: string
+            FEN string of the position after the move if this is a checkpoint.
+        :param kwargs:
+        """
+        super().__init__(ply=ply, move_code=packed.encode_move(start_position, end_position, promotion_type),
+                         position_hash=zobrist_key - self.SIGNED_OFFSET, fen=fen, **kwargs)
+
+    @property
+    def move(self):
+        # (start position, end position, promotion Type or None), as taken by ChessBoard.make_move
+        return packed.decode_move(self.move_code)
+
+    @property
+    def start_position(self):
+        return self.move[0]
+
+    @property
+    def end_position(self):
+        return self.move[1]
+
+    @property
+    def promotion_type(self):
+        return self.move[2]
+
+    @property
+    def zobrist_key(self):
+        return self.position_hash + self.SIGNED_OFFSET
+
+    @classmethod
+    def zobrist_keys(cls, position_hashes):
+        """
+        Convert position_hash values read straight from the db back to Zobrist keys.
+
+        :param position_hashes: int[]
+        :return: int[]
+        """
+        return [position_hash + cls.SIGNED_OFFSET for position_hash in position_hashes]
+
+    def to_dict(self):
+        """
+        Return dictionary of move.
+        :return:
+        """
+        return {
+            'ply': self.ply,
+            'move_code': self.move_code,
+            'position_hash': self.position_hash,
+            'fen': self.fen
+        }
+
+    @classmethod
+    def from_dict(cls, game_id, move):
+        """
+        Create a move from the value returned by to_dict.
+
+        :param game_id: int
+            Id of the game.
+        :param move: dict
+        :return: GameMove
+        """
+        start_position, end_position, promotion_type = packed.decode_move(move['move_code'])
+        return cls(move['ply'], start_position, end_position, promotion_type, move['position_hash'] + cls.SIGNED_OFFSET,
+                   move['fen'], game_id=game_id)
+
+    def __repr__(self):
+        return "<GameMove(game_id='{}', ply='{}', move='{}')>".format(self.game_id, self.ply, self.move)
@@ -0,0 +1,81 @@
+"""
+One-off migration of a db created before moves were logged to game_move.
+
+Before the move log the game table held the FEN string of the current position in fen, had no version or
+final_position column and there was no game_move table. Now fen holds the position the game started from and the
+current position is played back from game_move. The moves of old games were never stored, so they cannot be backfilled.
+Instead the current position of every old game becomes its starting position with no moves, which keeps every game
+where it is. Repetitions before the migration are not counted.
+
+The migration adds the version and final_position columns, creates game_move, sets version to 1 where it is empty and
+packs the final position of finished games. Games already migrated are left alone, so running it twice is harmless.
+Run it once, with the app stopped, before starting the new version:
+
+    python -m src.models.migrate_move_log
+"""
+from sqlalchemy import inspect
+from sqlalchemy import text
+from src import db
+from src.board.chess_board import ChessBoard
+from src.board.fen import Fen
+from src.models.chess_game import ChessGame
+
+
+def add_missing_columns(engine):
+    """
+    Add the game columns that came with the move log to a db that does not have them.
+
+    :param engine: Engine
+    :return: list
+        Names of the columns added.
+    """
+    existing = {column['name'] for column in inspect(engine).get_columns(ChessGame.__tablename__)}
+    added = []
+    for column in (ChessGame.__table__.c.version, ChessGame.__table__.c.final_position):
+        if column.name in existing:
+            continue
+        engine.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(
+            ChessGame.__tablename__, column.name, column.type.compile(dialect=engine.dialect)))
+        added.append(column.name)
+    return added
+
+
+def backfill_games(engine):
+    """
+    Set the version of games that have none, and pack the final position of finished games from their FEN string.
+
+    :param engine: Engine
+    :return: tuple
+        (games given a version, finished games given a final position)
+    """
+    versioned = engine.execute(text('UPDATE game SET version = 1 WHERE version IS NULL')).rowcount
+    if engine.dialect.name != 'sqlite':
+        # SQLite cannot change a column once it is added. The mapper always sets version on new rows either way.
+        engine.execute('ALTER TABLE game ALTER COLUMN version SET NOT NULL')
+
+    finished = engine.execute(text('SELECT id, fen FROM game WHERE is_over AND final_position IS NULL AND id NOT IN '
+                                   '(SELECT game_id FROM game_move)')).fetchall()
+    for game_id, fen in finished:
+        final_position = ChessBoard(Fen(fen, validate=False)).get_packed_position()
+        engine.execute(text('UPDATE game SET final_position = :final_position WHERE id = :id'),
+                       final_position=final_position, id=game_id)
+    return versioned, len(finished)
+
+
+def migrate():
+    """
+    Bring the db up to date with the move log schema.
+
+    :return:
+    """
+    engine = db.engine
+    added = add_missing_columns(engine)
+    # Only creates the tables that are missing, which is game_move
+    db.create_all()
+    versioned, finished = backfill_games(engine)
+    print('Added columns: {}. Set version of {} games. Packed final position of {} finished games.'.format(
+        ', '.join(added) or 'none', versioned, finished))
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,254 @@
+"""
+Write-behind persistence for game moves.
+
+Committing every move costs at least one fsync of the database. In write-behind mode a move is instead appended to a
+local journal file as the state of the game after the move, and the move is acknowledged once the journal write is on
+disk. A background thread writes the latest state of every changed game to the database in one commit at a fixed
+interval, then compacts the journal down to the states that arrived while it was writing.
+
+Entries left in the journal by a crash are replayed into the database when the journal is opened. A later entry for a
+game replaces an earlier one, so replaying an entry that was already written is harmless.
+
+The journal is local to the process, so write-behind mode expects a single process to serve all moves of a game.
+"""
+import json
+import logging
+import os
+from collections import OrderedDict
+from threading import Event
+from threading import Lock
+from threading import Thread
+
+DEFAULT_INTERVAL = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    """
+    Journal of game states waiting to be written to the database.
+    """
+
+    def __init__(self):
+        """
+        Create a closed journal. Nothing is written behind until open is called.
+        """
+        self._lock = Lock()
+        # Holds the flush back while a batch is being written, so batches are written in order.
+        self._flush_lock = Lock()
+        # [game id]: Latest state of the game not yet in the database.
+        self._pending = OrderedDict()
+        # [game id]: State of the game in the batch being written. Still pending until the writer returns.
+        self._inflight = OrderedDict()
+        self._path = None
+        self._file = None
+        self._writer = None
+        self._fsync = True
+        self._stop = Event()
+        self._thread = None
+        self._flushes = 0
+        self._failures = 0
+
+    @property
+    def enabled(self):
+        return self._file is not None
+
+    def open(self, path, writer, fsync=True):
+        """
+        Open the journal, replay entries left in it into the database and start accepting new entries.
+
+        :param path: string
+            Journal file. Created if it does not exist.
+        :param writer: function
+            Called with an OrderedDict of [game id]: state to write a batch to the database. Must raise if the batch
+            was not written.
+        :param fsync: bool
+            Sync the journal to disk on every entry. Without it a move survives the process crashing but not the
+            machine crashing.
+        :return:
+        """
+        with self._lock:
+            self._path = path
+            self._writer = writer
+            self._fsync = fsync
+            self._pending = self._read_journal(path)
+            self._file = open(path, 'a', encoding='utf-8')
+        self.flush()
+
+    def start(self, interval=DEFAULT_INTERVAL):
+        """
+        Start flushing the journal to the database in the background.
+
+        :param interval: float
+            Seconds between flushes.
+        :return:
+        """
+        self._stop.clear()
+        self._thread = Thread(target=self._run, args=(interval,), name='write-behind', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """
+        Stop the background flush, write everything still pending and close the journal. Entries that could not be
+        written stay in the journal for the next open.
+
+        :return:
+        """
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self.enabled:
+            self.flush()
+            with self._lock:
+                self._file.close()
+                self._file = None
+
+    def record(self, game_id, state):
+        """
+        Append the state of a game to the journal. Returns once the entry is on disk.
+
+        :param game_id: int
+            Id of the game.
+        :param state: dict
+            JSON serializable state of the game, passed to the writer as is.
+        :return:
+        """
+        line = json.dumps({'game_id': game_id, 'state': state}, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+            self._pending[game_id] = state
+            self._pending.move_to_end(game_id)
+
+    def pending(self, game_id):
+        """
+        Retrieve the state of a game that has not been written to the database yet.
+
+        :param game_id: int
+            Id of the game.
+        :return: dict
+            Latest state recorded for the game, or None if the database is up to date.
+        """
+        with self._lock:
+            state = self._pending.get(game_id)
+            return state if state is not None else self._inflight.get(game_id)
+
+    def discard(self, game_id):
+        """
+        Forget the pending state of a game because it was deleted. Entries already in the journal are dropped at the
+        next compaction, and replaying one for a deleted game does nothing.
+
+        :param game_id: int
+            Id of the game.
+        :return:
+        """
+        with self._lock:
+            self._pending.pop(game_id, None)
+            self._inflight.pop(game_id, None)
+
+    def flush(self):
+        """
+        Write every pending state to the database in one batch and compact the journal. If the writer fails the states
+        are kept and tried again on the next flush. States in the batch are returned by pending until the writer is
+        done, so a game loaded during the write still sees them.
+
+        :return: bool
+            True if everything pending was written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = OrderedDict()
+                self._inflight = OrderedDict(batch)
+            if not batch:
+                return True
+
+            try:
+                self._writer(batch)
+            except Exception:
+                logger.exception('Writing %d games from the journal failed', len(batch))
+                with self._lock:
+                    # States recorded while writing are newer than the batch
+                    self._inflight.update(self._pending)
+                    self._pending = self._inflight
+                    self._inflight = OrderedDict()
+                    self._failures += 1
+                return False
+
+            with self._lock:
+                self._inflight = OrderedDict()
+                self._compact()
+                self._flushes += 1
+            return True
+
+    def stats(self):
+        """
+        Retrieve the counters for monitoring.
+
+        :return: dict
+        """
+        with self._lock:
+            return {
+                'pending': len(self._pending.keys() | self._inflight.keys()),
+                'flushes': self._flushes,
+                'failures': self._failures
+            }
+
+    def _run(self, interval):
+        """
+        Flush at every interval until stopped.
+
+        :param interval: float
+            Seconds between flushes.
+        :return:
+        """
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def _compact(self):
+        """
+        Replace the journal with one entry for every pending state. Written to a new file that is moved over the
+        journal, so a crash leaves either the old or the new journal. Caller must hold the lock.
+
+        :return:
+        """
+        compact_path = self._path + '.compact'
+        with open(compact_path, 'w', encoding='utf-8') as compact_file:
+            for game_id, state in self._pending.items():
+                compact_file.write(json.dumps({'game_id': game_id, 'state': state}, separators=(',', ':')) + '\n')
+            compact_file.flush()
+            os.fsync(compact_file.fileno())
+        self._file.close()
+        os.replace(compact_path, self._path)
+        self._file = open(self._path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def _read_journal(path):
+        """
+        Read the latest state of every game in a journal file.
+
+        :param path: string
+            Journal file.
+        :return: OrderedDict
+            [game id]: state
+        """
+        pending = OrderedDict()
+        if not os.path.exists(path):
+            return pending
+
+        with open(path, encoding='utf-8') as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Last line cut short by a crash. The move was never acknowledged.
+                    continue
+                pending[entry['game_id']] = entry['state']
+                pending.move_to_end(entry['game_id'])
+        return pending
+
+
+write_behind = WriteBehind()
@@ -1,42 +1,57 @@
 from abc import ABCMeta
+from types import MappingProxyType
+from src.piece.color import Color
 
 
 class Piece(metaclass=ABCMeta):
+    """
+    Base class for chess pieces.
 
-    def __init__(self, piece_type, color):
-        self._type = piece_type
-        self._color = color
-        self._captured = False
-        self._string_value = ''
-        self._moves = {}
+    There is one shared instance for each type and color. Pawn(Color.WHITE) always returns the same object, so pieces
+    cannot be changed and cost nothing to create or copy. Anything that changes as a piece moves, like whether a pawn
+    can still move two squares or a king can still castle, is kept by ChessBoard.
+    """
+    __slots__ = ['_type', '_color', '_string_value']
+
+    # Set by each subclass.
+    TYPE = None
+    # [MoveDirection]: Most squares the piece can move in the direction. -1 for no limit.
+    MOVE_DIRECTIONS = MappingProxyType({})
+    # FEN letter for white. Black uses the lowercase letter.
+    LETTER = ''
+
+    # Shared instances. (piece class, color): Piece
+    _instances = {}
+
+    def __new__(cls, color):
+        """
+        Retrieve the piece for a color.
+
+        :param color: Color
+            Color that this piece should have.
+        :return: Piece
+        """
+        piece = Piece._instances.get((cls, color))
+        if piece is None:
+            piece = super().__new__(cls)
+            object.__setattr__(piece, '_type', cls.TYPE)
+            object.__setattr__(piece, '_color', color)
+            object.__setattr__(piece, '_string_value', cls.LETTER if color == Color.WHITE else cls.LETTER.lower())
+            Piece._instances[(cls, color)] = piece
+        return piece
 
     @property
     def type(self):
         return self._type
 
-    @type.setter
-    def type(self, piece_type):
-        self._type = piece_type
-
     @property
     def color(self):
         return self._color
 
-    @color.setter
-    def color(self, color):
-        self._color = color
-
-    @property
-    def capture(self):
-        return self._captured
-
-    @capture.setter
-    def capture(self, captured):
-        self._captured = captured
-
     @property
     def move_directions(self):
-        return self._moves
+        # Read only. Use ChessBoard.get_move_directions for the directions of a piece on a board.
+        return self.MOVE_DIRECTIONS
 
     def to_dict(self):
         """
@@ -49,12 +64,15 @@ class Piece(metaclass=ABCMeta):
             'string_value': self._string_value
         }
 
-    def __str__(self):
-        return self._string_value
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is shared and cannot be changed'.format(self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} is shared and cannot be changed'.format(self.__class__.__name__))
 
-    def __eq__(self, other):
-        """Overrides the default implementation"""
-        if isinstance(self, other.__class__):
-            return self.__dict__ == other.__dict__
-        return False
+    def __reduce__(self):
+        # Copying or unpickling returns the shared instance
+        return self.__class__, (self._color,)
 
+    def __str__(self):
+        return self._string_value
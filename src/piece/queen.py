@@ -1,28 +1,22 @@
+from types import MappingProxyType
 from src.piece.type import Type
 from src.piece.piece import Piece
-from src.piece.color import Color
 from src.piece.move_direction import MoveDirection
 
 
 class Queen(Piece):
 
-    def __init__(self, color):
-        """
-        Create a Queen piece.
-
-        :param color:
-            Color that this piece should have.
-        :return:
-        """
-        super().__init__(Type.QUEEN, color)
-        self._moves[MoveDirection.FORWARD] = -1
-        self._moves[MoveDirection.BACKWARD] = -1
-        self._moves[MoveDirection.LEFT] = -1
-        self._moves[MoveDirection.RIGHT] = -1
-        self._moves[MoveDirection.F_LEFT_DIAG] = -1
-        self._moves[MoveDirection.F_RIGHT_DIAG] = -1
-        self._moves[MoveDirection.B_LEFT_DIAG] = -1
-        self._moves[MoveDirection.B_RIGHT_DIAG] = -1
-
-        self._string_value = 'Q' if color == Color.WHITE else 'q'
+    __slots__ = []
 
+    TYPE = Type.QUEEN
+    MOVE_DIRECTIONS = MappingProxyType({
+        MoveDirection.FORWARD: -1,
+        MoveDirection.BACKWARD: -1,
+        MoveDirection.LEFT: -1,
+        MoveDirection.RIGHT: -1,
+        MoveDirection.F_LEFT_DIAG: -1,
+        MoveDirection.F_RIGHT_DIAG: -1,
+        MoveDirection.B_LEFT_DIAG: -1,
+        MoveDirection.B_RIGHT_DIAG: -1
+    })
+    LETTER = 'Q'
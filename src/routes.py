@@ -1,16 +1,20 @@
-from src import app, socketio
-from flask import render_template, redirect, url_for, request, session, flash
+from src import app, socketio, db
+from flask import render_template, redirect, url_for, request, session, flash, Response
 from src.utils.chess_helper import ChessHelper
 from src.board.exception import *
 from src.models.player import Player
 from src.models.chess_game import ChessGame
 from src.models.game_score import GameScore
+from src.board.move_cache import legal_move_cache
+from src.utils.instrumentation import instrumentation
 from src.forms.test_forms import RemoveGame, JoinGame, MovePiece, CurrentGame, CreateGame
 from flask_socketio import emit, join_room, leave_room, close_room, rooms, disconnect
 from src.piece.color import Color
 from src.forms.forms import LoginForm, RegistrationForm
 from flask_login import current_user, login_user, logout_user, login_required
 from werkzeug.urls import url_parse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 import os
 
 
@@ -126,6 +130,14 @@ def remove_game_test():
     return redirect(url_for('chess_test'))
 
 
+def metrics():
+    return Response(instrumentation.to_prometheus(legal_move_cache.stats()), mimetype='text/plain; version=0.0.4')
+
+
+if app.config['METRICS_ROUTE']:
+    app.add_url_rule('/metrics', 'metrics', metrics)
+
+
 @socketio.on('connect', namespace='/chess-game')
 def connect():
     if 'current_game' in session:
@@ -149,7 +161,17 @@ def move_piece(json):
                 data = {'error': str(e)}
                 emit('error', data, room=session['game_room'])
             else:
-                game.save_to_db()
+                try:
+                    game.save_move()
+                except (StaleDataError, IntegrityError):
+                    # Another move was saved since the game was loaded. Drop this one.
+                    db.session.rollback()
+                    emit('error', {'error': 'Game changed while moving. Try again.'}, room=session['game_room'])
+                    return
+
+                if app.config['DELTA_UPDATES']:
+                    emit('update_game_delta', game.to_delta_dict(result), room=session['game_room'])
+                    return
 
                 game_dict = game.to_dict()
                 game_dict['result'] = result.to_dict()
@@ -158,6 +180,25 @@ def move_piece(json):
                 emit('update_game', game_dict, room=session['game_room'])
 
 
+@socketio.on('resync', namespace='/chess-game')
+def resync(json):
+    # Client missed a delta update. Send it the whole game.
+    if 'current_game' in session:
+        game = ChessGame.load_by_id(session['current_game'])
+        if game:
+            game_dict = game.to_dict()
+            game_dict['board_string'] = str(game)
+            emit('update_game', game_dict)
+
+
+@socketio.on('get_legal_moves', namespace='/chess-game')
+def get_legal_moves(json):
+    if 'current_game' in session:
+        game = ChessGame.load_by_id(session['current_game'])
+        if game:
+            emit('legal_moves', {'game_id': game.id, 'legal_moves': game.get_all_legal_moves()})
+
+
 @socketio.on('join_game', namespace='/chess-game')
 def join_game_room(json):
     game = ChessGame.load_by_id(json['game_id'])
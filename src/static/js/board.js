@@ -1,34 +1,73 @@
 $(document).ready(function() {
     var socket = io.connect('http://' + document.domain + ':' + location.port + '/chess-game');
 
+    // Number of moves the board on the page is up to date with
+    var seq = null;
+
     // Update game info
     socket.on('update_game', function (game_data) {
-        var piece;
-        var piece_data;
         var position;
-        var $board_position;
         console.log(game_data);
 
+        // Whole game, on join or resync. Redraw every square.
+        if (game_data.hasOwnProperty('board') && !game_data.hasOwnProperty('result')) {
+            $('.board_position').empty();
+            for (position in game_data.board) {
+                draw_piece(position, game_data.board[position]);
+            }
+        }
+
         // Update board after move
         if (game_data.hasOwnProperty('result')) {
-            for (position in game_data.result.update_positions) {
-                $board_position = $('.board_position[data-position="' + position + '"]');
-                if (game_data.result.update_positions[position]) {
-                    piece_data = game_data.result.update_positions[position]
-                    piece = '<svg class="piece" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="45px" height="45px">\n' +
-                            '<use xlink:href="#' + piece_data.color + '-' + piece_data.type + '" x="0" y="0" ></use>\n' +
-                            '</svg>';
-                    // Remove the piece first just in case same location selected
-                    $board_position.empty();
-                    $board_position.append(piece);
-                }
-                else {
-                    $board_position.empty();
-                }
-            }
+            update_positions(game_data.result.update_positions);
+        }
+
+        if (game_data.hasOwnProperty('seq')) {
+            seq = game_data.seq;
+        }
+    });
+
+    // Squares changed by a move, when the server only sends deltas
+    socket.on('update_game_delta', function (delta) {
+        console.log(delta);
+
+        // Already have this move
+        if (seq !== null && delta.seq <= seq) {
+            return;
         }
+
+        // Missed a move, or never got the whole game. Ask for all of it.
+        if (seq === null || delta.seq !== seq + 1) {
+            socket.emit('resync', {});
+            return;
+        }
+
+        update_positions(delta.result.update_positions);
+        seq = delta.seq;
     });
 
+    function update_positions(positions) {
+        var position;
+        for (position in positions) {
+            if (positions[position]) {
+                draw_piece(position, positions[position]);
+            }
+            else {
+                $('.board_position[data-position="' + position + '"]').empty();
+            }
+        }
+    }
+
+    function draw_piece(position, piece_data) {
+        var $board_position = $('.board_position[data-position="' + position + '"]');
+        var piece = '<svg class="piece" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="45px" height="45px">\n' +
+                    '<use xlink:href="#' + piece_data.color + '-' + piece_data.type + '" x="0" y="0" ></use>\n' +
+                    '</svg>';
+        // Remove the piece first just in case same location selected
+        $board_position.empty();
+        $board_position.append(piece);
+    }
+
     // Log errors
     socket.on('error', function (error_data) {
        console.log(error_data.error)
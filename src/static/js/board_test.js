@@ -1,11 +1,18 @@
 $(document).ready(function() {
     var socket = io.connect('http://' + document.domain + ':' + location.port + '/chess-game');
 
+    // Number of moves the page is up to date with
+    var seq = null;
+
     // Update game info
     socket.on('update_game', function (game_data) {
         var x = 1;
         console.log(game_data);
 
+        if (game_data.hasOwnProperty('seq')) {
+            seq = game_data.seq;
+        }
+
         // Game id
         if (game_data.hasOwnProperty('game_id')) {
             $('#game_id').val(game_data.game_id)
@@ -51,6 +58,15 @@ $(document).ready(function() {
         // Update pawn promotion
     });
 
+    // Moves when the server only sends deltas. The test page shows the board as text, which is not part of a delta,
+    // so it asks for the whole game unless the move was already seen.
+    socket.on('update_game_delta', function (delta) {
+        console.log(delta);
+        if (seq === null || delta.seq > seq) {
+            socket.emit('resync', {});
+        }
+    });
+
     $('.join-game .submit').on('click', function () {
         var game_id = $('.join-game #join_game_id').val();
         var user_id = $('.join-game #user_id').val();
@@ -6,6 +6,8 @@ class ChessHelper:
     Helper class for chess game.
     """
 
+    POSITION_PATTERN = re.compile('^[a-h][1-8]$')
+
     @classmethod
     def to_string(cls, value):
         """
@@ -28,8 +30,7 @@ class ChessHelper:
         :return: boolean
             True if position is valid, False otherwise
         """
-        pattern = re.compile('^[a-h][0-8]$')
-        match = pattern.match(position)
+        match = cls.POSITION_PATTERN.match(position)
 
         return match is not None
 
@@ -0,0 +1,146 @@
+"""
+Opt-in call counters and timers for the functions a move request spends its time in.
+
+Functions are marked with the instrumented decorator. Whether they are wrapped is decided once, when the decorator is
+applied on import, from the INSTRUMENTATION setting. With the setting off the decorator hands back the function itself,
+so the decorators can stay in place in production at no cost per call. With it on every call adds one to the
+function's call count and its run time to the function's total seconds, for as long as enabled stays set.
+"""
+import functools
+from collections import OrderedDict
+from threading import Lock
+from time import perf_counter
+from src.config import Config
+
+
+class Instrumentation:
+    """
+    Call counts and total run time of instrumented functions, keyed by name.
+    """
+
+    def __init__(self):
+        """
+        Create instrumentation with no recorded calls, enabled as set in the config.
+        """
+        self.enabled = Config.INSTRUMENTATION
+        self._lock = Lock()
+        # [name]: [calls, seconds]
+        self._stats = OrderedDict()
+
+    def register(self, name):
+        """
+        Add a function name so it shows up in snapshots before it is first called.
+
+        :param name: string
+            Name of the instrumented function.
+        :return:
+        """
+        with self._lock:
+            self._stats.setdefault(name, [0, 0.0])
+
+    def record(self, name, seconds):
+        """
+        Record one call of an instrumented function.
+
+        :param name: string
+            Name of the instrumented function.
+        :param seconds: float
+            Time the call took.
+        :return:
+        """
+        with self._lock:
+            stats = self._stats.setdefault(name, [0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+
+    def reset(self):
+        """
+        Set every call count and timer back to zero.
+
+        :return:
+        """
+        with self._lock:
+            for stats in self._stats.values():
+                stats[0] = 0
+                stats[1] = 0.0
+
+    def snapshot(self):
+        """
+        Retrieve the counters for monitoring.
+
+        :return: dict
+            [name]: {'calls': int, 'seconds': float}
+        """
+        with self._lock:
+            return OrderedDict((name, {'calls': calls, 'seconds': seconds})
+                               for name, (calls, seconds) in self._stats.items())
+
+    def to_prometheus(self, cache_stats=None):
+        """
+        Format the counters in the Prometheus text exposition format.
+
+        :param cache_stats: dict
+            Result of LegalMoveCache.stats to export alongside the function counters, or None.
+        :return: string
+        """
+        snapshot = self.snapshot()
+        lines = [
+            '# HELP chess_calls_total Number of calls of an instrumented function.',
+            '# TYPE chess_calls_total counter'
+        ]
+        lines += ['chess_calls_total{{function="{}"}} {}'.format(name, stats['calls'])
+                  for name, stats in snapshot.items()]
+        lines += [
+            '# HELP chess_call_seconds_total Total time spent in an instrumented function.',
+            '# TYPE chess_call_seconds_total counter'
+        ]
+        lines += ['chess_call_seconds_total{{function="{}"}} {:.9f}'.format(name, stats['seconds'])
+                  for name, stats in snapshot.items()]
+
+        if cache_stats:
+            for key in ('hits', 'misses', 'evictions'):
+                lines += [
+                    '# TYPE chess_legal_move_cache_{}_total counter'.format(key),
+                    'chess_legal_move_cache_{}_total {}'.format(key, cache_stats[key])
+                ]
+            for key in ('size', 'max_size'):
+                lines += [
+                    '# TYPE chess_legal_move_cache_{} gauge'.format(key),
+                    'chess_legal_move_cache_{} {}'.format(key, cache_stats[key])
+                ]
+
+        return '\n'.join(lines) + '\n'
+
+
+instrumentation = Instrumentation()
+
+
+def instrumented(name):
+    """
+    Count calls of a function and time them while instrumentation is enabled. Apply below classmethod or
+    staticmethod. If instrumentation is disabled when the decorator is applied the function is returned unwrapped, and
+    enabling instrumentation later does not time it.
+
+    :param name: string
+        Name the function is reported under.
+    :return: function
+        Decorator.
+    """
+    def decorator(function):
+        instrumentation.register(name)
+        if not instrumentation.enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                instrumentation.record(name, perf_counter() - start)
+
+        return wrapper
+
+    return decorator
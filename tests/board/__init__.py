@@ -1,4 +1,7 @@
 __all__ = [
     'test_chessboard',
-    'test_fen'
+    'test_fen',
+    'test_move_cache',
+    'test_packed',
+    'test_perft'
 ]
\ No newline at end of file
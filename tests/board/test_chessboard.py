@@ -1,5 +1,8 @@
+import copy
+import sys
+import threading
 import unittest
-from src.board.chess_board import ChessBoard
+from src.board.chess_board import ChessBoard, KingSafety
 from src.piece.king import King
 from src.piece.pawn import Pawn
 from src.piece.queen import Queen
@@ -9,6 +12,7 @@ from src.piece.rook import Rook
 from src.piece.color import Color
 from src.board.fen import Fen
 from src.piece.move_direction import MoveDirection
+from src.piece.type import Type
 from src.board.exception import *
 
 
@@ -159,6 +163,51 @@ class BoardStateTest(unittest.TestCase):
         board['g6'] = Knight(Color.WHITE)
         self.assertTrue(board.is_checkmate(Color.BLACK), 'King should be in checkmate')
 
+    def test_not_checkmate_when_check_can_be_stopped(self):
+        """
+        Put the king in check where the king cannot move but another piece can capture the checking piece, block the
+        check or capture the checking pawn en passant.
+        Expected result is checkmate has not occurred. Once the piece that could help is removed or pinned, checkmate
+        has occurred.
+        :return:
+        """
+        # Bishop can capture the checking knight
+        board = ChessBoard(Fen('4b1rk/5Npp/8/8/8/8/8/7K b - -'))
+        self.assertFalse(board.is_checkmate(Color.BLACK), 'Bishop should be able to capture the knight')
+        board = ChessBoard(Fen('6rk/5Npp/8/8/8/8/8/7K b - -'))
+        self.assertTrue(board.is_checkmate(Color.BLACK), 'Nothing should be able to capture the knight')
+
+        # Bishop can block the rook. Once pinned by the queen, it cannot.
+        board = ChessBoard(Fen('6k1/8/8/8/8/3nB3/6PP/r5K1 w - -'))
+        self.assertFalse(board.is_checkmate(Color.WHITE), 'Bishop should be able to block')
+        board['c5'] = Queen(Color.BLACK)
+        self.assertTrue(board.is_checkmate(Color.WHITE), 'Pinned bishop should not be able to block')
+
+        # Pawn can block by moving forward two squares
+        board = ChessBoard(Fen('k5r1/8/8/3b4/8/8/4P2P/7K w - -'))
+        self.assertFalse(board.is_checkmate(Color.WHITE), 'Pawn should be able to block')
+        board = ChessBoard(Fen('k5r1/8/8/3b4/8/8/7P/7K w - -'))
+        self.assertTrue(board.is_checkmate(Color.WHITE), 'Nothing should be able to block')
+
+        # Pawn that just moved forward two squares gives check and can be captured en passant
+        board = ChessBoard(Fen('3R4/8/8/2k1N3/3Pp3/8/8/1R2K3 b - d3'))
+        self.assertFalse(board.is_checkmate(Color.BLACK), 'Pawn should be able to capture en passant')
+        board = ChessBoard(Fen('3R4/8/8/2k1N3/3Pp3/8/8/1R2K3 b - -'))
+        self.assertTrue(board.is_checkmate(Color.BLACK), 'Pawn should not be able to capture en passant')
+
+    def test_double_check_checkmate(self):
+        """
+        Put the king in double check where another piece could block one of the checks.
+        Expected result is checkmate since only the king can move out of double check.
+        :return:
+        """
+        board = ChessBoard(Fen('3rkb2/3p1p2/8/8/8/8/8/4R1K1 b - -'))
+        self.assertFalse(board.is_checkmate(Color.BLACK), 'Bishop should be able to block')
+
+        board['f6'] = Knight(Color.WHITE)
+        self.assertTrue(board.compute_king_safety(Color.BLACK).is_double_check)
+        self.assertTrue(board.is_checkmate(Color.BLACK), 'Only the king can move out of double check')
+
     def test_is_stalemate(self):
         """
         Test case where it is a players move and they have no valid moves left.
@@ -199,6 +248,39 @@ class BoardStateTest(unittest.TestCase):
         is_stalemate = board.is_stalemate(Color.BLACK)
         self.assertFalse(is_stalemate, 'Board configuration should not result in stalemate')
 
+    def test_has_any_legal_move(self):
+        """
+        Configure boards where the only piece that can move is the king, a piece other than the king, a pinned piece
+        and no piece at all.
+        Expected result is a legal move is found unless nothing can move.
+        :return:
+        """
+        board = ChessBoard()
+        board['a8'] = King(Color.BLACK)
+        board['c1'] = Rook(Color.WHITE)
+        board['d7'] = Rook(Color.WHITE)
+        self.assertTrue(board.has_any_legal_move(Color.BLACK), 'King should be able to move')
+
+        board = ChessBoard()
+        board['a1'] = King(Color.BLACK)
+        board['b4'] = Rook(Color.WHITE)
+        board['c2'] = King(Color.WHITE)
+        board['c4'] = Bishop(Color.WHITE)
+        self.assertFalse(board.has_any_legal_move(Color.BLACK), 'No black piece should be able to move')
+
+        # Rook pinned along the file can still move along the pin
+        board = ChessBoard()
+        board['a1'] = King(Color.BLACK)
+        board['a4'] = Rook(Color.BLACK)
+        board['a8'] = Rook(Color.WHITE)
+        board['b3'] = Queen(Color.WHITE)
+        board['c2'] = King(Color.WHITE)
+        self.assertTrue(board.has_any_legal_move(Color.BLACK), 'Pinned rook should be able to move along the pin')
+
+        board['a4'] = Bishop(Color.BLACK)
+        self.assertFalse(board.has_any_legal_move(Color.BLACK), 'Pinned bishop should not be able to move')
+        self.assertTrue(board.is_stalemate(Color.BLACK))
+
     def test_can_en_passant(self):
         """
         Test that a pawn can perform en passant move.
@@ -358,5 +440,317 @@ class BoardStateTest(unittest.TestCase):
         self.assertFalse(can_castle_right, 'King should not be able to castle right')
 
 
+    def test_make_and_unmake_move(self):
+        """
+        Make a castling move, an en passant capture and a capturing promotion, then take each one back.
+        Expected result is each move updates the board and taking it back restores the board and castling and en
+        passant info.
+        :return:
+        """
+        fen = Fen('r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6')
+        board = ChessBoard(fen)
+        original_pieces = board.get_board_pieces()
+
+        undo = board.make_move(('e1', 'g1', None))
+        self.assertEqual(Type.KING, board['g1'].type)
+        self.assertEqual(Rook(Color.WHITE), board['f1'])
+        self.assertIsNone(board['h1'])
+        self.assertIsNone(board.get_enpassant_position())
+        self.assertFalse(board.can_castle(Color.WHITE, MoveDirection.LEFT))
+        board.unmake_move(undo)
+        self.assertDictEqual(original_pieces, board.get_board_pieces())
+        self.assertEqual('d6', board.get_enpassant_position())
+        self.assertTrue(board.can_castle(Color.WHITE, MoveDirection.LEFT))
+        self.assertTrue(board.can_castle(Color.WHITE, MoveDirection.RIGHT))
+
+        undo = board.make_move(('e5', 'd6', None))
+        self.assertEqual('p', str(undo.captured))
+        self.assertIsNone(board['d5'])
+        board.unmake_move(undo)
+        self.assertDictEqual(original_pieces, board.get_board_pieces())
+
+        undo = board.make_move(('b7', 'a8', Type.QUEEN))
+        self.assertEqual(Queen(Color.WHITE), board['a8'])
+        self.assertEqual(Rook(Color.BLACK), undo.captured)
+        board.unmake_move(undo)
+        self.assertDictEqual(original_pieces, board.get_board_pieces())
+
+    def test_clone(self):
+        """
+        Clone a board with and without copy-on-write, then change the original and each clone.
+        Expected result is a clone starts out in the same position and a change to one board never shows up on another.
+        :return:
+        """
+        board = ChessBoard(Fen('r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 3 20'))
+        fen = board.get_fen()
+        for copy_on_write in (False, True):
+            clone = board.clone(copy_on_write)
+            self.assertEqual(fen, clone.get_fen())
+            self.assertEqual(board.zobrist_key, clone.zobrist_key)
+            self.assertEqual(board.material_signature, clone.material_signature)
+            self.assertCountEqual(board.generate_legal_moves(Color.WHITE), clone.generate_legal_moves(Color.WHITE))
+
+            clone.move_piece('e1', 'g1')
+            self.assertEqual(fen, board.get_fen())
+            self.assertEqual('r3k2r/1P6/8/3pP3/8/8/8/R4RK1 b kq - 4 20', clone.get_fen())
+            self.assertEqual(King(Color.WHITE), board['e1'])
+            self.assertTrue(board.can_castle(Color.WHITE, MoveDirection.RIGHT))
+            self.assertFalse(clone.can_castle(Color.WHITE, MoveDirection.RIGHT))
+
+        # The original changing after a copy-on-write clone is taken does not change the clone
+        clone = board.clone(copy_on_write=True)
+        undo = board.make_move(('b7', 'a8', Type.QUEEN))
+        self.assertEqual(fen, clone.get_fen())
+        self.assertEqual(Rook(Color.BLACK), clone['a8'])
+        board.unmake_move(undo)
+        self.assertEqual(fen, board.get_fen())
+
+        clone = copy.deepcopy(board)
+        clone['e5'] = Queen(Color.WHITE)
+        self.assertEqual(Pawn(Color.WHITE), board['e5'])
+
+    def test_clone_concurrent_reads(self):
+        """
+        Generate legal moves on copy-on-write clones of one board from several threads at once, switching threads as
+        often as possible.
+        Expected result is every thread always gets the moves of the original board.
+        :return:
+        """
+        board = ChessBoard(Fen('8/8/3k4/8/8/4K3/8/8 w - -'))
+        expected_moves = sorted(board.generate_legal_moves(Color.WHITE))
+        failures = []
+
+        def read_clones():
+            for _ in range(500):
+                try:
+                    legal_moves = sorted(board.clone(copy_on_write=True).generate_legal_moves(Color.WHITE))
+                except Exception as e:
+                    failures.append(e)
+                else:
+                    if legal_moves != expected_moves:
+                        failures.append(legal_moves)
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=read_clones) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        self.assertListEqual([], failures)
+
+    def test_zobrist_key(self):
+        """
+        Move knights out and back, build the same position from a FEN string and piece by piece, and change the side
+        to move and en passant target.
+        Expected result is the same position always has the same key and different positions have different keys.
+        :return:
+        """
+        board = ChessBoard(Fen())
+        start_key = board.zobrist_key
+        self.assertEqual(start_key, ChessBoard(Fen()).zobrist_key)
+
+        for start_position, end_position in [('g1', 'f3'), ('g8', 'f6'), ('f3', 'g1')]:
+            board.move_piece(start_position, end_position)
+            self.assertNotEqual(start_key, board.zobrist_key)
+        board.move_piece('f6', 'g8')
+        self.assertEqual(start_key, board.zobrist_key)
+
+        # Side to move, en passant file and castling are part of the key
+        black_to_move = ChessBoard(Fen('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR b KQkq -'))
+        self.assertNotEqual(start_key, black_to_move.zobrist_key)
+        no_castle = ChessBoard(Fen('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w Kkq -'))
+        self.assertNotEqual(start_key, no_castle.zobrist_key)
+        en_passant = ChessBoard(Fen('rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6'))
+        no_en_passant = ChessBoard(Fen('rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq -'))
+        self.assertNotEqual(en_passant.zobrist_key, no_en_passant.zobrist_key)
+
+        board = ChessBoard(Fen('4k2r/8/8/8/8/8/8/R3K3 w KQkq -'))
+        same_board = ChessBoard()
+        same_board['h8'] = Rook(Color.BLACK)
+        same_board['e8'] = King(Color.BLACK)
+        same_board['a1'] = Rook(Color.WHITE)
+        same_board['e1'] = King(Color.WHITE)
+        same_board['d4'] = Queen(Color.WHITE)
+        self.assertNotEqual(board.zobrist_key, same_board.zobrist_key)
+        same_board._remove_piece('d4')
+        self.assertEqual(board.zobrist_key, same_board.zobrist_key)
+
+        key = board.zobrist_key
+        undo = board.make_move(('e1', 'c1', None))
+        self.assertNotEqual(key, board.zobrist_key)
+        board.unmake_move(undo)
+        self.assertEqual(key, board.zobrist_key)
+
+    def test_get_fen(self):
+        """
+        Play moves from the starting position, put the king in check and capture a rook on its starting square.
+        Expected result is the FEN string follows every move, castling rights are only lost by moving the king or rook
+        or by having the rook captured, and being in check does not remove them.
+        :return:
+        """
+        board = ChessBoard(Fen())
+        self.assertEqual(Fen.DEFAULT_FEN, board.get_fen())
+
+        board.move_piece('e2', 'e4')
+        self.assertEqual('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1', board.get_fen())
+        board.move_piece('g8', 'f6')
+        self.assertEqual('rnbqkb1r/pppppppp/5n2/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 1 2', board.get_fen())
+        board.move_piece('e1', 'e2')
+        self.assertEqual('rnbqkb1r/pppppppp/5n2/8/4P3/8/PPPPKPPP/RNBQ1BNR b kq - 2 2', board.get_fen())
+        self.assertEqual(board.get_fen(), ChessBoard(Fen(board.get_fen())).get_fen())
+
+        # Check does not take castling away
+        board = ChessBoard(Fen('4k3/8/8/8/8/8/3q4/R3K2R w KQ -'))
+        self.assertTrue(board.is_check(Color.WHITE))
+        self.assertEqual('4k3/8/8/8/8/8/3q4/R3K2R w KQ - 0 1', board.get_fen())
+
+        # Rook must be on its starting square
+        board = ChessBoard(Fen('r3k2r/8/8/8/8/8/8/R3K1R1 w KQkq -'))
+        self.assertEqual('r3k2r/8/8/8/8/8/8/R3K1R1 w Qkq - 0 1', board.get_fen())
+        board.move_piece('a1', 'a8')
+        self.assertEqual('R3k2r/8/8/8/8/8/8/4K1R1 b k - 0 1', board.get_fen())
+        board.move_piece('h8', 'h1')
+        self.assertEqual('R3k3/8/8/8/8/8/8/4K1Rr w - - 1 2', board.get_fen())
+
+    def test_move_counters(self):
+        """
+        Make quiet moves, a capture and a pawn move, then take the moves back.
+        Expected result is the halfmove clock counts quiet moves and resets on captures and pawn moves, the fullmove
+        number goes up after black moves and taking moves back restores both.
+        :return:
+        """
+        board = ChessBoard(Fen('4k3/4p3/8/8/8/8/3n4/R3K3 w Q - 10 20'))
+        self.assertEqual(10, board.halfmove_clock)
+        self.assertEqual(20, board.fullmove_number)
+
+        undos = [board.make_move(('a1', 'a2', None))]
+        self.assertEqual((11, 20), (board.halfmove_clock, board.fullmove_number))
+        undos.append(board.make_move(('e8', 'f8', None)))
+        self.assertEqual((12, 21), (board.halfmove_clock, board.fullmove_number))
+        undos.append(board.make_move(('a2', 'd2', None)))
+        self.assertEqual((0, 21), (board.halfmove_clock, board.fullmove_number))
+        undos.append(board.make_move(('e7', 'e5', None)))
+        self.assertEqual((0, 22), (board.halfmove_clock, board.fullmove_number))
+        self.assertEqual('5k2/8/8/4p3/8/8/3R4/4K3 w - e6 0 22', board.get_fen())
+
+        for undo in reversed(undos):
+            board.unmake_move(undo)
+        self.assertEqual((10, 20), (board.halfmove_clock, board.fullmove_number))
+        self.assertEqual('4k3/4p3/8/8/8/8/3n4/R3K3 w Q - 10 20', board.get_fen())
+
+    def test_is_insufficient_material(self):
+        """
+        Load boards with only kings, one minor piece, bishops on the same and on different square colors, and boards
+        with pawns, rooks or two knights. Then capture the last piece that can checkmate.
+        Expected result is only boards where neither side can checkmate are insufficient material.
+        :return:
+        """
+        insufficient = ['8/8/4k3/8/8/3K4/8/8 w - -', '8/8/4k3/8/8/3K4/5N2/8 w - -', '8/8/4k3/6n1/8/3K4/8/8 w - -',
+                        '8/8/4k3/8/8/3K4/6B1/8 w - -', '8/8/4k1b1/8/8/3K4/8/8 w - -',
+                        '8/8/4k2b/8/8/2BK4/5B2/8 w - -']
+        for fen in insufficient:
+            with self.subTest(fen=fen):
+                self.assertTrue(ChessBoard(Fen(fen)).is_insufficient_material())
+
+        sufficient = ['8/8/4k3/8/8/3K4/6P1/8 w - -', '8/8/4k3/8/8/3K4/6R1/8 w - -', '8/8/4k3/8/8/3K4/5NN1/8 w - -',
+                      '8/8/4k3/8/8/3K4/5BB1/8 w - -', '8/8/4k1b1/8/8/3K4/5B2/8 w - -', '8/8/4k3/8/8/3K4/4BN2/8 w - -',
+                      Fen.DEFAULT_FEN]
+        for fen in sufficient:
+            with self.subTest(fen=fen):
+                self.assertFalse(ChessBoard(Fen(fen)).is_insufficient_material())
+
+        board = ChessBoard(Fen('8/8/4k3/8/8/3K4/5Nr1/8 w - -'))
+        undo = board.make_move(('f2', 'g4', None))
+        self.assertFalse(board.is_insufficient_material())
+        board.unmake_move(undo)
+        undo = board.make_move(('d3', 'e2', None))
+        board.make_move(('g2', 'f2', None))
+        self.assertFalse(board.is_insufficient_material())
+        board.make_move(('e2', 'f2', None))
+        self.assertTrue(board.is_insufficient_material())
+
+    def test_get_board_pieces(self):
+        """
+        Load a board from a FEN string and retrieve the pieces.
+        Expected result is every square is returned and occupied squares hold the pieces from the FEN string.
+        :return:
+        """
+        fen = Fen('r2qkbnr/2pp1ppp/b1n5/1N2p3/4P1Q1/8/PPPP1PPP/R1B1K1NR w KQkq -')
+        board = ChessBoard(fen)
+        board_pieces = board.get_board_pieces()
+
+        self.assertEqual(64, len(board_pieces), 'Every square should be returned')
+        self.assertDictEqual({position: str(piece) for position, piece in fen.board.items()},
+                             {position: str(piece) for position, piece in board_pieces.items() if piece})
+
+        board['e4'] = Queen(Color.BLACK)
+        self.assertEqual(Queen(Color.BLACK), board['e4'], 'Piece should be replaced')
+        self.assertIsNone(board['e3'], 'Square should be empty')
+
+    def test_compute_king_safety(self):
+        """
+        Put the king in check with a rook while a bishop of the same color as the king is pinned.
+        Expected result is the rook is reported as the checker, the squares between the rook and king are the block
+        positions and the pinned bishop can only move along the pin.
+        :return:
+        """
+        board = ChessBoard()
+        board['e1'] = King(Color.WHITE)
+        board['d2'] = Bishop(Color.WHITE)
+        board['g1'] = Knight(Color.WHITE)
+        board['e8'] = Rook(Color.BLACK)
+        board['a5'] = Bishop(Color.BLACK)
+
+        expected_safety = KingSafety()
+        expected_safety.checkers = ['e8']
+        expected_safety.block_positions = {'e8': ['e2', 'e3', 'e4', 'e5', 'e6', 'e7']}
+        expected_safety.pins = {'d2': ['a5', 'b4', 'c3', 'd2']}
+        king_safety = board.compute_king_safety(Color.WHITE)
+        self.assertEqual(expected_safety, king_safety)
+        self.assertTrue(king_safety.is_check)
+        self.assertFalse(king_safety.is_double_check)
+
+        # Pinned bishop cannot block. Knight can.
+        self.assertListEqual([], board.get_legal_moves('d2'))
+        self.assertListEqual(['e2'], board.get_legal_moves('g1'))
+
+        # Second checker leaves only king moves
+        board['f3'] = Knight(Color.BLACK)
+        king_safety = board.compute_king_safety(Color.WHITE)
+        self.assertTrue(king_safety.is_double_check)
+        self.assertListEqual([], board.get_legal_moves('g1'))
+        self.assertListEqual(['d1', 'f1', 'f2'], sorted(board.get_legal_moves('e1')))
+
+    def test_generate_legal_moves(self):
+        """
+        Generate every legal move for both players from the starting position and for a pawn about to promote.
+        Expected result is 20 moves for each player from the starting position and one move per promotion type for the
+        pawn.
+        :return:
+        """
+        board = ChessBoard(Fen())
+        white_moves = list(board.generate_legal_moves(Color.WHITE))
+        black_moves = list(board.generate_legal_moves(Color.BLACK))
+        self.assertEqual(20, len(white_moves))
+        self.assertEqual(20, len(black_moves))
+        self.assertIn(('g1', 'f3', None), white_moves)
+        self.assertIn(('e7', 'e5', None), black_moves)
+
+        for start_position, end_position, promotion in white_moves:
+            self.assertIn(end_position, board.get_legal_moves(start_position))
+
+        board = ChessBoard()
+        board['a1'] = King(Color.WHITE)
+        board['h8'] = King(Color.BLACK)
+        board['b7'] = Pawn(Color.WHITE)
+        pawn_moves = [move for move in board.generate_legal_moves(Color.WHITE) if move[0] == 'b7']
+        expected_moves = [('b7', 'b8', piece_type) for piece_type in ChessBoard.PROMOTION_TYPES]
+        self.assertListEqual(expected_moves, pawn_moves)
+
 if __name__ == '__main__':
     unittest.main()
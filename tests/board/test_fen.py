@@ -8,6 +8,7 @@ from src.piece.king import King
 from src.piece.color import Color
 from src.board.fen import Fen
 from src.board.fen import FenIncorrectFormatError
+from src.board import mailbox
 from src.piece.move_direction import MoveDirection
 
 
@@ -74,10 +75,11 @@ class FenTest(unittest.TestCase):
     def test_fen_castle_values(self):
         """
         Create FEN string using different combinations for black and white castle
-        Expect castle ability for each king to match provided value
+        Expect castle ability for each king and the castling rights bits to match provided value
         :return:
         """
         castle_values = ['KQ', 'Kk', 'Qq', 'kq', 'Kkq', 'KQk', '-']
+        expected_rights = [3, 5, 10, 12, 13, 7, 0]
         expected_castle = [
             {Color.WHITE: [MoveDirection.LEFT, MoveDirection.RIGHT], Color.BLACK: []},
             {Color.WHITE: [MoveDirection.RIGHT], Color.BLACK: [MoveDirection.LEFT]},
@@ -88,11 +90,12 @@ class FenTest(unittest.TestCase):
             {Color.WHITE: [], Color.BLACK: []}
         ]
         fen_str = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w {} -'
-        for castle, expected in zip(castle_values, expected_castle):
+        for castle, expected, rights in zip(castle_values, expected_castle, expected_rights):
             with self.subTest(castle=castle, expected=expected):
                 fen = Fen(fen_str.format(castle))
                 self.assertEqual(expected[Color.WHITE], fen.white_castle)
                 self.assertEqual(expected[Color.BLACK], fen.black_castle)
+                self.assertEqual(rights, fen.castling_rights)
 
     def test_fen_current_player(self):
         """
@@ -118,6 +121,26 @@ class FenTest(unittest.TestCase):
             fen = Fen(fen_str.format(position))
             self.assertEqual(expected, fen.en_passant_position)
 
+    def test_fen_move_counters(self):
+        """
+        Parse FEN strings with and without the halfmove clock and fullmove number, then generate one back.
+        Expected result is the counters match the FEN string, default to 0 and 1 when left out and are written back out.
+        :return:
+        """
+        fen = Fen('r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 37 42')
+        self.assertEqual(37, fen.halfmove_clock)
+        self.assertEqual(42, fen.fullmove_number)
+
+        fen = Fen('r3k2r/8/8/8/8/8/8/R3K2R b KQkq -')
+        self.assertEqual(0, fen.halfmove_clock)
+        self.assertEqual(1, fen.fullmove_number)
+
+        fen = Fen()
+        board = {position: fen.board.get(position) for position in mailbox.POSITIONS}
+        fen_str = Fen.generate_fen(board, fen.current_player, fen.white_castle, fen.black_castle,
+                                   fen.en_passant_position, fen.halfmove_clock, fen.fullmove_number)
+        self.assertEqual(Fen.DEFAULT_FEN, fen_str)
+
     def test_invalid_fen(self):
         """
         Try providing an invalid piece for each section of a FEN string.
@@ -143,3 +166,34 @@ class FenTest(unittest.TestCase):
         fen_str = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQw -'
         with self.assertRaises(FenIncorrectFormatError) as context:
             fen = Fen(fen_str)
+
+        # Row with nine squares
+        fen_str = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNRR w KQ -'
+        with self.assertRaises(FenIncorrectFormatError) as context:
+            fen = Fen(fen_str)
+
+        # Seven rows
+        fen_str = 'rnbqkbnr/pppppppp/8/8/8/PPPPPPPP/RNBQKBNR w KQ -'
+        with self.assertRaises(FenIncorrectFormatError) as context:
+            fen = Fen(fen_str)
+
+        # Pawn on the first row
+        fen_str = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNP w KQ -'
+        with self.assertRaises(FenIncorrectFormatError) as context:
+            fen = Fen(fen_str)
+
+        # Castle letters out of order
+        fen_str = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w kK -'
+        with self.assertRaises(FenIncorrectFormatError) as context:
+            fen = Fen(fen_str)
+
+        # Move counters that are not numbers, a full move number of 0 and only one counter
+        for counters in ['x 1', '0 y', '0 0', '0', '-1 1']:
+            fen_str = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQ - {}'.format(counters)
+            with self.subTest(counters=counters):
+                with self.assertRaises(FenIncorrectFormatError) as context:
+                    fen = Fen(fen_str)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from src.board.chess_board import ChessBoard
+from src.board.fen import Fen
+from src.board.move_cache import LegalMoveCache
+
+
+class LegalMoveCacheTest(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        """
+        Store legal moves for a position and look them up again.
+        Expected result is the first lookup misses, the second hits and returns a copy of the stored moves.
+        :return:
+        """
+        board = ChessBoard(Fen())
+        cache = LegalMoveCache()
+        key = (board.zobrist_key, 'e2')
+
+        self.assertIsNone(cache.get(key))
+        cache.put(key, board.get_legal_moves('e2'))
+        legal_moves = cache.get(key)
+        self.assertListEqual(board.get_legal_moves('e2'), legal_moves)
+
+        legal_moves.append('e5')
+        self.assertListEqual(board.get_legal_moves('e2'), cache.get(key), 'Cached moves should not change')
+        self.assertDictEqual({'size': 1, 'max_size': 10000, 'hits': 2, 'misses': 1, 'evictions': 0}, cache.stats())
+
+        # Key changes after a move
+        board.move_piece('e2', 'e4')
+        self.assertIsNone(cache.get((board.zobrist_key, 'e4')))
+
+    def test_eviction(self):
+        """
+        Fill the cache past its maximum size.
+        Expected result is the least recently used entry is evicted.
+        :return:
+        """
+        cache = LegalMoveCache(max_size=2)
+        cache.put((1, 'a1'), ['a2'])
+        cache.put((2, 'a1'), ['a3'])
+        cache.get((1, 'a1'))
+        cache.put((3, 'a1'), ['a4'])
+
+        self.assertIsNone(cache.get((2, 'a1')))
+        self.assertListEqual(['a2'], cache.get((1, 'a1')))
+        self.assertListEqual(['a4'], cache.get((3, 'a1')))
+        self.assertEqual(1, cache.stats()['evictions'])
+
+        cache.max_size = 1
+        self.assertEqual(1, cache.stats()['size'])
+
+        cache.clear()
+        self.assertDictEqual({'size': 0, 'max_size': 1, 'hits': 0, 'misses': 0, 'evictions': 0}, cache.stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from src.board import packed
+from src.board.chess_board import ChessBoard
+from src.board.fen import Fen
+from src.board.fen import FenError
+from src.board.packed import PackedPosition
+from src.board.packed import PackedPositionError
+from src.board.packed import encode_move
+from src.board.packed import decode_move
+from src.board import mailbox
+from src.piece.color import Color
+from src.piece.king import King
+from src.piece.type import Type
+
+
+class PackedTest(unittest.TestCase):
+
+    def test_move_round_trip(self):
+        """
+        Encode every pair of squares, with and without each promotion type.
+        Expected result is every move decodes to itself and fits a signed 16 bit column.
+        :return:
+        """
+        for start_position in mailbox.POSITIONS:
+            for end_position in mailbox.POSITIONS:
+                for promotion in (None,) + ChessBoard.PROMOTION_TYPES:
+                    code = encode_move(start_position, end_position, promotion)
+                    self.assertLess(code, 1 << 15)
+                    self.assertEqual((start_position, end_position, promotion), decode_move(code))
+
+        self.assertEqual(0, encode_move('a1', 'a1'))
+        self.assertEqual(63 | 63 << 6 | mailbox.QUEEN << 12, encode_move('h8', 'h8', Type.QUEEN))
+
+    def test_position_round_trip(self):
+        """
+        Pack positions with castling rights, black to move and en passant targets for both colors.
+        Expected result is each record is POSITION_SIZE bytes and unpacks to the same FEN string and Zobrist key.
+        :return:
+        """
+        fens = [
+            Fen.DEFAULT_FEN,
+            'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w Kq - 3 12',
+            'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3',
+            'rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b KQkq d3 0 3',
+            '8/8/8/8/8/8/8/k6K b - - 40 90'
+        ]
+        for fen in fens:
+            with self.subTest(fen=fen):
+                board = ChessBoard(Fen(fen))
+                record = board.get_packed_position()
+                self.assertEqual(packed.POSITION_SIZE, len(record))
+
+                position = PackedPosition(record, board.halfmove_clock, board.fullmove_number)
+                unpacked_board = ChessBoard(position)
+                self.assertEqual(fen, unpacked_board.get_fen())
+                self.assertEqual(board.zobrist_key, unpacked_board.zobrist_key)
+
+                fen_position = Fen(fen)
+                self.assertEqual(fen_position.board, position.board)
+                self.assertEqual(fen_position.current_player, position.current_player)
+                self.assertEqual(fen_position.castling_rights, position.castling_rights)
+                self.assertEqual(fen_position.white_castle, position.white_castle)
+                self.assertEqual(fen_position.black_castle, position.black_castle)
+                self.assertEqual(fen_position.en_passant_position, position.en_passant_position)
+
+        position = PackedPosition(ChessBoard(Fen()).get_packed_position())
+        self.assertEqual(King(Color.BLACK), position.board['e8'])
+        self.assertEqual(Color.WHITE, position.current_player)
+
+    def test_invalid_position(self):
+        """
+        Unpack records of the wrong size, with unknown state bits, invalid piece codes, pawns on the last row and en
+        passant pawns that cannot be captured.
+        Expected result is PackedPositionError, which is also a FenError.
+        :return:
+        """
+        record = ChessBoard(Fen()).get_packed_position()
+        en_passant_record = ChessBoard(Fen('rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3')) \
+            .get_packed_position()
+
+        invalid_records = [
+            record[:-1],
+            record + b'\x00',
+            record[:-1] + bytes([record[-1] | 0x20]),
+            # Piece code 8, black without a type, on a1
+            bytes([record[0] & 0xf0 | mailbox.BLACK]) + record[1:],
+            # White pawn on a1
+            bytes([record[0] & 0xf0 | mailbox.PAWN]) + record[1:],
+            # En passant pawn with its own color to move
+            en_passant_record[:-1] + bytes([en_passant_record[-1] | packed.BLACK_TO_MOVE])
+        ]
+        for invalid_record in invalid_records:
+            with self.subTest(record=invalid_record.hex()):
+                with self.assertRaises(PackedPositionError):
+                    PackedPosition(invalid_record)
+        self.assertTrue(issubclass(PackedPositionError, FenError))
@@ -0,0 +1,42 @@
+import unittest
+from src.board.chess_board import ChessBoard
+from src.board.fen import Fen
+from src.board.perft import perft, divide, run_suite, PERFT_SUITE
+
+
+class PerftTest(unittest.TestCase):
+
+    def test_perft_suite(self):
+        """
+        Count every position in the perft suite.
+        Expected result is every count matches the published count.
+        :return:
+        """
+        for result in run_suite(2):
+            with self.subTest(name=result['name']):
+                self.assertEqual(result['expected'], result['nodes'])
+                self.assertTrue(result['passed'])
+
+    def test_divide(self):
+        """
+        Divide a position with en passant and promotions.
+        Expected result is the counts add up to the perft count and the board is unchanged afterwards.
+        :return:
+        """
+        perft_position = PERFT_SUITE[3]
+        fen = Fen(perft_position['fen'])
+        board = ChessBoard(fen)
+        pieces = {position: str(piece) for position, piece in board.get_board_pieces().items()}
+        zobrist_key = board.zobrist_key
+
+        counts = divide(board, fen.current_player, 2)
+        self.assertEqual(perft_position['nodes'][0], len(counts))
+        self.assertEqual(perft_position['nodes'][1], sum(counts.values()))
+        self.assertEqual(perft_position['nodes'][1], perft(board, fen.current_player, 2))
+
+        self.assertDictEqual(pieces, {position: str(piece) for position, piece in board.get_board_pieces().items()})
+        self.assertEqual(zobrist_key, board.zobrist_key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,7 @@
 __all__ = [
-    'test_chess_game'
+    'test_chess_game',
+    'test_chess_game_db',
+    'test_game_cache',
+    'test_game_move',
+    'test_write_behind'
 ]
\ No newline at end of file
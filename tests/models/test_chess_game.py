@@ -1,4 +1,5 @@
 import unittest
+from src import app
 from src.models.chess_game import ChessGame, MoveResult
 from src.piece.color import Color
 from src.models.player import Player
@@ -8,6 +9,7 @@ from src.piece.knight import Knight
 from src.piece.queen import Queen
 from src.piece.type import Type
 from src.board.exception import *
+from src.board.move_cache import legal_move_cache
 
 
 class ChessGameTest(unittest.TestCase):
@@ -34,6 +36,81 @@ class ChessGameTest(unittest.TestCase):
         current_player = game.current_player
         self.assertEqual(Color.WHITE, current_player.color)
 
+    def test_get_all_legal_moves(self):
+        """
+        Retrieve every legal move for the current player.
+        Expected result is the moves match the legal moves of each piece for the player whose turn it is.
+        :return:
+        """
+        game = ChessGame(white_player=self.p1, black_player=self.p2)
+        legal_moves = game.get_all_legal_moves()
+        self.assertEqual(10, len(legal_moves))
+        self.assertListEqual(['a3', 'c3'], sorted(legal_moves['b1']))
+        self.assertListEqual(['e3', 'e4'], sorted(legal_moves['e2']))
+
+        game.move_piece('e2', 'e4')
+        legal_moves = game.get_all_legal_moves()
+        self.assertIn('e7', legal_moves)
+        self.assertNotIn('e4', legal_moves)
+
+    def test_get_all_legal_moves_cached(self):
+        """
+        Retrieve every legal move for the same position from two games, and change the first result.
+        Expected result is the second request is a cache hit and returns the same moves, unaffected by the change.
+        :return:
+        """
+        legal_move_cache.clear()
+        legal_moves = ChessGame().get_all_legal_moves()
+        self.assertEqual(1, legal_move_cache.stats()['misses'])
+
+        legal_moves['e2'].append('e5')
+        cached_moves = ChessGame().get_all_legal_moves()
+        self.assertEqual(1, legal_move_cache.stats()['hits'])
+        self.assertListEqual(['e3', 'e4'], sorted(cached_moves['e2']))
+        self.assertEqual(20, sum(len(end_positions) for end_positions in cached_moves.values()))
+
+    def test_loaded_game_builds_board_on_first_use(self):
+        """
+        Use a game as it comes out of the db, before its board was built, starting with each public method.
+        Expected result is every method builds the board once through the loader, and repetition counts include the
+        positions the loader counted.
+        :return:
+        """
+        played = ChessGame(white_player=self.p1, black_player=self.p2)
+        for _ in range(2):
+            played.move_piece('g1', 'f3')
+            played.move_piece('g8', 'f6')
+            played.move_piece('f3', 'g1')
+            played.move_piece('f6', 'g8')
+        board = played.board
+        position_counts = played._position_counts
+
+        def load(game):
+            game.loads += 1
+            game.board = board.clone()
+            game._ply = 8
+            game._position_counts = position_counts.copy()
+
+        calls = [
+            lambda game: self.assertEqual(['f3', 'h3'], sorted(game.get_legal_moves('g1'))),
+            lambda game: self.assertEqual(20, sum(len(moves) for moves in game.get_all_legal_moves().values())),
+            lambda game: self.assertEqual(Color.WHITE, game.current_player.color),
+            lambda game: self.assertFalse(game.can_promote_pawn('e2', 'e4')),
+            lambda game: self.assertFalse(game.is_move_limit_reached()),
+            lambda game: self.assertTrue(game.is_repetition()),
+            lambda game: self.assertIn('f3', game.move_piece('g1', 'f3').update_positions),
+            lambda game: self.assertEqual(8, game.to_delta_dict(MoveResult())['seq']),
+            lambda game: self.assertEqual(8, game.ply)
+        ]
+        for call in calls:
+            game = ChessGame(white_player=self.p1, black_player=self.p2)
+            # What the orm reconstructor leaves behind
+            game._init_on_load()
+            game.loads = 0
+            game._load_moves_from_db = lambda game=game: load(game)
+            call(game)
+            self.assertEqual(1, game.loads)
+
     def test_move_result_updated_positions(self):
         """
         Move a piece as a player.
@@ -47,6 +124,30 @@ class ChessGameTest(unittest.TestCase):
         expected_move_result.update_positions = {'d2': None, 'd4': Pawn(Color.WHITE)}
         self.assertEqual(expected_move_result, result)
 
+    def test_to_delta_dict(self):
+        """
+        Make two moves and build the delta update for each.
+        Expected result is each delta holds only the changed squares, the player to move and a sequence number that
+        goes up by one per move and matches the full game dictionary.
+        :return:
+        """
+        game = ChessGame(white_player=self.p1, black_player=self.p2)
+        self.assertEqual(0, game.to_dict()['seq'])
+
+        result = game.move_piece('d2', 'd4')
+        delta = game.to_delta_dict(result)
+        self.assertEqual(1, delta['seq'])
+        self.assertEqual(Color.BLACK.value, delta['current_player'])
+        self.assertFalse(delta['game_over'])
+        self.assertEqual({'d2': None, 'd4': Pawn(Color.WHITE).to_dict()}, delta['result']['update_positions'])
+        self.assertNotIn('board', delta)
+
+        result = game.move_piece('e7', 'e5')
+        delta = game.to_delta_dict(result)
+        self.assertEqual(2, delta['seq'])
+        self.assertEqual(Color.WHITE.value, delta['current_player'])
+        self.assertEqual(delta['seq'], game.to_dict()['seq'])
+
     def test_move_result_capture(self):
         """
         Perform piece capture.
@@ -80,6 +181,7 @@ class ChessGameTest(unittest.TestCase):
         fen = '8/8/8/8/6q1/3k4/8/4K3 b - -'
         game = ChessGame(fen=fen, white_player=self.p1, black_player=self.p2)
         self.assertFalse(game.is_over)
+        self.assertIsNone(game.final_position)
 
         result = game.move_piece('g4', 'e2')
         expected_move_result = MoveResult()
@@ -88,6 +190,7 @@ class ChessGameTest(unittest.TestCase):
         expected_move_result.king_in_check = self.p1
         self.assertEqual(expected_move_result, result)
         self.assertTrue(game.is_over)
+        self.assertEqual(game.board.get_packed_position(), game.final_position)
 
         # Medium
         fen = '8/1r6/8/4k3/1q6/8/8/K7 b KQkq -'
@@ -240,6 +343,121 @@ class ChessGameTest(unittest.TestCase):
         self.assertEqual(expected_promote_result, result)
         self.assertTrue(game.is_over)
 
+    def test_move_limit_draw(self):
+        """
+        Make the move that reaches the fifty move limit with the limit on and off, reach the seventy-five move limit and
+        checkmate on the move that reaches the limit.
+        Expected result is the game ends in a draw at fifty moves when enabled, always ends at seventy-five moves and
+        checkmate still wins.
+        :return:
+        """
+        self.p1.color = Color.WHITE
+        self.p2.color = Color.BLACK
+
+        fen = 'k7/8/8/8/8/8/8/K6R w - - 99 80'
+        game = ChessGame(fen=fen, white_player=self.p1, black_player=self.p2)
+        result = game.move_piece('h1', 'h2')
+        self.assertTrue(result.draw)
+        self.assertTrue(game.is_over)
+        self.assertEqual('k7/8/8/8/8/8/7R/K7 b - - 100 80', game.fen)
+
+        auto_draw = app.config['FIFTY_MOVE_AUTO_DRAW']
+        app.config['FIFTY_MOVE_AUTO_DRAW'] = False
+        try:
+            game = ChessGame(fen=fen, white_player=self.p1, black_player=self.p2)
+            result = game.move_piece('h1', 'h2')
+            self.assertFalse(result.draw)
+            self.assertFalse(game.is_over)
+
+            fen = 'k7/8/8/8/8/8/8/K6R w - - 149 80'
+            game = ChessGame(fen=fen, white_player=self.p1, black_player=self.p2)
+            result = game.move_piece('h1', 'h2')
+            self.assertTrue(result.draw)
+            self.assertTrue(game.is_over)
+        finally:
+            app.config['FIFTY_MOVE_AUTO_DRAW'] = auto_draw
+
+        fen = 'k7/8/1K6/8/8/8/8/7R w - - 99 80'
+        game = ChessGame(fen=fen, white_player=self.p1, black_player=self.p2)
+        result = game.move_piece('h1', 'h8')
+        self.assertFalse(result.draw)
+        self.assertEqual(self.p2, result.king_in_checkmate)
+        self.assertTrue(game.is_over)
+
+    def test_insufficient_material_draw(self):
+        """
+        Capture the last rook so only a king and knight are left against a king.
+        Expected result is the game ends in a draw.
+        :return:
+        """
+        self.p1.color = Color.WHITE
+        self.p2.color = Color.BLACK
+
+        fen = '8/8/4k3/8/8/3K4/4r3/6N1 b - -'
+        game = ChessGame(fen=fen, white_player=self.p1, black_player=self.p2)
+        result = game.move_piece('e6', 'e5')
+        self.assertFalse(result.draw)
+        self.assertFalse(game.is_over)
+
+        result = game.move_piece('g1', 'e2')
+        expected_move_result = MoveResult()
+        expected_move_result.update_positions = {'g1': None, 'e2': Knight(Color.WHITE)}
+        expected_move_result.draw = True
+        self.assertEqual(expected_move_result, result)
+        self.assertTrue(game.is_over)
+
+    def test_repetition_draw(self):
+        """
+        Move knights out and back until the starting position is reached for the third and fifth time, and make a pawn
+        move after repeating positions.
+        Expected result is the game ends in a draw on the third time when enabled, always ends on the fifth time and
+        the history starts over after a pawn move.
+        :return:
+        """
+        self.p1.color = Color.WHITE
+        self.p2.color = Color.BLACK
+        knight_moves = [('g1', 'f3'), ('g8', 'f6'), ('f3', 'g1'), ('f6', 'g8')]
+
+        game = ChessGame(white_player=self.p1, black_player=self.p2)
+        for start_position, end_position in knight_moves * 2:
+            self.assertFalse(game.is_over)
+            result = game.move_piece(start_position, end_position)
+        self.assertTrue(result.draw)
+        self.assertTrue(game.is_over)
+
+        auto_draw = app.config['THREEFOLD_REPETITION_AUTO_DRAW']
+        app.config['THREEFOLD_REPETITION_AUTO_DRAW'] = False
+        try:
+            game = ChessGame(white_player=self.p1, black_player=self.p2)
+            for start_position, end_position in knight_moves * 4:
+                self.assertFalse(game.is_over)
+                result = game.move_piece(start_position, end_position)
+            self.assertTrue(result.draw)
+            self.assertTrue(game.is_over)
+        finally:
+            app.config['THREEFOLD_REPETITION_AUTO_DRAW'] = auto_draw
+
+        # History is rebuilt when the saved moves are played back and starts over after a pawn move
+        game = ChessGame(white_player=self.p1, black_player=self.p2)
+        for start_position, end_position in knight_moves:
+            game.move_piece(start_position, end_position)
+        loaded_game = ChessGame(fen=game.start_fen, white_player=self.p1, black_player=self.p2)
+        loaded_game.load_moves(game.unsaved_moves)
+        self.assertEqual(4, loaded_game.ply)
+        self.assertEqual(game.fen, loaded_game.fen)
+        for start_position, end_position in knight_moves:
+            self.assertFalse(loaded_game.is_over)
+            result = loaded_game.move_piece(start_position, end_position)
+        self.assertTrue(result.draw)
+
+        loaded_game = ChessGame(fen=game.start_fen, white_player=self.p1, black_player=self.p2)
+        loaded_game.load_moves(game.unsaved_moves)
+        result = loaded_game.move_piece('g1', 'f3')
+        self.assertFalse(result.draw)
+        result = loaded_game.move_piece('e7', 'e5')
+        self.assertFalse(result.draw)
+        self.assertEqual(1, sum(loaded_game._position_counts.values()))
+
     def test_castle_info_stays_empty(self):
         """
         Use fen that states king cannot castle in one direction and both directions.
@@ -254,21 +472,21 @@ class ChessGameTest(unittest.TestCase):
         fen = 'r3k2r/3b2p1/2n1p1P1/1P5p/3B1P2/2P3N1/7P/3RK3 b - -'
         game = ChessGame(fen=fen, white_player=self.p1, black_player=self.p2)
         game.move_piece('h5', 'h4')
-        expected_fen = 'r3k2r/3b2p1/2n1p1P1/1P6/3B1P1p/2P3N1/7P/3RK3 w - -'
+        expected_fen = 'r3k2r/3b2p1/2n1p1P1/1P6/3B1P1p/2P3N1/7P/3RK3 w - - 0 2'
         self.assertEqual(expected_fen, game.fen)
 
         # Left direction
         fen = 'r3k2r/3b2p1/2n1p1P1/1P5p/3B1P2/2P3N1/7P/3RK3 b k -'
         game = ChessGame(fen=fen, white_player=self.p1, black_player=self.p2)
         game.move_piece('h5', 'h4')
-        expected_fen = 'r3k2r/3b2p1/2n1p1P1/1P6/3B1P1p/2P3N1/7P/3RK3 w k -'
+        expected_fen = 'r3k2r/3b2p1/2n1p1P1/1P6/3B1P1p/2P3N1/7P/3RK3 w k - 0 2'
         self.assertEqual(expected_fen, game.fen)
 
         # Right direction
         fen = 'r3k2r/3b2p1/2n1p1P1/1P5p/3B1P2/2P3N1/7P/3RK3 b q -'
         game = ChessGame(fen=fen, white_player=self.p1, black_player=self.p2)
         game.move_piece('h5', 'h4')
-        expected_fen = 'r3k2r/3b2p1/2n1p1P1/1P6/3B1P1p/2P3N1/7P/3RK3 w q -'
+        expected_fen = 'r3k2r/3b2p1/2n1p1P1/1P6/3B1P1p/2P3N1/7P/3RK3 w q - 0 2'
         self.assertEqual(expected_fen, game.fen)
 
     def test_castle_info_updated_when_king_moves(self):
@@ -286,25 +504,25 @@ class ChessGameTest(unittest.TestCase):
         # Move just king. Castle info for white should be empty
         game = ChessGame(fen=white_fen, white_player=self.p1, black_player=self.p2)
         game.move_piece('e1', 'd1')
-        expected_fen = '4k3/8/8/8/8/8/8/R2K3R b - -'
+        expected_fen = '4k3/8/8/8/8/8/8/R2K3R b - - 1 1'
         self.assertEqual(expected_fen, game.fen)
 
         # Move king back. Castle info should still be empty.
         game.move_piece('e8', 'd8')
         game.move_piece('d1', 'e1')
-        expected_fen = '3k4/8/8/8/8/8/8/R3K2R b - -'
+        expected_fen = '3k4/8/8/8/8/8/8/R3K2R b - - 3 2'
         self.assertEqual(expected_fen, game.fen)
 
         # Move just king. Castle info for white should be empty
         game = ChessGame(fen=black_fen, white_player=self.p1, black_player=self.p2)
         game.move_piece('e8', 'd8')
-        expected_fen = 'r2k3r/8/8/8/8/8/8/4K3 w - -'
+        expected_fen = 'r2k3r/8/8/8/8/8/8/4K3 w - - 1 2'
         self.assertEqual(expected_fen, game.fen)
 
         # Move king back. Castle info should still be empty.
         game.move_piece('e1', 'd1')
         game.move_piece('d8', 'e8')
-        expected_fen = 'r3k2r/8/8/8/8/8/8/3K4 w - -'
+        expected_fen = 'r3k2r/8/8/8/8/8/8/3K4 w - - 3 3'
         self.assertEqual(expected_fen, game.fen)
 
     def test_castle_info_updated_when_rooks_move(self):
@@ -322,37 +540,37 @@ class ChessGameTest(unittest.TestCase):
         # Move left rook
         game = ChessGame(fen=white_fen, white_player=self.p1, black_player=self.p2)
         game.move_piece('a1', 'b1')
-        expected_fen = '4k3/8/8/8/8/8/8/1R2K2R b K -'
+        expected_fen = '4k3/8/8/8/8/8/8/1R2K2R b K - 1 1'
         self.assertEqual(expected_fen, game.fen)
 
         # Move rook back
         game.move_piece('e8', 'd8')
         game.move_piece('b1', 'a1')
-        expected_fen = '3k4/8/8/8/8/8/8/R3K2R b K -'
+        expected_fen = '3k4/8/8/8/8/8/8/R3K2R b K - 3 2'
         self.assertEqual(expected_fen, game.fen)
 
         # Move second rook
         game.move_piece('d8', 'e8')
         game.move_piece('h1', 'g1')
-        expected_fen = '4k3/8/8/8/8/8/8/R3K1R1 b - -'
+        expected_fen = '4k3/8/8/8/8/8/8/R3K1R1 b - - 5 3'
         self.assertEqual(expected_fen, game.fen)
 
         # Move left rook
         game = ChessGame(fen=black_fen, white_player=self.p1, black_player=self.p2)
         game.move_piece('h8', 'g8')
-        expected_fen = 'r3k1r1/8/8/8/8/8/8/4K3 w q -'
+        expected_fen = 'r3k1r1/8/8/8/8/8/8/4K3 w q - 1 2'
         self.assertEqual(expected_fen, game.fen)
 
         # Move rook back
         game.move_piece('e1', 'd1')
         game.move_piece('g8', 'h8')
-        expected_fen = 'r3k2r/8/8/8/8/8/8/3K4 w q -'
+        expected_fen = 'r3k2r/8/8/8/8/8/8/3K4 w q - 3 3'
         self.assertEqual(expected_fen, game.fen)
 
         # Move second rook
         game.move_piece('d1', 'e1')
         game.move_piece('a8', 'b8')
-        expected_fen = '1r2k2r/8/8/8/8/8/8/4K3 w - -'
+        expected_fen = '1r2k2r/8/8/8/8/8/8/4K3 w - - 5 4'
         self.assertEqual(expected_fen, game.fen)
 
     def test_invalid_algebraic_positions(self):
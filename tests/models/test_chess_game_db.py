@@ -0,0 +1,304 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from sqlalchemy import text
+from sqlalchemy.orm.exc import StaleDataError
+from src import app, db
+from src.board.chess_board import ChessBoard
+from src.board.fen import Fen
+from src.models import migrate_move_log
+from src.models.chess_game import ChessGame
+from src.models.game_cache import game_cache
+from src.models.game_move import GameMove
+from src.models.player import Player
+from src.models.write_behind import write_behind
+
+
+class ChessGameDbTest(unittest.TestCase):
+    """
+    Save and load games through a db of their own.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config = {key: app.config[key] for key in ('SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_ECHO',
+                                                        'FEN_CHECKPOINT_INTERVAL', 'THREEFOLD_REPETITION_AUTO_DRAW')}
+        # The engine is made again for the new uri the next time it is used
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(self.directory, 'app.db')
+        app.config['SQLALCHEMY_ECHO'] = False
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        game_cache.clear()
+
+        self.white = Player(username='white')
+        self.black = Player(username='black')
+        db.session.add_all([self.white, self.black])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.get_engine().dispose()
+        self.context.pop()
+        app.config.update(self.config)
+        game_cache.clear()
+        shutil.rmtree(self.directory)
+
+    def new_game(self, fen=None):
+        """
+        Save a new game between the two players.
+
+        :param fen: string
+        :return: int
+            Id of the game.
+        """
+        game = ChessGame(fen, white_player=self.white, black_player=self.black)
+        game.save_to_db()
+        return game.id
+
+    @staticmethod
+    def load(game_id):
+        """
+        Load a game the way the next request would, with nothing left in the session.
+
+        :param game_id: int
+        :return: ChessGame
+        """
+        db.session.remove()
+        return ChessGame.load_by_id(game_id)
+
+    @staticmethod
+    def play(game_id, start_position, end_position):
+        """
+        Load a game, move and save it.
+
+        :param game_id: int
+        :param start_position: string
+        :param end_position: string
+        :return: MoveResult
+        """
+        game = ChessGameDbTest.load(game_id)
+        result = game.move_piece(start_position, end_position)
+        game.save_move()
+        return result
+
+    def test_save_and_load(self):
+        """
+        Play a fool's mate, loading the game for every move, and load it again from the cache and from the db.
+        Expected result is every move bumps the version, loads between moves come from the cache, and the game is the
+        same when rebuilt from the db, including the final position and score once it is over.
+        :return:
+        """
+        game_id = self.new_game()
+        self.assertEqual(1, self.load(game_id).version)
+
+        self.play(game_id, 'f2', 'f3')
+        self.play(game_id, 'e7', 'e5')
+        game = self.load(game_id)
+        self.assertEqual(3, game.version)
+        self.assertEqual(2, game.ply)
+        self.assertEqual('rnbqkbnr/pppp1ppp/8/4p3/8/5P2/PPPPP1PP/RNBQKBNR w KQkq e6 0 2', game.fen)
+        self.assertEqual(0, game_cache.stats()['misses'])
+
+        game_cache.clear()
+        game = self.load(game_id)
+        self.assertEqual(2, game.ply)
+        self.assertEqual('rnbqkbnr/pppp1ppp/8/4p3/8/5P2/PPPPP1PP/RNBQKBNR w KQkq e6 0 2', game.fen)
+        self.assertEqual(1, game_cache.stats()['misses'])
+
+        self.play(game_id, 'g2', 'g4')
+        result = self.play(game_id, 'd8', 'h4')
+        self.assertEqual('white', result.king_in_checkmate.username)
+
+        game_cache.clear()
+        game = self.load(game_id)
+        fen = 'rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3'
+        self.assertEqual(5, game.version)
+        self.assertEqual(4, game.ply)
+        self.assertEqual(fen, game.fen)
+        self.assertTrue(game.is_over)
+        self.assertEqual(ChessBoard(Fen(fen)).get_packed_position(), game.final_position)
+        self.assertEqual((0, 1), (game.score.white_score, game.score.black_score))
+        self.assertListEqual([1, 2, 3, 4], [move.ply for move in GameMove.query.filter_by(game_id=game_id)
+                                            .order_by(GameMove.ply)])
+
+    def test_competing_moves(self):
+        """
+        Load a game twice and save a move from each.
+        Expected result is the second move is rejected, because the game has a newer version in the db.
+        :return:
+        """
+        game_id = self.new_game()
+        game = self.load(game_id)
+        other_game = self.load(game_id)
+        other_game.move_piece('e2', 'e4')
+        other_game.save_move()
+
+        db.session.remove()
+        game.move_piece('d2', 'd4')
+        with self.assertRaises(StaleDataError):
+            game.save_move()
+        db.session.rollback()
+
+        game_cache.clear()
+        self.assertEqual('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1', self.load(game_id).fen)
+
+    def test_checkpoint_replay(self):
+        """
+        Move knights out and back with a checkpoint every four plies, and load the game from the db between moves.
+        Expected result is the game is rebuilt from the checkpoint and the moves after it, and positions before the
+        checkpoint still count, so the third time the starting position comes up is a draw.
+        :return:
+        """
+        app.config['FEN_CHECKPOINT_INTERVAL'] = 4
+        app.config['THREEFOLD_REPETITION_AUTO_DRAW'] = True
+        start_key = ChessBoard(Fen()).zobrist_key
+        game_id = self.new_game()
+        knight_moves = [('g1', 'f3'), ('g8', 'f6'), ('f3', 'g1'), ('f6', 'g8')]
+
+        for start_position, end_position in knight_moves + knight_moves[:2]:
+            self.play(game_id, start_position, end_position)
+        self.assertListEqual([(4, 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 4 3')], [
+            (move.ply, move.fen) for move in GameMove.query.filter(GameMove.game_id == game_id,
+                                                                   GameMove.fen.isnot(None))])
+
+        game_cache.clear()
+        game = self.load(game_id)
+        self.assertEqual(6, game.ply)
+        self.assertEqual('rnbqkb1r/pppppppp/5n2/8/8/5N2/PPPPPPPP/RNBQKB1R w KQkq - 6 4', game.fen)
+        self.assertEqual(2, game._position_counts[start_key])
+        self.assertEqual(2, game._position_counts[game.board.zobrist_key])
+
+        self.play(game_id, 'f3', 'g1')
+        game_cache.clear()
+        game = self.load(game_id)
+        result = game.move_piece('f6', 'g8')
+        self.assertTrue(result.draw)
+        self.assertTrue(game.is_over)
+
+    def test_save_journal_states(self):
+        """
+        Write the journal state of a game twice, as when the journal is replayed after a crash, then a later state
+        that includes the same moves.
+        Expected result is every move is written once and the game over flag, final position, score and version come
+        from the state.
+        :return:
+        """
+        game_id = self.new_game()
+        game = self.load(game_id)
+        game.move_piece('f2', 'f3')
+        game.move_piece('e7', 'e5')
+        state = game._get_journal_state()
+        game.move_piece('g2', 'g4')
+        game.move_piece('d8', 'h4')
+        final_state = game._get_journal_state()
+        db.session.remove()
+
+        ChessGame.save_journal_states({game_id: state})
+        ChessGame.save_journal_states({game_id: state})
+        self.assertEqual(2, GameMove.query.filter_by(game_id=game_id).count())
+
+        ChessGame.save_journal_states({game_id: final_state})
+        game_cache.clear()
+        game = self.load(game_id)
+        self.assertEqual(4, GameMove.query.filter_by(game_id=game_id).count())
+        self.assertEqual(2, game.version)
+        self.assertEqual(4, game.ply)
+        self.assertTrue(game.is_over)
+        self.assertEqual(game.board.get_packed_position(), game.final_position)
+        self.assertEqual((0, 1), (game.score.white_score, game.score.black_score))
+
+        # Games deleted since the state was recorded are skipped
+        ChessGame.save_journal_states({game_id + 1: state})
+
+    def test_write_behind(self):
+        """
+        Play a fool's mate in write-behind mode, loading the game from the db before and after the journal is flushed.
+        Expected result is loads see the moves still in the journal on top of the moves in the db, and the game over
+        flag, final position and score of the finished game come from the journal until it is flushed.
+        :return:
+        """
+        game_id = self.new_game()
+        write_behind.open(os.path.join(self.directory, 'moves.journal'), ChessGame.save_journal_states, fsync=False)
+        try:
+            self.play(game_id, 'f2', 'f3')
+            self.play(game_id, 'e7', 'e5')
+            self.assertEqual(0, GameMove.query.filter_by(game_id=game_id).count())
+            game_cache.clear()
+            game = self.load(game_id)
+            self.assertEqual(2, game.ply)
+            self.assertEqual('rnbqkbnr/pppp1ppp/8/4p3/8/5P2/PPPPP1PP/RNBQKBNR w KQkq e6 0 2', game.fen)
+
+            # The background flush has a session of its own, without the games loaded here
+            db.session.remove()
+            self.assertTrue(write_behind.flush())
+            self.play(game_id, 'g2', 'g4')
+            game_cache.clear()
+            game = self.load(game_id)
+            self.assertEqual(2, GameMove.query.filter_by(game_id=game_id).count())
+            self.assertEqual(3, game.ply)
+            self.assertEqual('rnbqkbnr/pppp1ppp/8/4p3/6P1/5P2/PPPPP2P/RNBQKBNR b KQkq g3 0 2', game.fen)
+
+            self.play(game_id, 'd8', 'h4')
+            game_cache.clear()
+            game = self.load(game_id)
+            fen = 'rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3'
+            self.assertFalse(db.session.query(ChessGame.is_over).filter_by(id=game_id).scalar())
+            self.assertEqual(4, game.ply)
+            self.assertEqual(fen, game.fen)
+            self.assertTrue(game.is_over)
+            self.assertEqual(ChessBoard(Fen(fen)).get_packed_position(), game.final_position)
+            self.assertEqual((0, 1), (game.score.white_score, game.score.black_score))
+
+            db.session.remove()
+            self.assertTrue(write_behind.flush())
+            self.assertIsNone(write_behind.pending(game_id))
+            game_cache.clear()
+            game = self.load(game_id)
+            self.assertEqual(5, game.version)
+            self.assertEqual(4, GameMove.query.filter_by(game_id=game_id).count())
+            self.assertEqual(fen, game.fen)
+            self.assertTrue(game.is_over)
+            self.assertEqual(ChessBoard(Fen(fen)).get_packed_position(), game.final_position)
+            self.assertEqual((0, 1), (game.score.white_score, game.score.black_score))
+        finally:
+            write_behind.close()
+
+    def test_migrate_move_log(self):
+        """
+        Migrate a db from before the move log with a game being played and a finished game, and migrate it again.
+        Expected result is both games keep their position with no moves, the finished game gets its final position,
+        and the second migration changes nothing.
+        :return:
+        """
+        fen = 'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2'
+        final_fen = 'rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3'
+        engine = db.engine
+        db.session.remove()
+        GameMove.__table__.drop(engine)
+        ChessGame.__table__.drop(engine)
+        engine.execute('CREATE TABLE game (id INTEGER PRIMARY KEY, fen VARCHAR(100), white_player_id INTEGER, '
+                       'black_player_id INTEGER, is_over BOOLEAN)')
+        engine.execute(text('INSERT INTO game (id, fen, is_over) VALUES (1, :fen, 0), (2, :final_fen, 1)'),
+                       fen=fen, final_fen=final_fen)
+
+        with redirect_stdout(io.StringIO()) as output:
+            migrate_move_log.migrate()
+        self.assertEqual('Added columns: version, final_position. Set version of 2 games. Packed final position of 1 '
+                         'finished games.\n', output.getvalue())
+
+        game = self.load(1)
+        self.assertEqual((1, 0, fen, None), (game.version, game.ply, game.fen, game.final_position))
+        game.move_piece('g1', 'f3')
+        game.save_move()
+        game = self.load(2)
+        self.assertEqual((1, 0, final_fen), (game.version, game.ply, game.fen))
+        self.assertEqual(ChessBoard(Fen(final_fen)).get_packed_position(), game.final_position)
+
+        db.session.remove()
+        self.assertListEqual([], migrate_move_log.add_missing_columns(engine))
+        self.assertEqual((0, 0), migrate_move_log.backfill_games(engine))
+        self.assertEqual(2, self.load(1).version)
@@ -0,0 +1,84 @@
+import unittest
+from collections import Counter
+from src.board.chess_board import ChessBoard
+from src.board.fen import Fen
+from src.models.game_cache import GameCache
+
+
+class Clock:
+    """
+    Clock that only moves when told to.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class GameCacheTest(unittest.TestCase):
+
+    def test_hit_miss_and_stale(self):
+        """
+        Store a board for a game and load it at the same and at a newer version.
+        Expected result is the same version hits and returns a copy, and a newer version drops the entry as stale.
+        :return:
+        """
+        board = ChessBoard(Fen())
+        cache = GameCache()
+
+        self.assertIsNone(cache.get(1, 1))
+        cache.put(1, 1, 0, board, Counter({board.zobrist_key: 1}))
+
+        # Changes to the board after it was stored do not show up in the cache
+        board.move_piece('e2', 'e4')
+        ply, cached_board, position_counts = cache.get(1, 1)
+        self.assertEqual(0, ply)
+        self.assertEqual(Fen.DEFAULT_FEN, cached_board.get_fen())
+        self.assertEqual(1, position_counts[ChessBoard(Fen()).zobrist_key])
+
+        # Or changes to a board taken out of the cache
+        cached_board.move_piece('d2', 'd4')
+        position_counts[cached_board.zobrist_key] += 1
+        _, cached_board, position_counts = cache.get(1, 1)
+        self.assertEqual(Fen.DEFAULT_FEN, cached_board.get_fen())
+        self.assertEqual(1, len(position_counts))
+
+        self.assertIsNone(cache.get(1, 2))
+        self.assertIsNone(cache.get(1, 1))
+        self.assertDictEqual({'size': 0, 'max_size': 1000, 'hits': 2, 'misses': 3, 'stale': 1, 'evictions': 0},
+                             cache.stats())
+
+    def test_eviction(self):
+        """
+        Fill the cache past its maximum size and leave games untouched for longer than the idle time.
+        Expected result is the least recently used game is evicted first and idle games are evicted.
+        :return:
+        """
+        clock = Clock()
+        board = ChessBoard(Fen())
+        cache = GameCache(max_size=2, idle_seconds=60, clock=clock)
+        cache.put(1, 1, 0, board, Counter())
+        clock.now = 10
+        cache.put(2, 1, 0, board, Counter())
+        clock.now = 20
+        self.assertIsNotNone(cache.get(1, 1))
+        cache.put(3, 1, 0, board, Counter())
+        self.assertIsNone(cache.get(2, 1))
+        self.assertIsNotNone(cache.get(1, 1))
+
+        # Game 3 was last used at 20 and game 1 at 50
+        clock.now = 50
+        self.assertIsNotNone(cache.get(1, 1))
+        clock.now = 85
+        self.assertIsNone(cache.get(3, 1))
+        self.assertIsNotNone(cache.get(1, 1))
+        clock.now = 200
+        self.assertIsNone(cache.get(1, 1))
+        self.assertDictEqual({'size': 0, 'max_size': 2, 'hits': 4, 'misses': 3, 'stale': 0, 'evictions': 3},
+                             cache.stats())
+
+        cache.put(1, 1, 0, board, Counter())
+        cache.discard(1)
+        self.assertIsNone(cache.get(1, 1))
@@ -0,0 +1,56 @@
+import unittest
+from src import app
+from src.board.chess_board import ChessBoard
+from src.board.fen import Fen
+from src.models.chess_game import ChessGame
+from src.models.game_move import GameMove
+from src.piece.type import Type
+
+
+class GameMoveTest(unittest.TestCase):
+
+    def test_dict_round_trip(self):
+        """
+        Create a promotion move with the largest Zobrist key and convert it to a dictionary and back.
+        Expected result is the same move, with the key stored in the signed range of a BIGINT column.
+        :return:
+        """
+        zobrist_key = (1 << 64) - 1
+        move = GameMove(7, 'g2', 'g1', Type.QUEEN, zobrist_key, game_id=3)
+        self.assertEqual(('g2', 'g1', Type.QUEEN), move.move)
+        self.assertEqual((1 << 63) - 1, move.position_hash)
+
+        loaded_move = GameMove.from_dict(3, move.to_dict())
+        self.assertEqual(move.to_dict(), loaded_move.to_dict())
+        self.assertEqual(3, loaded_move.game_id)
+        self.assertEqual(Type.QUEEN, loaded_move.promotion_type)
+        self.assertEqual(zobrist_key, loaded_move.zobrist_key)
+        self.assertEqual([0, zobrist_key], GameMove.zobrist_keys([-(1 << 63), (1 << 63) - 1]))
+
+    def test_checkpoints(self):
+        """
+        Play knight moves with a checkpoint every four plies and play the moves back from the last checkpoint.
+        Expected result is only every fourth move keeps a FEN string, and playing back the moves after it gives the
+        same position.
+        :return:
+        """
+        interval = app.config['FEN_CHECKPOINT_INTERVAL']
+        app.config['FEN_CHECKPOINT_INTERVAL'] = 4
+        try:
+            game = ChessGame()
+            for start_position, end_position in [('g1', 'f3'), ('g8', 'f6'), ('f3', 'g1'), ('f6', 'g8')] * 2 + \
+                                                [('b1', 'c3'), ('b8', 'c6')]:
+                game.move_piece(start_position, end_position)
+        finally:
+            app.config['FEN_CHECKPOINT_INTERVAL'] = interval
+
+        moves = game.unsaved_moves
+        self.assertEqual(list(range(1, 11)), [move.ply for move in moves])
+        self.assertEqual([4, 8], [move.ply for move in moves if move.fen])
+        for move in moves:
+            self.assertIsNone(move.promotion_type)
+
+        loaded_game = ChessGame(fen=moves[7].fen)
+        loaded_game.load_moves(moves[8:])
+        self.assertEqual(game.fen, loaded_game.fen)
+        self.assertEqual(moves[-1].zobrist_key, ChessBoard(Fen(loaded_game.fen)).zobrist_key)
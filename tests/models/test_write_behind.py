@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.models.write_behind import WriteBehind
+
+
+class Writer:
+    """
+    Stand-in for the db that keeps every batch it is given.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+
+    def __call__(self, states):
+        if self.fail:
+            raise IOError('db is down')
+        self.batches.append(dict(states))
+
+
+class WriteBehindTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'moves.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_batched_flush(self):
+        """
+        Record several states for two games and flush.
+        Expected result is only the latest state of each game is written, in one batch, and the journal is emptied.
+        :return:
+        """
+        writer = Writer()
+        write_behind = WriteBehind()
+        write_behind.open(self.path, writer, fsync=False)
+        self.assertTrue(write_behind.enabled)
+
+        write_behind.record(1, {'fen': 'one'})
+        write_behind.record(2, {'fen': 'two'})
+        write_behind.record(1, {'fen': 'three'})
+        self.assertDictEqual({'fen': 'three'}, write_behind.pending(1))
+        self.assertListEqual([], writer.batches)
+
+        self.assertTrue(write_behind.flush())
+        self.assertListEqual([{1: {'fen': 'three'}, 2: {'fen': 'two'}}], writer.batches)
+        self.assertIsNone(write_behind.pending(1))
+        self.assertEqual(0, os.path.getsize(self.path))
+
+        # Nothing to write
+        self.assertTrue(write_behind.flush())
+        self.assertEqual(1, len(writer.batches))
+        write_behind.close()
+        self.assertFalse(write_behind.enabled)
+
+    def test_failed_flush(self):
+        """
+        Flush while the db is down, record a newer state, then flush again.
+        Expected result is nothing is lost and the newest state is written once the db is back.
+        :return:
+        """
+        writer = Writer()
+        write_behind = WriteBehind()
+        write_behind.open(self.path, writer)
+        write_behind.record(1, {'fen': 'one'})
+
+        writer.fail = True
+        self.assertFalse(write_behind.flush())
+        self.assertDictEqual({'fen': 'one'}, write_behind.pending(1))
+        write_behind.record(1, {'fen': 'two'})
+
+        writer.fail = False
+        self.assertTrue(write_behind.flush())
+        self.assertListEqual([{1: {'fen': 'two'}}], writer.batches)
+        self.assertDictEqual({'pending': 0, 'flushes': 1, 'failures': 1}, write_behind.stats())
+        write_behind.close()
+
+    def test_pending_while_writing(self):
+        """
+        Flush with a writer that looks up the pending states of the games it is writing, once while the db is down and
+        once while it is up.
+        Expected result is the states in the batch stay pending until the writer returns, and are dropped only once it
+        returns without an error.
+        :return:
+        """
+        write_behind = WriteBehind()
+        seen = []
+
+        def writer(states):
+            seen.append([write_behind.pending(game_id) for game_id in states])
+            if len(seen) == 1:
+                raise IOError('db is down')
+
+        write_behind.open(self.path, writer, fsync=False)
+        write_behind.record(1, {'fen': 'one'})
+        write_behind.record(2, {'fen': 'two'})
+
+        self.assertFalse(write_behind.flush())
+        self.assertDictEqual({'fen': 'one'}, write_behind.pending(1))
+        self.assertTrue(write_behind.flush())
+        self.assertListEqual([[{'fen': 'one'}, {'fen': 'two'}]] * 2, seen)
+        self.assertIsNone(write_behind.pending(1))
+        self.assertIsNone(write_behind.pending(2))
+        self.assertDictEqual({'pending': 0, 'flushes': 1, 'failures': 1}, write_behind.stats())
+        write_behind.close()
+
+    def test_replay(self):
+        """
+        Record states and stop without flushing, as if the process crashed, with a cut off line at the end of the
+        journal. Then open the journal again.
+        Expected result is the latest state of every game in the journal is written when it is opened.
+        :return:
+        """
+        writer = Writer()
+        writer.fail = True
+        write_behind = WriteBehind()
+        write_behind.open(self.path, writer)
+        write_behind.record(1, {'fen': 'one'})
+        write_behind.record(2, {'fen': 'two'})
+        write_behind.record(1, {'fen': 'three'})
+        # Entries already in the journal are still replayed. The db skips games that were deleted.
+        write_behind.discard(2)
+        write_behind.close()
+        with open(self.path, 'a') as journal_file:
+            journal_file.write('{"game_id":3,"sta')
+
+        writer = Writer()
+        write_behind = WriteBehind()
+        write_behind.open(self.path, writer)
+        self.assertListEqual([{1: {'fen': 'three'}, 2: {'fen': 'two'}}], writer.batches)
+        self.assertEqual(0, os.path.getsize(self.path))
+        write_behind.close()
@@ -1,3 +1,4 @@
+import copy
 import unittest
 from src.piece.king import King
 from src.piece.pawn import Pawn
@@ -36,18 +37,24 @@ class PieceTest(unittest.TestCase):
                 self.assertEqual(Color.WHITE, piece.color, 'Color was not set correctly')
                 self.assertEqual(t, piece.type, 'Piece type does not match')
 
-    def test_capture(self):
+    def test_shared_and_immutable(self):
         """
-        Test capture property
+        Create the same piece twice and try to change it.
+        Expected result is both are the same object and changing it raises an error.
         :return:
         """
         for t, piece_class in self.types.items():
             with self.subTest(t):
                 piece = piece_class(Color.WHITE)
-                self.assertFalse(piece.capture, 'Piece should not be captured')
+                self.assertIs(piece, piece_class(Color.WHITE), 'Pieces should be shared')
+                self.assertIs(piece, copy.deepcopy(piece), 'Copying should return the shared piece')
+                self.assertIsNot(piece, piece_class(Color.BLACK), 'Each color should have its own piece')
 
-                piece.capture = True
-                self.assertTrue(piece.capture, 'Piece should not be captured')
+                with self.assertRaises(AttributeError):
+                    piece.color = Color.BLACK
+                with self.assertRaises(AttributeError):
+                    piece._color = Color.BLACK
+                self.assertEqual(Color.WHITE, piece.color)
 
     def test_move_directions(self):
         """
@@ -88,7 +95,7 @@ class PieceTest(unittest.TestCase):
             with self.subTest(t):
                 piece = piece_class(Color.WHITE)
                 directions = piece.move_directions
-                self.assertDictEqual(piece_directions[t], directions, 'Directions do not match expected')
+                self.assertDictEqual(piece_directions[t], dict(directions), 'Directions do not match expected')
 
 
 if __name__ == '__main__':
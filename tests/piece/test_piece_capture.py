@@ -21,11 +21,11 @@ class PieceCaptureTest(unittest.TestCase):
         """
         # Test diagonal move when a piece of the opposite color is present
         board = ChessBoard()
-        start_position = 'b1'
-        capture_position = 'c2'
+        start_position = 'b2'
+        capture_position = 'c3'
         board[start_position] = Pawn(Color.WHITE)
-        board['c2'] = Bishop(Color.BLACK)
-        expected_possible_moves = ['b2', 'b3', 'c2']
+        board['c3'] = Bishop(Color.BLACK)
+        expected_possible_moves = ['b3', 'b4', 'c3']
         possible_moves = board.get_legal_moves(start_position)
         possible_moves.sort()
 
@@ -33,8 +33,8 @@ class PieceCaptureTest(unittest.TestCase):
         self.assertListEqual(expected_possible_moves, possible_moves, message)
 
         # place a second piece and confirm both diagonals show as possible moves
-        board['a2'] = Rook(Color.BLACK)
-        expected_possible_moves = ['a2', 'b2', 'b3', 'c2']
+        board['a3'] = Rook(Color.BLACK)
+        expected_possible_moves = ['a3', 'b3', 'b4', 'c3']
         possible_moves = board.get_legal_moves(start_position)
         possible_moves.sort()
 
@@ -59,10 +59,10 @@ class PieceCaptureTest(unittest.TestCase):
         :return:
         """
         board = ChessBoard()
-        start_position = 'b1'
+        start_position = 'b2'
         board[start_position] = Pawn(Color.WHITE)
-        board['c2'] = Bishop(Color.WHITE)
-        expected_possible_moves = ['b2', 'b3']
+        board['c3'] = Bishop(Color.WHITE)
+        expected_possible_moves = ['b3', 'b4']
         possible_moves = board.get_legal_moves(start_position)
         possible_moves.sort()
 
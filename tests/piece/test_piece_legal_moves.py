@@ -14,24 +14,27 @@ class PieceLegalMovesTest(unittest.TestCase):
 
     def test_pawn_legal_moves(self):
         """
-        Move a pawn to each corner and one middle square.
-        Expected result is that all the possible moves match the expected list.
+        Move a pawn to each corner, one middle square and its starting row.
+        Expected result is that all the possible moves match the expected list. Only a pawn on its starting row can move
+        forward two squares.
         :return:
         """
         start_positions = {
             Color.WHITE: {
-                'a1': ['a2', 'a3'],
+                'a1': ['a2'],
                 'a8': [],
-                'h1': ['h2', 'h3'],
+                'h1': ['h2'],
                 'h8': [],
-                'd4': ['d5', 'd6']
+                'd4': ['d5'],
+                'd2': ['d3', 'd4']
             },
             Color.BLACK: {
                 'a1': [],
-                'a8': ['a6', 'a7'],
+                'a8': ['a7'],
                 'h1': [],
-                'h8': ['h6', 'h7'],
-                'd4': ['d2', 'd3']
+                'h8': ['h7'],
+                'd4': ['d3'],
+                'd7': ['d5', 'd6']
             }
         }
         for color, positions in start_positions.items():
@@ -413,5 +416,21 @@ class PieceLegalMovesTest(unittest.TestCase):
         self.assertListEqual(['c5', 'c6'], legal_moves, 'Legal moves dont match expected moves.')
 
 
+    def test_piece_cannot_pass_through_blocking_piece(self):
+        """
+        Put the king in check with a knight and place a piece of the same color as the king between a queen and the
+        knight.
+        Expected result is the queen cannot capture the knight by passing through the piece in the way.
+        :return:
+        """
+        board = ChessBoard()
+        board['e1'] = King(Color.WHITE)
+        board['d1'] = Queen(Color.WHITE)
+        board['e2'] = Knight(Color.WHITE)
+        board['f3'] = Knight(Color.BLACK)
+
+        legal_moves = board.get_legal_moves('d1')
+        self.assertListEqual([], legal_moves, 'Queen should not be able to move through the knight on e2')
+
 if __name__ == '__main__':
     unittest.main()
@@ -279,7 +279,7 @@ class PieceMovementTest(unittest.TestCase):
                 board[start_pos] = Pawn(color)
                 board.move_piece(start_pos, end_pos)
 
-                self.assertDictEqual(expected_directions, board[end_pos].move_directions, 'Incorrect move_directions')
+                self.assertDictEqual(expected_directions, board.get_move_directions(end_pos), 'Incorrect move_directions')
 
     def test_king_movement_adjusted_after_moving(self):
         """
@@ -309,7 +309,7 @@ class PieceMovementTest(unittest.TestCase):
                 board[start_pos] = King(color)
                 board.move_piece(start_pos, end_pos)
 
-                self.assertDictEqual(expected_directions, board[end_pos].move_directions, 'Incorrect move_directions')
+                self.assertDictEqual(expected_directions, board.get_move_directions(end_pos), 'Incorrect move_directions')
 
     def test_king_movement_adjusted_after_left_rook_moves(self):
         """
@@ -345,7 +345,7 @@ class PieceMovementTest(unittest.TestCase):
                 board[rook_start] = Rook(color)
                 board.move_piece(rook_start, rook_end)
 
-                self.assertDictEqual(expected_directions, board[king_pos].move_directions, 'Incorrect move_directions')
+                self.assertDictEqual(expected_directions, board.get_move_directions(king_pos), 'Incorrect move_directions')
 
     def test_king_movement_adjusted_after_right_rook_moves(self):
         """
@@ -381,7 +381,7 @@ class PieceMovementTest(unittest.TestCase):
                 board[rook_start] = Rook(color)
                 board.move_piece(rook_start, rook_end)
 
-                self.assertDictEqual(expected_directions, board[king_pos].move_directions, 'Incorrect move_directions')
+                self.assertDictEqual(expected_directions, board.get_move_directions(king_pos), 'Incorrect move_directions')
 
     def test_king_perform_castle(self):
         """
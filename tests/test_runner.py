@@ -3,6 +3,7 @@ import unittest
 from tests.piece import *
 from tests.board import *
 from tests.models import *
+from tests.utils import *
 
 # initialize the test suite
 loader = unittest.TestLoader()
@@ -16,7 +17,16 @@ suite.addTests(loader.loadTestsFromModule(test_piece_capture))
 
 suite.addTests(loader.loadTestsFromModule(test_chessboard))
 suite.addTest(loader.loadTestsFromModule(test_fen))
+suite.addTests(loader.loadTestsFromModule(test_move_cache))
+suite.addTests(loader.loadTestsFromModule(test_packed))
+suite.addTests(loader.loadTestsFromModule(test_perft))
 suite.addTests(loader.loadTestsFromModule(test_chess_game))
+suite.addTests(loader.loadTestsFromModule(test_chess_game_db))
+suite.addTests(loader.loadTestsFromModule(test_game_cache))
+suite.addTests(loader.loadTestsFromModule(test_game_move))
+suite.addTests(loader.loadTestsFromModule(test_write_behind))
+
+suite.addTests(loader.loadTestsFromModule(test_instrumentation))
 
 # initialize a runner, pass it your suite and run it
 runner = unittest.TextTestRunner(verbosity=2)
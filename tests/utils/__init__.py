@@ -0,0 +1,3 @@
+__all__ = [
+    'test_instrumentation'
+]
\ No newline at end of file
@@ -0,0 +1,84 @@
+import unittest
+from src.board.chess_board import ChessBoard
+from src.board.fen import Fen
+from src.config import Config
+from src.utils.instrumentation import instrumentation
+from src.utils.instrumentation import instrumented
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self._enabled = instrumentation.enabled
+        instrumentation.reset()
+
+    def tearDown(self):
+        instrumentation.enabled = self._enabled
+        instrumentation.reset()
+
+    def test_disabled(self):
+        """
+        Decorate a function with instrumentation disabled and call it.
+        Expected result is the function is returned unwrapped, every instrumented function is listed and no calls are
+        recorded.
+        :return:
+        """
+        instrumentation.enabled = False
+
+        def add(a, b):
+            return a + b
+
+        self.assertIs(add, instrumented('test.disabled')(add))
+        self.assertEqual(3, add(1, 2))
+        board = ChessBoard(Fen())
+        board.is_check(board.current_player)
+
+        snapshot = instrumentation.snapshot()
+        for name in ('ChessBoard.is_check', 'ChessBoard.get_legal_moves', 'ChessBoard._get_nearest_piece_in_direction',
+                     'ChessBoard.move_piece', 'ChessBoard.get_fen', 'Fen.parse', 'Fen.generate_fen',
+                     'ChessGame.load_by_id', 'ChessGame.move_piece', 'test.disabled'):
+            self.assertIn(name, snapshot)
+        if not Config.INSTRUMENTATION:
+            for stats in snapshot.values():
+                self.assertDictEqual({'calls': 0, 'seconds': 0.0}, stats)
+
+    def test_enabled(self):
+        """
+        Decorate functions with instrumentation enabled and call them.
+        Expected result is each call is counted and timed while instrumentation stays enabled, and the counters are
+        exported in Prometheus text format.
+        :return:
+        """
+        instrumentation.enabled = True
+
+        @instrumented('test.parse')
+        def parse(fen):
+            return Fen(fen)
+
+        @instrumented('test.legal_moves')
+        def legal_moves(board, position):
+            return board.get_legal_moves(position)
+
+        board = ChessBoard(parse(Fen.DEFAULT_FEN))
+        board.move_piece('e2', 'e4')
+        legal_moves(board, 'd1')
+        legal_moves(board, 'e1')
+
+        snapshot = instrumentation.snapshot()
+        self.assertEqual(1, snapshot['test.parse']['calls'])
+        self.assertEqual(2, snapshot['test.legal_moves']['calls'])
+        self.assertGreater(snapshot['test.legal_moves']['seconds'], 0)
+
+        instrumentation.enabled = False
+        legal_moves(board, 'd1')
+        self.assertEqual(2, instrumentation.snapshot()['test.legal_moves']['calls'])
+
+        metrics = instrumentation.to_prometheus({'size': 3, 'max_size': 10, 'hits': 1, 'misses': 3, 'evictions': 0})
+        self.assertIn('# TYPE chess_calls_total counter\n', metrics)
+        self.assertIn('chess_calls_total{function="test.legal_moves"} 2\n', metrics)
+        self.assertIn('chess_call_seconds_total{function="test.parse"} ', metrics)
+        self.assertIn('chess_legal_move_cache_misses_total 3\n', metrics)
+        self.assertIn('chess_legal_move_cache_size 3\n', metrics)
+
+        instrumentation.reset()
+        self.assertEqual(0, instrumentation.snapshot()['test.parse']['calls'])